@@ -5,15 +5,30 @@ File này chứa logic chính để khởi tạo trò chơi, xử lý tương t
 import pygame
 import chess
 import chess.engine
-from datetime import datetime
 import os
 import sys
-
-# Cai dat kich thuoc cua so
+import argparse
+import sqlite3
+import time
+from collections import OrderedDict
+
+from engine_cache import EngineCache
+from engine_resources import HASH_POLICIES, EngineResources
+from engine_worker import EngineWorker
+from recorder import GameRecorder
+from difficulty import PROFILES, TimeControl, format_clock
+from game_core import STOCKFISH_PATH, Phase, Session
+from history_index import INDEX_PATH, HistoryIndex
+from metrics import Metrics, MetricsExporter
+from opening_book import BOOK_PROFILES, OpeningBook
+from remote_engine import RemoteEngineWorker
+from replay import Replay
+from tablebase import TABLEBASE_PROFILES, Tablebase
+
+# Cai dat kich thuoc cua so (cua so chi duoc mo trong init_display, khong mo khi import)
 screen_width = 900
 screen_height = 800
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Chess with Stockfish")
+screen = None
 
 # Mau sac
 white = (255, 255, 255)
@@ -28,6 +43,15 @@ dialog_text_color = black
 button_color = (100, 149, 237)
 button_text_color = white
 check_color = (255, 0, 0) # Mau do cho o vua bi chieu
+clock_color = (60, 60, 60)
+clock_low_color = (200, 0, 0) # Mau dong ho khi con duoi 10 giay
+overlay_background = (30, 30, 30)
+overlay_text_color = (0, 255, 0)
+eval_bar_white = (245, 245, 245)
+eval_bar_black = (40, 40, 40)
+pv_text_color = (40, 40, 40)
+slider_color = (120, 120, 120)
+slider_handle_color = button_color
 
 # Kich thuoc o co va vi tri ban co
 square_size = 80
@@ -42,6 +66,24 @@ give_up_square_x = board_x - give_up_square_size - 20
 give_up_square_y = board_y + board_height - give_up_square_size
 give_up_rect = pygame.Rect(give_up_square_x, give_up_square_y, give_up_square_size, give_up_square_size)
 
+# Vi tri dong ho thi dau (ben phai ban co): dong ho cua ben o phia tren va phia duoi ban co
+clock_width = screen_width - (board_x + board_width) - 20
+clock_height = 40
+top_clock_rect = pygame.Rect(board_x + board_width + 10, board_y, clock_width, clock_height)
+bottom_clock_rect = pygame.Rect(board_x + board_width + 10, board_y + board_height - clock_height, clock_width, clock_height)
+
+# Lop hien thi so lieu (F3), nam trong khoang trong phia tren ban co
+overlay_rect = pygame.Rect(0, 0, screen_width, board_y - 4)
+
+# Thanh danh gia (giua hai dong ho) va bang bien chinh (duoi ban co) cua che do phan tich
+eval_bar_rect = pygame.Rect(board_x + board_width + 10, board_y + clock_height + 10, 24, board_height - 2 * (clock_height + 10))
+pv_panel_rect = pygame.Rect(board_x, board_y + board_height + 4, board_width, screen_height - (board_y + board_height) - 8)
+
+# Che do xem lai: thong tin van phia tren ban co, thanh truot duoi ban co
+board_rect = pygame.Rect(board_x, board_y, board_width, board_height)
+replay_info_rect = pygame.Rect(board_x, 0, board_width, board_y - 4)
+replay_slider_rect = pygame.Rect(board_x, board_y + board_height + 30, board_width, 20)
+
 # Bien luu trang thai khoi tao tai nguyen
 _resources_initialized = False
 pieces = {}
@@ -49,51 +91,126 @@ background_image = None
 font_large = None
 font_medium = None
 
-# Khoi tao ban co va engine Stockfish (chi dinh nghia, khoi tao sau)
-STOCKFISH_PATH = "stockfish\\stockfish.exe"  # Dam bao duong dan chinh xac
-engine = None
-board = chess.Board()
-selected_square = None
-possible_moves = []
-giveup = False
-player_moved = False # Bien theo doi xem nguoi choi da di trong luot nay chua
-show_start_dialog = True
-show_color_choice_dialog = False
-show_difficulty_choice_dialog = False # Them bien cho hop thoai chon do kho
-stockfish_level = None # Luu tru muc do kho da chon
-user_color = None # Mau cua nguoi choi
-bot_color = None # Mau cua bot
-game_started = False
-show_game_over_dialog = False
-game_over_message = ""
+# Khoi tao engine Stockfish (chi dinh nghia, khoi tao sau)
+ENGINE_RESULT_EVENT = pygame.USEREVENT + 1 # Su kien engine gui nuoc di ve vong lap chinh
+BOT_MOVE_DELAY = 0.5 # Thoi gian toi thieu (giay) truoc khi bot di
+PONDER_ENABLED = True # Engine tiep tuc suy nghi trong thoi gian cua nguoi choi
+ENGINE_POOL_SIZE = 1 # So tien trinh Stockfish giu san
+ENGINE_THREADS = None # So luong cua engine, None de chon theo may va do kho (engine_resources.py)
+ENGINE_HASH_MB = None # Kich thuoc bang bam (MB), None de chon theo RAM va do kho
+ENGINE_HASH_POLICY = "clear" # "clear": gui ucinewgame, Threads/Hash theo do kho; "keep": giu bang bam, mot Threads/Hash cho moi do kho
+ENGINE_NUMA_POLICY = None # Tuy chon NumaPolicy cua Stockfish, None de dung mac dinh cua engine
+ENGINE_MAX_FAILURES = 3 # So lan loi engine lien tiep truoc khi dung tro choi
+ENGINE_CACHE_PATH = os.path.join("cache", "engine_cache.sqlite3") # Bo dem ket qua engine, None de chi dung bo nho
+ENGINE_CACHE_SIZE = 4096 # So the co toi da giu trong bo nho
+BOOK_PATH = os.path.join("books", "book.bin") # Sach khai cuoc Polyglot, bo qua neu khong co file
+TABLEBASE_PATH = "syzygy" # Thu muc bang tan cuoc Syzygy (.rtbw/.rtbz), bo qua neu khong co thu muc
+TABLEBASE_ADJUDICATE = True # Ket thuc van ngay khi bang tan cuoc da dinh doat ket qua
+GAME_OVER_EVENT = pygame.USEREVENT + 2 # Hen gio hien hop thoai ket thuc van
+GAME_OVER_DELAY_MS = 1000 # Thoi gian cho truoc khi hien hop thoai ket thuc van
+CLOCK_EVENT = pygame.USEREVENT + 3 # Hen gio ve lai dong ho thi dau
+CLOCK_REFRESH_MS = 100 # Chu ky ve lai dong ho khi van co tinh gio
+TIME_CONTROL = None # The thuc thoi gian (difficulty.TimeControl), None neu khong tinh gio
+SERVER_ADDRESS = None # "host:port" cua GameServer (server.py), None de chay Stockfish tai may
+METRICS_EVENT = pygame.USEREVENT + 4 # Hen gio ve lai lop hien thi so lieu
+METRICS_OVERLAY_REFRESH_MS = 500 # Chu ky ve lai lop hien thi so lieu khi dang bat
+METRICS_JSONL_PATH = os.path.join("cache", "metrics.jsonl") # So lieu dinh ky (xoay vong), None de tat
+METRICS_PROMETHEUS_PATH = os.path.join("cache", "chessgame.prom") # File cho textfile collector, None de tat
+METRICS_EXPORT_INTERVAL = 10 # Chu ky ghi so lieu ra file (giay)
+ANALYSIS_EVENT = pygame.USEREVENT + 5 # Su kien engine gui ket qua phan tich tam thoi
+ANALYSIS_MULTIPV = 3 # So bien chinh hien trong bang phan tich
+ANALYSIS_PV_LENGTH = 8 # So nuoc toi da cua moi bien chinh hien tren man hinh
+REPLAY_PREFETCH = 8 # So khung hinh ve san moi phia cua con tro sau moi lan chuyen nua nuoc
+REPLAY_FRAME_CACHE = 2 * REPLAY_PREFETCH + 8 # So khung hinh ve san giu trong bo nho khi xem lai (~1.6 MB moi khung)
+REPLAY_PREFETCH_BUDGET = 0.008 # Thoi gian toi da (giay) danh cho viec ve san sau moi khung hinh
+REPLAY_PREFETCH_EVENT = pygame.USEREVENT + 6 # Danh thuc vong lap chinh de ve san tiep khung hinh xem lai
+REPLAY_INPUT_EVENTS = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION) # Su kien dieu khien man hinh xem lai
+ENGINE_READY_EVENT = pygame.USEREVENT + 7 # Engine da khoi dong xong (hoac loi) o luong nen
+
+# Che do lap lich cua vong lap chinh
+# "event": ngu tren pygame.event.wait khi khong co gi thay doi, chi ve lai khi trang thai doi
+# "poll": ve lai moi khung hinh, gioi han boi FPS_CAP
+SCHEDULER_MODE = "event"
+FPS_CAP = 60
+engine_worker = None
+engine_cache = None
+opening_book = None
+tablebase = None
+engine_resources = None
+bot_job_id = None # Ma yeu cau tim nuoc di dang cho ket qua
+metrics = Metrics() # So lieu khung hinh, engine, ghi lich su va do tre su kien
+metrics_exporter = None
+metrics_overlay = False # Lop hien thi so lieu dang bat (phim F3)
+engine_failures = 0 # So lan loi engine lien tiep
+analysis_mode = False # Che do phan tich dang bat (phim A)
+analysis_job_id = None # Ma yeu cau phan tich dang chay
+analysis_position = None # The co (FEN) dang duoc phan tich
+analysis_update = None # Ket qua phan tich moi nhat (engine_worker.AnalysisUpdate)
+replay_view = None # Man hinh xem lai van co (ReplayView), None khi khong xem lai
+startup_started = time.perf_counter() # Moc tinh thoi gian khoi dong (khung hinh dau tien, engine san sang)
+
+# Trang thai tro choi nam trong loi khong phu thuoc Pygame (game_core.Session)
+session = Session()
+start_buttons = []
+color_choice_buttons = []
+difficulty_choice_buttons = []
 game_over_buttons = []
-show_give_up_dialog = False
 give_up_buttons = []
+game_over_pending = False # Van co da ket thuc, dang cho GAME_OVER_EVENT de hien hop thoai
 
-# Tao thu muc 'history' neu chua ton tai
+# Lich su van dau duoc ghi thanh file PGN trong thu muc 'history' (khoi tao sau)
 history_folder = "history"
-if not os.path.exists(history_folder):
-    os.makedirs(history_folder)
+recorder = None
+HISTORY_INDEX_ENABLED = True # Dua van vua luu vao chi muc tra cuu (history_index.py)
+
+def init_display():
+    """Mở cửa sổ Pygame nếu chưa mở.
+
+    Cửa sổ không được mở khi import module, nên các công cụ không cần giao diện
+    có thể import ChessGame (hoặc game_core) mà không hiện cửa sổ nào.
+    """
+    global screen
 
-# Mo file de ghi lich su nuoc di voi encoding UTF-8 trong thu muc 'history' (khoi tao sau)
-history_file_path = os.path.join(history_folder, f"game_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
-history_file = None
+    if screen is None:
+        screen = pygame.display.set_mode((screen_width, screen_height))
+        pygame.display.set_caption("Chess with Stockfish")
 
 def init_resources():
-    """Khởi tạo Pygame và tải các tài nguyên cần thiết (hình ảnh, font)."""
-    global _resources_initialized, pieces, background_image, font_large, font_medium
+    """Khởi tạo Pygame, mở cửa sổ và tải các tài nguyên của màn hình bắt đầu và hộp thoại (font, hình nền).
+
+    Hình ảnh quân cờ được tải riêng bằng ``load_piece_images`` để khung hình đầu tiên
+    hiện ra ngay.
+    """
+    global _resources_initialized, background_image, font_large, font_medium
 
     if _resources_initialized:
         return
 
     pygame.init()
     pygame.font.init()
+    init_display()
 
     # Font chu
     font_large = pygame.font.SysFont('Arial', 30)
     font_medium = pygame.font.SysFont('Arial', 20)
 
-    # Tai va resize hinh anh quan co
+    # Tai va resize hinh anh background
+    try:
+        background_image = pygame.image.load("images/start_background.png").convert() # Thay "start_background.png" bang ten file anh cua ban
+        background_image = pygame.transform.scale(background_image, (screen_width, screen_height))
+    except pygame.error as e:
+        print(f"Loi khi tai hinh anh background: {e}")
+        pygame.quit()
+        sys.exit()
+
+    _resources_initialized = True
+
+def load_piece_images():
+    """Tải và resize hình ảnh quân cờ (chỉ lần gọi đầu tiên), cần trước khi vẽ bàn cờ."""
+    init_resources()
+    if pieces:
+        return
+
     piece_names = ["wP", "wR", "wN", "wB", "wQ", "wK", "bP", "bR", "bN", "bB", "bQ", "bK"]
     for name in piece_names:
         try:
@@ -104,34 +221,169 @@ def init_resources():
             pygame.quit()
             sys.exit()
 
-    # Tai va resize hinh anh background
-    try:
-        background_image = pygame.image.load("images/start_background.png").convert() # Thay "start_background.png" bang ten file anh cua ban
-        background_image = pygame.transform.scale(background_image, (screen_width, screen_height))
-    except pygame.error as e:
-        print(f"Loi khi tai hinh anh background: {e}")
-        pygame.quit()
-        sys.exit()
+def post_engine_result(result):
+    """Đẩy kết quả của engine vào hàng đợi sự kiện Pygame.
 
-    _resources_initialized = True
+    Hàm này được gọi từ luồng nền của EngineWorker; vòng lặp chính nhận kết quả
+    dưới dạng sự kiện ENGINE_RESULT_EVENT.
+
+    Args:
+        result (engine_worker.EngineResult): Kết quả tìm nước đi.
+    """
+    pygame.event.post(pygame.event.Event(ENGINE_RESULT_EVENT, result=result, posted_at=time.perf_counter()))
+
+def post_analysis_update(update):
+    """Đẩy kết quả phân tích tạm thời vào hàng đợi sự kiện Pygame (gọi từ luồng nền).
+
+    Args:
+        update (engine_worker.AnalysisUpdate): Kết quả phân tích.
+    """
+    pygame.event.post(pygame.event.Event(ANALYSIS_EVENT, update=update, posted_at=time.perf_counter()))
+
+def post_engine_ready(error):
+    """Báo cho vòng lặp chính rằng engine đã khởi động xong (gọi từ luồng nền).
+
+    Args:
+        error (Exception or None): Lỗi khởi động, None nếu engine đã sẵn sàng.
+    """
+    pygame.event.post(pygame.event.Event(ENGINE_READY_EVENT, error=error))
+
+def report_startup(stage, seconds):
+    """Ghi nhận và in thời gian của một mốc khởi động.
+
+    Args:
+        stage (str): ``"first_frame"``, ``"engine_ready"`` hoặc ``"first_bot_move"``.
+        seconds (float): Thời gian (giây).
+    """
+    metrics.set("startup_seconds", seconds, stage=stage)
+    print(f"Startup {stage}: {seconds * 1000:.0f} ms")
+
+def request_bot_move(min_delay=0.0):
+    """Gửi yêu cầu tìm nước đi cho bot tới luồng engine nền.
+
+    Args:
+        min_delay (float): Thời gian tối thiểu (giây) trước khi bot đi.
+    """
+    global bot_job_id
+    bot_job_id = engine_worker.submit(session.game.board, session.game.engine_limit(), min_delay=min_delay)
+
+def end_engine_game():
+    """Kết thúc ván với engine: huỷ tìm kiếm/ponder và in thống kê ponder của ván.
+
+    Được gọi khi ván cờ kết thúc, khi người chơi bỏ cuộc hoặc chọn chơi lại.
+    """
+    global bot_job_id, analysis_job_id, analysis_position, analysis_update
+    bot_job_id = None
+    analysis_job_id = None
+    analysis_position = None
+    analysis_update = None
+    if engine_worker is None:
+        return
+    stats = engine_worker.new_game()
+    if stats.ponders:
+        print(f"Ponder stats: {stats}")
+    if engine_cache is not None:
+        cache_stats = engine_cache.reset_stats()
+        if cache_stats.hits or cache_stats.disk_hits or cache_stats.misses:
+            print(f"Engine cache: {cache_stats}")
+    if opening_book is not None:
+        book_moves = opening_book.reset_stats()
+        if book_moves:
+            print(f"Opening book: {book_moves} moves")
+    if tablebase is not None:
+        tablebase_moves = tablebase.reset_stats()
+        if tablebase_moves:
+            print(f"Tablebase: {tablebase_moves} moves")
 
 def init_engine_and_history():
-    """Khởi tạo engine Stockfish và mở file lịch sử."""
-    global engine, history_file
+    """Khởi tạo engine Stockfish và bộ ghi lịch sử."""
+    global engine_worker, engine_cache, opening_book, tablebase, engine_resources, recorder, metrics_exporter
 
     try:
-        engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
-    except FileNotFoundError:
-        print(f"Khong tim thay Stockfish tai duong dan: {STOCKFISH_PATH}")
-        pygame.quit()
-        sys.exit()
+        engine_cache = EngineCache(ENGINE_CACHE_PATH, max_entries=ENGINE_CACHE_SIZE)
+    except sqlite3.Error as e:
+        print(f"Loi khi mo bo dem engine, chi dung bo nho: {e}")
+        engine_cache = EngineCache(None, max_entries=ENGINE_CACHE_SIZE)
+
+    if BOOK_PATH and os.path.exists(BOOK_PATH):
+        try:
+            opening_book = OpeningBook(BOOK_PATH)
+        except OSError as e:
+            print(f"Loi khi mo sach khai cuoc {BOOK_PATH}: {e}")
+
+    if TABLEBASE_PATH and all(os.path.isdir(path) for path in TABLEBASE_PATH.split(os.pathsep)):
+        try:
+            tablebase = Tablebase(TABLEBASE_PATH)
+        except OSError as e:
+            print(f"Loi khi mo bang tan cuoc {TABLEBASE_PATH}: {e}")
+        else:
+            if tablebase.max_pieces:
+                print(f"Tablebase: up to {tablebase.max_pieces} pieces")
+                if TABLEBASE_ADJUDICATE:
+                    session.tablebase = tablebase
+            else:
+                tablebase.close()
+                tablebase = None
+
+    if SERVER_ADDRESS:
+        # Nuoc di cua bot duoc tinh tren may chu, dung chung engine voi cac van khac
+        try:
+            engine_worker = RemoteEngineWorker(SERVER_ADDRESS, post_engine_result)
+            engine_worker.start()
+            post_engine_ready(None)
+        except OSError as e:
+            print(f"Khong ket noi duoc may chu {SERVER_ADDRESS}: {e}")
+            pygame.quit()
+            sys.exit()
+    else:
+        engine_resources = EngineResources(engines=ENGINE_POOL_SIZE, threads=ENGINE_THREADS, hash_mb=ENGINE_HASH_MB,
+                                           hash_policy=ENGINE_HASH_POLICY, numa_policy=ENGINE_NUMA_POLICY)
+        print(f"Host: {engine_resources.host}")
+        # Khoi dong va lam nong engine o luong nen trong luc nguoi choi chon mau va do kho,
+        # ket qua (hoac loi) ve qua ENGINE_READY_EVENT
+        engine_worker = EngineWorker(STOCKFISH_PATH, post_engine_result, ponder=PONDER_ENABLED,
+                                     pool_size=ENGINE_POOL_SIZE, cache=engine_cache, book=opening_book,
+                                     tablebase=tablebase, metrics=metrics, resources=engine_resources)
+        engine_worker.start(wait=False, on_ready=post_engine_ready)
+
+    recorder = GameRecorder(history_folder, on_saved=index_saved_game if HISTORY_INDEX_ENABLED else None,
+                            metrics=metrics)
+
+    metrics_exporter = MetricsExporter(metrics, METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH,
+                                       interval=METRICS_EXPORT_INTERVAL)
+    metrics_exporter.start()
+
+def index_saved_game(path):
+    """Đưa ván vừa lưu vào chỉ mục lịch sử (được gọi trên luồng ghi nền của GameRecorder).
 
+    Args:
+        path (str): File PGN của ván vừa lưu.
+    """
     try:
-        history_file = open(history_file_path, "w", encoding="utf-8")
-    except Exception as e:
-        print(f"Loi khi mo file lich su: {e}")
-        pygame.quit()
-        sys.exit()
+        index = HistoryIndex(INDEX_PATH)
+        try:
+            index.add_file(path)
+        finally:
+            index.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Loi khi cap nhat chi muc lich su: {e}")
+
+def start_recording():
+    """Bắt đầu ghi ván cờ vừa chọn xong màu và độ khó (file chỉ được tạo ở nước đi đầu tiên)."""
+    game = session.game
+    tags = {"Difficulty": game.difficulty, "SkillLevel": game.skill_level}
+    if game.clock is not None:
+        time_control = game.clock.time_control
+        tags["TimeControl"] = f"{time_control.base:g}+{time_control.increment:g}" # Dinh dang PGN: giay+giay
+    recorder.start_game(game.player_name(chess.WHITE), game.player_name(chess.BLACK), **tags)
+
+def finish_recording():
+    """Kết thúc ghi ván hiện tại với kết quả và thông báo kết thúc của ván."""
+    if recorder is None:
+        return
+    path = recorder.finish(session.game.result(), session.game_over_message)
+    if path is not None:
+        print(f"Game history saved to: {path}")
 
 # Ham chuyen doi toa do Pygame sang ky hieu o co vua (dieu chinh cho vi tri ban co)
 def get_square_from_pos(pos):
@@ -148,6 +400,7 @@ def get_square_from_pos(pos):
         str or None: Ký hiệu ô cờ vua (ví dụ: 'a1') nếu tọa độ nằm trong bàn cờ,
                     ngược lại trả về None.
     """
+    user_color = session.game.user_color
     col_pygame = (pos[0] - board_x) // square_size
     row_pygame = (pos[1] - board_y) // square_size
     if 0 <= col_pygame < 8 and 0 <= row_pygame < 8:
@@ -158,7 +411,7 @@ def get_square_from_pos(pos):
     return None
 
 # Ham chuyen doi ky hieu o co vua sang toa do Pygame (dieu chinh cho vi tri ban co)
-def get_pos_from_square(square):
+def get_pos_from_square(square, user_color=None):
     """Chuyển đổi ký hiệu ô cờ vua thành tọa độ Pygame (x, y).
 
     Hàm này nhận một ký hiệu ô cờ vua (ví dụ: 'a1') và trả về
@@ -167,10 +420,14 @@ def get_pos_from_square(square):
 
     Args:
         square (chess.Square): Ký hiệu ô cờ vua.
+        user_color (chess.Color or None): Màu quân ở phía dưới bàn cờ, mặc định là màu
+            của người chơi trong ván hiện tại.
 
     Returns:
         tuple: Tuple (x, y) chứa tọa độ Pygame của ô cờ.
     """
+    if user_color is None:
+        user_color = session.game.user_color
     col = chess.square_file(square)
     row = chess.square_rank(square)
     # Dao nguoc hang va cot neu nguoi choi chon den
@@ -178,6 +435,344 @@ def get_pos_from_square(square):
     draw_row = 7 - row if user_color == chess.WHITE else row
     return (board_x + draw_col * square_size, board_y + draw_row * square_size)
 
+class BoardRenderer:
+    """Bộ vẽ bàn cờ theo lớp, chỉ cập nhật những ô thay đổi lên màn hình.
+
+    Nền bàn cờ (64 ô và ô bỏ cuộc) và lớp tô màu nước đi khả thi được vẽ sẵn
+    một lần. Mỗi khung hình, bộ vẽ so sánh trạng thái từng ô (quân cờ, ô được
+    chọn, nước đi khả thi, vua bị chiếu) với lần vẽ trước và chỉ vẽ lại các ô
+    khác biệt, rồi gửi các vùng đó tới ``pygame.display.update``.
+    """
+
+    def __init__(self):
+        self.background = None
+        self.move_overlay = None
+        self._square_states = {}
+        self._clock_texts = {}
+        self._analysis_key = None
+        self._flipped = None
+        self._full_redraw = True
+
+    def invalidate(self):
+        """Yêu cầu vẽ lại toàn bộ ở khung hình tiếp theo (ví dụ sau khi hộp thoại đè lên bàn cờ)."""
+        self._full_redraw = True
+
+    def _build_layers(self):
+        """Vẽ sẵn nền bàn cờ và lớp tô màu nước đi khả thi."""
+        self.background = pygame.Surface((screen_width, screen_height)).convert()
+        self.background.fill(background)
+        for row in range(8):
+            for col in range(8):
+                color = light_square if (row + col) % 2 == 0 else dark_square
+                pygame.draw.rect(self.background, color, (board_x + col * square_size, board_y + row * square_size, square_size, square_size))
+
+        # Ve o bo cuoc (vi tri khong doi)
+        pygame.draw.rect(self.background, white, give_up_rect)
+        try:
+            give_up_image = pygame.image.load("images/giveup.png").convert_alpha()
+            give_up_image = pygame.transform.scale(give_up_image, (give_up_square_size, give_up_square_size))
+            self.background.blit(give_up_image, (give_up_square_x, give_up_square_y))
+        except pygame.error as e:
+            print(f"Loi khi tai hinh anh giveup.png: {e}")
+
+        self.move_overlay = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
+        self.move_overlay.fill(possible_move_color)
+
+    def draw_square(self, surface, square, square_state, user_color=None, origin=(0, 0)):
+        """Vẽ một ô cờ (nền, ô được chọn, nước đi khả thi, quân cờ, vua bị chiếu).
+
+        Args:
+            surface (pygame.Surface): Nơi vẽ (màn hình hoặc một khung hình vẽ sẵn).
+            square (chess.Square): Ô cần vẽ.
+            square_state (tuple): ``(piece, selected, is_target, checked)`` của ô.
+            user_color (chess.Color or None): Màu quân ở phía dưới bàn cờ (xem get_pos_from_square).
+            origin (tuple): Toạ độ màn hình của góc trên bên trái ``surface``.
+
+        Returns:
+            pygame.Rect: Vùng màn hình của ô.
+        """
+        if self.background is None:
+            self._build_layers()
+        piece, selected, is_target, checked = square_state
+        x, y = get_pos_from_square(square, user_color)
+        screen_rect = pygame.Rect(x, y, square_size, square_size)
+        rect = screen_rect.move(-origin[0], -origin[1])
+        surface.blit(self.background, rect, screen_rect)
+
+        # Highlight o duoc chon
+        if selected:
+            pygame.draw.rect(surface, highlight_color, rect, 5)
+
+        # Highlight cac nuoc di kha thi
+        if is_target:
+            surface.blit(self.move_overlay, rect)
+
+        # Ve quan co
+        if piece:
+            piece_name = f"{'w' if piece.color == chess.WHITE else 'b'}{piece.symbol().upper()}"
+            surface.blit(pieces[piece_name], rect)
+
+        # Hien thi o do neu vua bi chieu
+        if checked:
+            pygame.draw.rect(surface, check_color, rect, 5) # Ve vien do
+        return screen_rect
+
+    def draw(self):
+        """Vẽ các ô đã thay đổi kể từ lần vẽ trước và cập nhật chúng lên màn hình."""
+        if self.background is None:
+            self._build_layers()
+
+        game = session.game
+        board = game.board
+        selected_square = game.selected_square
+        flipped = game.user_color != chess.WHITE
+        if flipped != self._flipped:
+            self._flipped = flipped
+            self._full_redraw = True
+
+        # Thong tin luat choi duoc tinh mot lan moi nuoc di (game_core.PositionState)
+        state = game.state
+        checked_king_square = state.check_square
+        move_targets = 0 # Bitboard cac o dich cua quan dang chon
+        if selected_square is not None and board.turn == game.user_color:
+            move_targets = state.targets.get(selected_square, 0)
+
+        full_redraw = self._full_redraw
+        if full_redraw:
+            screen.blit(self.background, (0, 0))
+            self._square_states.clear()
+            self._clock_texts.clear()
+            self._analysis_key = None
+            self._full_redraw = False
+
+        piece_map = board.piece_map()
+        dirty_rects = []
+        for square in chess.SQUARES:
+            piece = piece_map.get(square)
+            is_target = bool(move_targets & chess.BB_SQUARES[square])
+            square_state = (piece, square == selected_square, is_target, square == checked_king_square)
+            if self._square_states.get(square) == square_state:
+                continue
+            self._square_states[square] = square_state
+            dirty_rects.append(self.draw_square(screen, square, square_state))
+
+        if game.clock is not None:
+            # Ben phia tren ban co la bot, phia duoi la nguoi choi
+            for rect, color in ((top_clock_rect, game.bot_color), (bottom_clock_rect, game.user_color)):
+                remaining = game.clock.remaining(color)
+                text = format_clock(remaining)
+                if self._clock_texts.get(color) == text:
+                    continue
+                self._clock_texts[color] = text
+                screen.blit(self.background, rect, rect)
+                text_surface = font_large.render(text, True, clock_low_color if remaining < 10 else clock_color)
+                screen.blit(text_surface, text_surface.get_rect(midleft=(rect.x, rect.centery)))
+                dirty_rects.append(rect)
+
+        if analysis_mode:
+            dirty_rects.extend(self._draw_analysis(flipped))
+
+        if full_redraw:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def _draw_analysis(self, flipped):
+        """Vẽ thanh đánh giá và bảng biến chính nếu nội dung thay đổi.
+
+        Args:
+            flipped (bool): Bàn cờ đang quay phía quân đen xuống dưới.
+
+        Returns:
+            list: Các vùng màn hình đã vẽ lại.
+        """
+        lines = analysis_update.lines if analysis_update is not None else []
+        white_height = round(eval_bar_rect.height * (white_share(lines[0]) if lines else 0.5))
+        texts = tuple(analysis_line_text(analysis_update.board, info) for info in lines)
+        key = (white_height, texts)
+        if self._analysis_key == key:
+            return []
+        self._analysis_key = key
+
+        # Phan mau trang cua thanh danh gia nam ve phia quan trang tren ban co
+        pygame.draw.rect(screen, eval_bar_black, eval_bar_rect)
+        white_top = eval_bar_rect.y if flipped else eval_bar_rect.bottom - white_height
+        pygame.draw.rect(screen, eval_bar_white, (eval_bar_rect.x, white_top, eval_bar_rect.width, white_height))
+        pygame.draw.rect(screen, eval_bar_black, eval_bar_rect, 1)
+
+        screen.blit(self.background, pv_panel_rect, pv_panel_rect)
+        for i, text in enumerate(texts):
+            text_surface = font_medium.render(text, True, pv_text_color)
+            screen.blit(text_surface, (pv_panel_rect.x, pv_panel_rect.y + i * (pv_panel_rect.height // ANALYSIS_MULTIPV)),
+                        pygame.Rect(0, 0, pv_panel_rect.width, text_surface.get_height()))
+        return [eval_bar_rect, pv_panel_rect]
+
+board_renderer = BoardRenderer()
+
+class ReplayView:
+    """Màn hình xem lại một ván cờ với thanh trượt và bộ đệm khung hình.
+
+    Khung hình bàn cờ của mỗi nửa nước (nước vừa đi được tô viền, vua bị chiếu
+    được tô đỏ) được vẽ bằng ``BoardRenderer.draw_square`` lên một surface riêng
+    và giữ trong bộ đệm LRU; sau mỗi lần chuyển nửa nước, các khung hình gần con
+    trỏ được vẽ sẵn trong thời gian rảnh. Chuyển tới nửa nước đã có trong bộ đệm chỉ
+    là một lần blit; nửa nước xa được dựng từ keyframe gần nhất của Replay.
+
+    Args:
+        replay (replay.Replay): Ván cờ cần xem lại.
+        cache_size (int): Số khung hình tối đa giữ trong bộ đệm.
+        prefetch (int): Số khung hình vẽ sẵn mỗi phía của con trỏ.
+
+    Attributes:
+        user_color (chess.Color): Màu quân ở phía dưới bàn cờ.
+    """
+
+    def __init__(self, replay, cache_size=REPLAY_FRAME_CACHE, prefetch=REPLAY_PREFETCH):
+        self.replay = replay
+        self.cache_size = cache_size
+        self.prefetch_count = prefetch
+        self.user_color = chess.WHITE if replay.user_color is None else replay.user_color
+        self.frames = OrderedDict()
+        self.dragging = False
+        self._shown_ply = None
+
+    def invalidate(self):
+        """Yêu cầu vẽ lại toàn bộ màn hình xem lại ở khung hình tiếp theo."""
+        self._shown_ply = None
+
+    def frame(self, ply):
+        """Khung hình bàn cờ sau ``ply`` nửa nước, lấy từ bộ đệm hoặc vẽ mới.
+
+        Returns:
+            pygame.Surface: Khung hình có kích thước bằng bàn cờ.
+        """
+        surface = self.frames.get(ply)
+        if surface is not None:
+            self.frames.move_to_end(ply)
+            return surface
+        board = self.replay.board_at(ply)
+        last_move = self.replay.last_move(ply)
+        moved = (last_move.from_square, last_move.to_square) if last_move is not None else ()
+        checked_king_square = board.king(board.turn) if board.is_check() else None
+        surface = pygame.Surface((board_width, board_height)).convert()
+        piece_map = board.piece_map()
+        for square in chess.SQUARES:
+            square_state = (piece_map.get(square), square in moved, False, square == checked_king_square)
+            board_renderer.draw_square(surface, square, square_state, self.user_color, origin=board_rect.topleft)
+        self.frames[ply] = surface
+        if len(self.frames) > self.cache_size:
+            self.frames.popitem(last=False)
+        return surface
+
+    def prefetch(self, budget=REPLAY_PREFETCH_BUDGET):
+        """Vẽ sẵn các khung hình quanh con trỏ (gần trước, xa sau) trong giới hạn thời gian.
+
+        Args:
+            budget (float): Thời gian tối đa (giây).
+
+        Returns:
+            bool: True nếu vẫn còn khung hình gần con trỏ chưa được vẽ.
+        """
+        deadline = time.perf_counter() + budget
+        ply = self.replay.ply
+        for distance in range(1, self.prefetch_count + 1):
+            for target in (ply + distance, ply - distance):
+                if 0 <= target <= self.replay.length and target not in self.frames:
+                    if time.perf_counter() >= deadline:
+                        return True
+                    self.frame(target)
+                    self.frames.move_to_end(ply) # Khung hinh dang hien khong bi day ra khoi bo dem
+        return False
+
+    def seek_to_pos(self, x):
+        """Chuyển con trỏ tới nửa nước ứng với hoành độ ``x`` trên thanh trượt."""
+        fraction = (x - replay_slider_rect.x) / replay_slider_rect.width
+        self.replay.seek(round(max(0.0, min(fraction, 1.0)) * self.replay.length))
+
+    def handle_key(self, key):
+        """Xử lý phím điều khiển.
+
+        ←/→: lùi/tiến một nửa nước; ↓/↑ hoặc PageDown/PageUp: lùi/tiến một keyframe;
+        Home/End: về đầu/cuối ván; Esc: thoát chế độ xem lại.
+
+        Returns:
+            bool: False nếu người chơi muốn thoát chế độ xem lại.
+        """
+        replay = self.replay
+        if key == pygame.K_ESCAPE:
+            return False
+        if key == pygame.K_LEFT:
+            replay.step(-1)
+        elif key == pygame.K_RIGHT:
+            replay.step(1)
+        elif key in (pygame.K_DOWN, pygame.K_PAGEDOWN):
+            replay.step(-replay.keyframe_interval)
+        elif key in (pygame.K_UP, pygame.K_PAGEUP):
+            replay.step(replay.keyframe_interval)
+        elif key == pygame.K_HOME:
+            replay.seek(0)
+        elif key == pygame.K_END:
+            replay.seek(replay.length)
+        return True
+
+    def draw(self):
+        """Vẽ khung hình của nửa nước hiện tại, thông tin ván và thanh trượt nếu con trỏ đã đổi."""
+        replay = self.replay
+        ply = replay.ply
+        if ply == self._shown_ply:
+            return
+        full_redraw = self._shown_ply is None
+        self._shown_ply = ply
+        if full_redraw:
+            board_renderer.invalidate() # Man hinh choi can ve lai toan bo sau khi thoat
+            screen.fill(background)
+
+        screen.blit(self.frame(ply), board_rect)
+
+        pygame.draw.rect(screen, background, replay_info_rect)
+        white_name = replay.headers.get("White", "?")
+        black_name = replay.headers.get("Black", "?")
+        title = f"{white_name} vs {black_name}  {replay.result}"
+        position = f"Ply {ply}/{replay.length}  {replay.move_text(ply)}"
+        for i, text in enumerate((title, position)):
+            text_surface = font_medium.render(text, True, dialog_text_color)
+            screen.blit(text_surface, (replay_info_rect.x, replay_info_rect.y + 10 + i * 28))
+
+        pygame.draw.rect(screen, background, replay_slider_rect)
+        track = replay_slider_rect.inflate(0, -12)
+        pygame.draw.rect(screen, slider_color, track)
+        handle_x = track.x + (track.width * ply // replay.length if replay.length else 0)
+        pygame.draw.rect(screen, slider_handle_color, (handle_x - 4, replay_slider_rect.y, 8, replay_slider_rect.height))
+
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update([board_rect, replay_info_rect, replay_slider_rect])
+
+def start_replay(replay):
+    """Mở màn hình xem lại một ván cờ.
+
+    Args:
+        replay (replay.Replay): Ván cờ cần xem lại.
+    """
+    global replay_view
+    load_piece_images()
+    session.start_replay(replay)
+    replay_view = ReplayView(replay)
+
+def end_replay():
+    """Thoát màn hình xem lại, quay về màn hình trước đó."""
+    global replay_view
+    session.end_replay()
+    replay_view = None
+    board_renderer.invalidate()
+
+def replay_finished_game():
+    """Xem lại ván vừa kết thúc (nút "Replay" trên hộp thoại kết thúc ván)."""
+    game = session.game
+    headers = {"White": game.player_name(chess.WHITE), "Black": game.player_name(chess.BLACK)}
+    start_replay(Replay(game.board.move_stack, headers, game.result()))
+
 # Ham ve ban co va quan co
 def draw_board_and_pieces():
     """Vẽ bàn cờ, các quân cờ và các hiệu ứng đặc biệt lên màn hình.
@@ -185,62 +780,10 @@ def draw_board_and_pieces():
     Hàm này vẽ các ô vuông của bàn cờ với màu sắc xen kẽ,
     highlight ô được chọn, hiển thị các nước đi khả thi và vẽ các quân cờ
     ở vị trí hiện tại trên bàn cờ. Nó cũng đánh dấu ô vua đang bị chiếu.
+    Việc vẽ được giao cho BoardRenderer nên chỉ những ô thay đổi mới được vẽ lại.
     """
-    init_resources()
-    screen.fill(background)
-    checked_king_square = None
-    if board.is_check():
-        current_color = board.turn
-        for s in chess.SQUARES:
-            p = board.piece_at(s)
-            if p is not None and p.piece_type == chess.KING and p.color == current_color:
-                checked_king_square = s
-                break
-
-    for row in range(8):
-        for col in range(8):
-            # Dieu chinh thu tu row va col neu nguoi choi chon den
-            draw_row = row if user_color == chess.WHITE else 7 - row
-            draw_col = col if user_color == chess.WHITE else 7 - col
-            square = chess.square(draw_col, 7 - draw_row)
-            x = board_x + col * square_size
-            y = board_y + row * square_size
-            color = light_square if (row + col) % 2 == 0 else dark_square
-            pygame.draw.rect(screen, color, (x, y, square_size, square_size))
-
-            # Highlight o duoc chon
-            if selected_square == square:
-                pygame.draw.rect(screen, highlight_color, (x, y, square_size, square_size), 5)
-
-            # Highlight cac nuoc di kha thi
-            if selected_square is not None and board.turn == user_color:
-                for move in possible_moves:
-                    # Kiem tra va highlight dua tren ban co goc, khong phai ban co xoay
-                    if move.to_square == chess.square(col if user_color == chess.WHITE else 7 - col, 7 - (row if user_color == chess.WHITE else 7 - row)):
-                        s = pygame.Surface((square_size, square_size), pygame.SRCALPHA)
-                        s.fill(possible_move_color)
-                        screen.blit(s, (x, y, square_size, square_size))
-
-            # Ve quan co
-            piece = board.piece_at(square)
-            if piece:
-                piece_name = f"{'w' if piece.color == chess.WHITE else 'b'}{piece.symbol().upper()}"
-                screen.blit(pieces[piece_name], (x, y))
-
-            # Hien thi o do neu vua bi chieu
-            if square == checked_king_square:
-                pygame.draw.rect(screen, check_color, (x, y, square_size, square_size), 5) # Ve vien do
-
-    # Ve o bo cuoc (vi tri khong doi)
-    pygame.draw.rect(screen, white, give_up_rect)
-    try:
-        give_up_image = pygame.image.load("images/giveup.png").convert_alpha()
-        give_up_image = pygame.transform.scale(give_up_image, (give_up_square_size, give_up_square_size))
-        screen.blit(give_up_image, (give_up_square_x, give_up_square_y))
-    except pygame.error as e:
-        print(f"Loi khi tai hinh anh giveup.png: {e}")
-
-    pygame.display.flip()
+    load_piece_images()
+    board_renderer.draw()
 
 def show_dialog(message, buttons):
     """Hiển thị một hộp thoại đơn giản với thông báo và các nút tùy chọn.
@@ -254,7 +797,12 @@ def show_dialog(message, buttons):
               và văn bản tương ứng của nút.
     """
     init_resources()
-    dialog_width = 300
+    board_renderer.invalidate() # Hop thoai ve de len ban co
+    button_width = 80
+    button_height = 30
+    button_spacing = 20
+    buttons_width = button_width * len(buttons) + button_spacing * (len(buttons) - 1)
+    dialog_width = max(300, buttons_width + 40) # Hop thoai rong ra khi co nhieu nut (vi du nhieu muc do kho)
     dialog_height = 150
     dialog_x = (screen_width - dialog_width) // 2
     dialog_y = (screen_height - dialog_height) // 2
@@ -269,10 +817,7 @@ def show_dialog(message, buttons):
     screen.blit(text_surface, text_rect)
 
     button_rects = []
-    button_width = 80
-    button_height = 30
-    button_spacing = 20
-    start_x = dialog_x + (dialog_width - (button_width * len(buttons) + button_spacing * (len(buttons) - 1))) // 2
+    start_x = dialog_x + (dialog_width - buttons_width) // 2
     y_button = dialog_y + 90
 
     for i, button_text in enumerate(buttons):
@@ -299,6 +844,7 @@ def show_color_choice(message, buttons):
               và văn bản tương ứng của nút.
     """
     init_resources()
+    board_renderer.invalidate() # Hop thoai ve de len ban co
     dialog_width = 300
     dialog_height = 150
     dialog_x = (screen_width - dialog_width) // 2
@@ -332,250 +878,435 @@ def show_color_choice(message, buttons):
     pygame.display.flip()
     return button_rects
 
+def white_share(info):
+    """Tính phần của quân trắng trên thanh đánh giá.
+
+    Args:
+        info (dict): Thông tin một biến chính (cần ``score``).
+
+    Returns:
+        float: Giá trị từ 0 đến 1 (0.5 là cân bằng), theo đường cong logistic của centipawn.
+    """
+    score = info.get("score")
+    if score is None:
+        return 0.5
+    centipawns = score.white().score(mate_score=10000)
+    return 1 / (1 + 10 ** (-centipawns / 400))
+
+def analysis_line_text(board, info):
+    """Tạo dòng chữ của một biến chính, ví dụ ``+0.35  d18  1. e4 e5 2. Nf3``.
+
+    Args:
+        board (chess.Board): Thế cờ được phân tích.
+        info (dict): Thông tin biến chính (``score``, ``depth``, ``pv``).
+
+    Returns:
+        str: Đánh giá (theo phía trắng), độ sâu và các nước đầu của biến chính.
+    """
+    score = info.get("score")
+    if score is None:
+        score_text = "?"
+    else:
+        score = score.white()
+        mate = score.mate()
+        score_text = f"#{mate}" if mate is not None else f"{score.score() / 100:+.2f}"
+    try:
+        pv_text = board.variation_san(info.get("pv", [])[:ANALYSIS_PV_LENGTH])
+    except ValueError:
+        pv_text = "" # Bien chinh khong hop le voi the co (khong xay ra voi engine dung chuan)
+    return f"{score_text}  d{info.get('depth', '-')}  {pv_text}"
+
+def update_analysis():
+    """Phân tích thế cờ hiện tại nếu chế độ phân tích đang bật và thế cờ đã thay đổi.
+
+    Chỉ phân tích trong lượt của người chơi; khi người chơi đi, yêu cầu tìm nước
+    đi của bot dừng ngay lần phân tích đang chạy.
+    """
+    global analysis_job_id, analysis_position
+    game = session.game
+    if (not analysis_mode or engine_worker is None or session.phase != Phase.PLAYING
+            or game_over_pending or not game.is_user_turn() or game.is_over()):
+        return
+    position = game.board.fen()
+    if position == analysis_position:
+        return
+    analysis_position = position
+    analysis_job_id = engine_worker.analyse(game.board, post_analysis_update, multipv=ANALYSIS_MULTIPV,
+                                            interval=1 / FPS_CAP)
+
+def toggle_analysis():
+    """Bật/tắt chế độ phân tích (phím A); khi tắt, lần phân tích đang chạy được dừng ngay."""
+    global analysis_mode, analysis_job_id, analysis_position, analysis_update
+    if SERVER_ADDRESS:
+        print("Che do phan tich chi dung voi Stockfish tai may")
+        return
+    analysis_mode = not analysis_mode
+    if analysis_job_id is not None and engine_worker is not None:
+        engine_worker.stop_analysis(analysis_job_id)
+    analysis_job_id = None
+    analysis_position = None
+    analysis_update = None
+    board_renderer.invalidate() # Xoa thanh danh gia va bang bien chinh khi tat
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}"
+
+def metrics_overlay_lines():
+    """Tạo các dòng chữ của lớp hiển thị số liệu.
+
+    Returns:
+        list: Các dòng (khung hình và độ trễ sự kiện, engine, ghi lịch sử).
+    """
+    frame = metrics.summary("frame_seconds") or {}
+    lag = metrics.summary("event_lag_seconds", event="engine_result") or {}
+    lines = [f"Frame p50 {_ms(frame.get('p50'))} ms  p95 {_ms(frame.get('p95'))} ms  max {_ms(frame.get('max'))} ms"
+             f"  |  Event lag p95 {_ms(lag.get('p95'))} ms"]
+
+    search = metrics.summary("engine_search_seconds", source="engine") or {}
+    depth = metrics.summary("engine_depth") or {}
+    nps = metrics.gauge("engine_nps")
+    sources = ", ".join(f"{source} {metrics.counter('engine_searches_total', source=source):.0f}"
+                        for source in ("engine", "ponderhit", "cache", "book", "tablebase"))
+    lines.append(f"Engine last {_ms(search.get('last'))} ms  p95 {_ms(search.get('p95'))} ms"
+                 f"  depth {depth.get('last') or '-'}  nps {f'{nps / 1000:.0f}k' if nps else '-'}  ({sources})")
+
+    write = metrics.summary("history_write_seconds", kind="flush") or {}
+    final = metrics.summary("history_write_seconds", kind="final") or {}
+    errors = metrics.counter("engine_errors_total")
+    startup = {stage: metrics.gauge("startup_seconds", stage=stage)
+               for stage in ("first_frame", "engine_ready", "first_bot_move")}
+    lines.append(f"History write p95 {_ms(write.get('p95'))} ms  final {_ms(final.get('last'))} ms"
+                 f"  |  Engine errors {errors:.0f}  |  Startup frame {_ms(startup['first_frame'])}"
+                 f"  engine {_ms(startup['engine_ready'])}  bot {_ms(startup['first_bot_move'])} ms")
+    return lines
+
+def draw_metrics_overlay():
+    """Vẽ lớp hiển thị số liệu vào khoảng trống phía trên bàn cờ (bật/tắt bằng F3)."""
+    pygame.draw.rect(screen, overlay_background, overlay_rect)
+    for i, line in enumerate(metrics_overlay_lines()):
+        text_surface = font_medium.render(line, True, overlay_text_color)
+        screen.blit(text_surface, (overlay_rect.x + 8, overlay_rect.y + 4 + i * 24))
+    pygame.display.update(overlay_rect)
+
+def toggle_metrics_overlay():
+    """Bật/tắt lớp hiển thị số liệu; khi bật, lớp này được vẽ lại định kỳ qua METRICS_EVENT."""
+    global metrics_overlay
+    metrics_overlay = not metrics_overlay
+    pygame.time.set_timer(METRICS_EVENT, METRICS_OVERLAY_REFRESH_MS if metrics_overlay else 0)
+    board_renderer.invalidate() # Xoa lop so lieu khoi man hinh khi tat
+    if replay_view is not None:
+        replay_view.invalidate()
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của trò chơi.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Chess with Stockfish")
+    parser.add_argument("--fps", type=int, default=FPS_CAP, help="gioi han so khung hinh moi giay")
+    parser.add_argument("--scheduler", choices=["event", "poll"], default=SCHEDULER_MODE,
+                        help="event: chi ve lai khi trang thai thay doi; poll: ve lai moi khung hinh")
+    parser.add_argument("--book", default=BOOK_PATH, help="duong dan sach khai cuoc Polyglot (.bin)")
+    parser.add_argument("--syzygy", default=TABLEBASE_PATH,
+                        help="thu muc bang tan cuoc Syzygy (nhieu thu muc ngan cach boi dau phan cach duong dan)")
+    parser.add_argument("--time-control", type=TimeControl.parse, default=TIME_CONTROL,
+                        help='the thuc thoi gian "phut+giay", vi du "5+3" (mac dinh khong tinh gio)')
+    parser.add_argument("--server", default=SERVER_ADDRESS, metavar="HOST:PORT",
+                        help="dung Stockfish tren may chu server.py thay vi chay tai may")
+    parser.add_argument("--metrics-overlay", action="store_true", help="hien so lieu hieu nang khi bat dau (F3 de bat/tat)")
+    parser.add_argument("--replay", metavar="PATH", help="xem lai mot van co da luu (.pgn hoac .txt)")
+    parser.add_argument("--replay-game", type=int, default=0, metavar="N",
+                        help="so thu tu cua van trong file --replay (bat dau tu 0)")
+    parser.add_argument("--threads", type=int, default=ENGINE_THREADS,
+                        help="so luong cua Stockfish (mac dinh: theo so nhan CPU va do kho)")
+    parser.add_argument("--hash", type=int, default=ENGINE_HASH_MB, metavar="MB",
+                        help="kich thuoc bang bam cua Stockfish (mac dinh: theo RAM va do kho)")
+    parser.add_argument("--hash-policy", choices=HASH_POLICIES, default=ENGINE_HASH_POLICY,
+                        help="clear: xoa bang bam (ucinewgame) moi van, Threads/Hash theo do kho; "
+                             "keep: giu bang bam, dung mot Threads/Hash cho moi do kho")
+    parser.add_argument("--numa", default=ENGINE_NUMA_POLICY, metavar="POLICY",
+                        help='tuy chon NumaPolicy cua Stockfish, vi du "auto", "hardware", "none"')
+    parser.add_argument("--analysis", action="store_true",
+                        help="phan tich lien tuc trong luot nguoi choi: thanh danh gia va cac bien chinh (A de bat/tat)")
+    return parser.parse_args(argv)
+
 def reset_game():
     """Khởi tạo lại trạng thái trò chơi về ban đầu.
 
-    Hàm này đặt lại bàn cờ, các biến trạng thái liên quan đến trò chơi,
-    đóng file lịch sử hiện tại và tạo một file lịch sử mới.
+    Hàm này kết thúc việc ghi ván hiện tại (nếu có) và đặt lại phiên chơi
+    (bàn cờ và các trạng thái liên quan). Ván mới chỉ tạo file lịch sử khi
+    có nước đi đầu tiên.
     """
-    global board, selected_square, possible_moves, giveup, player_moved
-    global show_start_dialog, show_color_choice_dialog, show_difficulty_choice_dialog
-    global stockfish_level, user_color, bot_color, game_started, show_game_over_dialog
-    global game_over_message, game_over_buttons, show_give_up_dialog, give_up_buttons
-    global history_file, history_file_path
-
-    board = chess.Board()
-    selected_square = None
-    possible_moves = []
-    giveup = False
-    player_moved = False
-    show_start_dialog = True
-    show_color_choice_dialog = False
-    show_difficulty_choice_dialog = False
-    stockfish_level = None
-    user_color = None
-    bot_color = None
-    game_started = False
-    show_game_over_dialog = False
-    game_over_message = ""
+    global game_over_buttons, give_up_buttons, game_over_pending
+
+    finish_recording()
+    session.reset()
     game_over_buttons = []
-    show_give_up_dialog = False
     give_up_buttons = []
+    game_over_pending = False
+    pygame.time.set_timer(GAME_OVER_EVENT, 0)
+    pygame.time.set_timer(CLOCK_EVENT, 0)
 
-    # Dong file lich su cu neu co
-    if history_file:
-        history_file.close()
-        history_file = None
+    # Huy nuoc di bot dang tinh va dung ponder (neu co)
+    end_engine_game()
 
-    # Tao file lich su moi
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    history_file_path = os.path.join(history_folder, f"game_history_{timestamp}.txt")
-    try:
-        history_file = open(history_file_path, "w", encoding="utf-8")
-    except Exception as e:
-        print(f"Loi khi mo file lich su: {e}")
-        pygame.quit()
-        sys.exit()
-
-# Khoi tao engine va file lich su khi bat dau tro choi (moved to if __name__ == "__main__":)
+# Khoi tao engine va bo ghi lich su khi bat dau tro choi (moved to if __name__ == "__main__":)
 # init_engine_and_history()
 
 # Vong lap chinh cua tro choi Pygame
 running = True
-start_buttons = []
-color_choice_buttons = []
-difficulty_choice_buttons = []
+needs_redraw = True # Man hinh can ve lai o vong lap tiep theo
+
+# Cac su kien lam thay doi trang thai hoac noi dung man hinh (MOUSEMOTION thi khong)
+REDRAW_EVENTS = {pygame.MOUSEBUTTONDOWN, ENGINE_RESULT_EVENT, GAME_OVER_EVENT, CLOCK_EVENT, METRICS_EVENT, ANALYSIS_EVENT,
+                 pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWSIZECHANGED}
 
 if __name__ == "__main__":
+    args = parse_args()
+    SCHEDULER_MODE = args.scheduler
+    FPS_CAP = args.fps
+    BOOK_PATH = args.book
+    TABLEBASE_PATH = args.syzygy
+    ENGINE_THREADS = args.threads
+    ENGINE_HASH_MB = args.hash
+    ENGINE_HASH_POLICY = args.hash_policy
+    ENGINE_NUMA_POLICY = args.numa
+    TIME_CONTROL = args.time_control
+    SERVER_ADDRESS = args.server
+    session.time_control = TIME_CONTROL
     init_resources()
     init_engine_and_history()
+    if args.metrics_overlay:
+        toggle_metrics_overlay()
+    if args.analysis:
+        toggle_analysis()
+    if args.replay:
+        try:
+            start_replay(Replay.from_file(args.replay, args.replay_game))
+        except (OSError, ValueError) as e:
+            print(f"Khong mo duoc van co {args.replay}: {e}")
+    clock = pygame.time.Clock()
     while running:
-        for event in pygame.event.get():
+        if SCHEDULER_MODE == "event" and not needs_redraw:
+            # Khong co gi thay doi: ngu cho den khi co su kien (click, ket qua engine, hen gio)
+            events = [pygame.event.wait()] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        for event in events:
+            if event.type in REDRAW_EVENTS:
+                needs_redraw = True
+                if event.type not in (pygame.MOUSEBUTTONDOWN, ENGINE_RESULT_EVENT, GAME_OVER_EVENT, CLOCK_EVENT, METRICS_EVENT,
+                                      ANALYSIS_EVENT):
+                    board_renderer.invalidate() # Cua so bi ve de, can ve lai toan bo
+                    if replay_view is not None:
+                        replay_view.invalidate()
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                toggle_metrics_overlay()
+                needs_redraw = True
+            elif session.phase == Phase.REPLAY and event.type in REPLAY_INPUT_EVENTS:
+                # Xem lai: phim mui ten/Home/End, bam hoac keo tren thanh truot; su kien khac (engine, hen gio) xu ly nhu binh thuong
+                if event.type == pygame.KEYDOWN:
+                    if not replay_view.handle_key(event.key):
+                        end_replay()
+                    needs_redraw = True
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and replay_slider_rect.collidepoint(event.pos):
+                    replay_view.dragging = True
+                    replay_view.seek_to_pos(event.pos[0])
+                elif event.type == pygame.MOUSEMOTION and replay_view.dragging:
+                    replay_view.seek_to_pos(event.pos[0])
+                    needs_redraw = True
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    replay_view.dragging = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                toggle_analysis()
+                needs_redraw = True
+            elif event.type == ANALYSIS_EVENT:
+                metrics.observe("event_lag_seconds", time.perf_counter() - event.posted_at, event="analysis")
+                update = event.update
+                if update.job_id != analysis_job_id:
+                    continue # Ket qua cua the co cu, phan tich da bi dung
+                if update.error is not None:
+                    print(f"Analysis error: {update.error}")
+                else:
+                    analysis_update = update
+            elif event.type == GAME_OVER_EVENT:
+                if game_over_pending and session.phase == Phase.PLAYING:
+                    game_over_pending = False
+                    session.finish()
+                    finish_recording()
+            elif event.type == ENGINE_RESULT_EVENT:
+                metrics.observe("event_lag_seconds", time.perf_counter() - event.posted_at, event="engine_result")
+                result = event.result
+                if result.job_id != bot_job_id:
+                    continue # Ket qua cua yeu cau da bi huy
+                bot_job_id = None
+                if result.error is not None:
+                    # Pool tu khoi dong lai engine; yeu cau lai o vong lap sau, chi dung khi loi lien tiep
+                    print(f"Engine error: {result.error}")
+                    metrics.inc("engine_errors_total")
+                    engine_failures += 1
+                    if engine_failures >= ENGINE_MAX_FAILURES:
+                        running = False
+                elif session.game.is_bot_turn():
+                    engine_failures = 0
+                    if metrics.gauge("startup_seconds", stage="first_bot_move") is None:
+                        # Khong tinh thoi gian cho toi thieu (BOT_MOVE_DELAY) truoc khi bot di
+                        report_startup("first_bot_move", result.elapsed)
+                    game = session.game
+                    if not game.board.move_stack:
+                        print(f"Stockfish ({'White' if game.bot_color == chess.WHITE else 'Black'}) moves first: {result.move.uci()}")
+                    game.push_move(result.move, by_engine=True)
+                    recorder.record_move(result.move)
+            elif event.type == ENGINE_READY_EVENT:
+                if isinstance(event.error, FileNotFoundError):
+                    print(f"Khong tim thay Stockfish tai duong dan: {STOCKFISH_PATH}")
+                    running = False
+                elif event.error is not None:
+                    print(f"Loi khi khoi dong Stockfish: {event.error}")
+                    running = False
+                else:
+                    report_startup("engine_ready", time.perf_counter() - startup_started)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 pos = pygame.mouse.get_pos()
-                if show_start_dialog:
-                    start_buttons = show_dialog("Play with me!", ["Start"])
+                if session.phase == Phase.START:
                     for rect, text in start_buttons:
-                        if rect.collidepoint(pos):
-                            if text == "Start":
-                                show_start_dialog = False
-                                show_color_choice_dialog = True
-                                break
-                elif show_color_choice_dialog:
-                    color_choice_buttons = show_color_choice("Choose your color:", ["White", "Black"])
+                        if rect.collidepoint(pos) and text == "Start":
+                            session.start()
+                            break
+                elif session.phase == Phase.COLOR_CHOICE:
                     for rect, text in color_choice_buttons:
                         if rect.collidepoint(pos):
-                            if text == "White":
-                                user_color = chess.WHITE
-                                bot_color = chess.BLACK
-                                show_color_choice_dialog = False
-                                show_difficulty_choice_dialog = True
-                            elif text == "Black":
-                                user_color = chess.BLACK
-                                bot_color = chess.WHITE
-                                show_color_choice_dialog = False
-                                show_difficulty_choice_dialog = True
+                            session.choose_color(chess.WHITE if text == "White" else chess.BLACK)
                             break
-                elif show_difficulty_choice_dialog:
-                    difficulty_choice_buttons = show_dialog("Choose difficulty:", ["Easy", "Medium", "Hard"])
+                elif session.phase == Phase.DIFFICULTY_CHOICE:
                     for rect, text in difficulty_choice_buttons:
                         if rect.collidepoint(pos):
-                            if text == "Easy":
-                                stockfish_level = 2 # Skill Level 2 for easy
-                            elif text == "Medium":
-                                stockfish_level = 10 # Skill Level 10 for medium
-                            elif text == "Hard":
-                                stockfish_level = 20 # Skill Level 20 for hard
-                            if stockfish_level is not None and engine is not None:
-                                engine.configure({"Skill Level": stockfish_level})
-                                game_started = True
-                                show_difficulty_choice_dialog = False
-                                if user_color == chess.BLACK:
-                                    # Bot moves first if player chooses black
-                                    try:
-                                        result = engine.analyse(
-                                            board, chess.engine.Limit(time=1))
-                                        best_move = result["pv"][0]
-                                        print(f"Stockfish (White) moves first: {best_move.uci()}")
-                                        board.push(best_move)
-                                        if history_file:
-                                            history_file.write(f"White (Stockfish): {best_move.uci()}\n")
-                                        draw_board_and_pieces()
-                                        player_moved = False # Reset after bot's move
-                                    except chess.engine.EngineError as e:
-                                        print(f"Engine error: {e}")
-                                        running = False
-                                    except chess.engine.InfoError as e:
-                                        print(f"Engine info error: {e}")
-                                break
-                elif show_game_over_dialog:
+                            if engine_worker is not None:
+                                profile = session.choose_difficulty(text)
+                                options = profile.options()
+                                if engine_resources is not None:
+                                    # Threads/Hash theo do kho (giong nhau cho moi do kho khi giu bang bam)
+                                    options.update(engine_resources.options(text))
+                                    print(f"Engine resources: {engine_resources.describe(text)}")
+                                engine_worker.configure(options)
+                                if session.game.clock is not None:
+                                    pygame.time.set_timer(CLOCK_EVENT, CLOCK_REFRESH_MS)
+                                start_recording()
+                                if opening_book is not None:
+                                    opening_book.profile = BOOK_PROFILES.get(text)
+                                if tablebase is not None:
+                                    tablebase.profile = TABLEBASE_PROFILES.get(text)
+                            break
+                elif session.phase == Phase.GAME_OVER:
                     for rect, text in game_over_buttons:
                         if rect.collidepoint(pos):
                             if text == "Quit":
-                                show_game_over_dialog = False
                                 running = False
-                                break
                             elif text == "Play Again":
-                                show_game_over_dialog = False
                                 reset_game()
-                                break
+                            elif text == "Replay":
+                                replay_finished_game()
+                            break
                     if not running:
                         break
-                elif show_give_up_dialog:
+                elif session.phase == Phase.GIVE_UP_CONFIRM:
                     for rect, text in give_up_buttons:
                         if rect.collidepoint(pos):
                             if text == "Yes":
-                                giveup = True
-                                show_give_up_dialog = False
-                                show_game_over_dialog = True
-                                game_over_message = "You gave up!"
-                                game_over_buttons = show_dialog(game_over_message, ["Quit", "Play Again"])
+                                end_engine_game()
+                                pygame.time.set_timer(CLOCK_EVENT, 0)
+                                session.give_up()
+                                finish_recording()
                             elif text == "No":
-                                show_give_up_dialog = False
+                                session.cancel_give_up()
                             break
-                elif game_started and not show_game_over_dialog and not show_give_up_dialog: # Handle moves only when no dialog is shown
-                    if board.turn == user_color:
+                elif session.phase == Phase.PLAYING: # Handle moves only when no dialog is shown
+                    game = session.game
+                    if game.is_user_turn():
                         if give_up_rect.collidepoint(pos):
-                            show_give_up_dialog = True
-                            give_up_buttons = show_dialog("Are you sure you want to give up?", ["Yes", "No"])
+                            session.ask_give_up()
                         else:
                             clicked_square = get_square_from_pos(pos)
                             if clicked_square is not None:
-                                if selected_square is None:
-                                    if board.piece_at(clicked_square) is not None and board.piece_at(clicked_square).color == user_color:
-                                        selected_square = clicked_square
-                                        possible_moves = [move for move in board.legal_moves if move.from_square == selected_square]
-                                else:
-                                    move = chess.Move(selected_square, clicked_square)
-                                    if move in possible_moves:
-                                        board.push(move)
-                                        if history_file:
-                                            history_file.write(f"{'Black' if user_color == chess.BLACK else 'White'}: {move.uci()}\n")
-                                        selected_square = None
-                                        possible_moves = []
-                                        player_moved = True
-                                        draw_board_and_pieces() # Redraw after player's move
-                                    else:
-                                        if board.piece_at(clicked_square) is not None and board.piece_at(clicked_square).color == user_color:
-                                            selected_square = clicked_square
-                                            possible_moves = [move for move in board.legal_moves if move.from_square == selected_square]
-                                        else:
-                                            selected_square = None
-                                            possible_moves = []
-
-        if show_start_dialog:
-            screen.blit(background_image, (0, 0)) # Draw background image
-            start_buttons = show_dialog("Play with me!", ["Start"])
-        elif show_color_choice_dialog:
-            screen.fill(background)
-            color_choice_buttons = show_color_choice("Choose your color:", ["White", "Black"])
-        elif show_difficulty_choice_dialog:
-            screen.fill(background)
-            difficulty_choice_buttons = show_dialog("Choose difficulty:", ["Easy", "Medium", "Hard"])
-        elif show_game_over_dialog:
-            screen.fill(background) # Ensure background is redrawn to cover other elements
-            game_over_buttons = show_dialog(game_over_message, ["Quit", "Play Again"]) # Add Play Again button
-        elif show_give_up_dialog:
-            screen.fill(background) # Ensure background is redrawn to cover other elements
-            give_up_buttons = show_dialog("Are you sure you want to give up?", ["Yes", "No"]) # Only draw give up dialog
-        else:
-            draw_board_and_pieces() # Draw the board when no dialog is active
-
-        # Stockfish's turn
-        if game_started and not board.is_game_over() and board.turn == bot_color and not giveup and running and player_moved and not show_game_over_dialog and not show_give_up_dialog:
-            pygame.time.delay(500)
-            try:
-                result = engine.analyse(board, chess.engine.Limit(time=1))
-                best_move = result["pv"][0]
-                board.push(best_move)
-                if history_file:
-                    history_file.write(f"{'White' if bot_color == chess.WHITE else 'Black'} (Stockfish): {best_move.uci()}\n")
-                draw_board_and_pieces() # Redraw after Stockfish's move
-            except chess.engine.EngineError as e:
-                print(f"Engine error: {e}")
-                running = False
-            except chess.engine.InfoError as e:
-                print(f"Engine info error: {e}")
-            player_moved = False # Reset flag after Stockfish's move
-
-        # Check for game over
-        if game_started and board.is_game_over() and not show_game_over_dialog and not show_give_up_dialog:
-            pygame.time.delay(1000)
-            winner = "Black" if board.turn else "White"
-            game_over_message = ""
-            if board.is_checkmate():
-                game_over_message = f"Checkmate! Winner: {winner}"
-            elif board.is_stalemate():
-                game_over_message = "Stalemate!"
-            elif board.is_insufficient_material():
-                game_over_message = "Draw due to insufficient material!"
-            elif board.is_seventyfive_moves():
-                game_over_message = "Draw by 75-move rule!"
-            elif board.is_fivefold_repetition():
-                game_over_message = "Draw by fivefold repetition!"
-            if history_file:
-                history_file.write(f"{game_over_message}\n")
-            if game_over_message:
-                show_game_over_dialog = True
-                game_over_buttons = show_dialog(game_over_message, ["Quit", "Play Again"]) # Add Play Again button
-
-        pygame.display.flip()
-
-    # Close history file and quit Pygame
-    if not running:
-        if giveup and not show_game_over_dialog and history_file:
-            history_file.write(f"You gave up! Game history saved to: {history_file_path}\n")
-        if history_file:
-            history_file.close()
-        if engine is not None:
-            engine.quit()
-        pygame.quit()
-        sys.exit()
-
-    if engine is not None and running: # Ensure engine is not quit if the loop is still running
-        engine.quit()
-    if running:
-        pygame.quit()
-        sys.exit()
\ No newline at end of file
+                                move = game.click_square(clicked_square)
+                                if move is not None:
+                                    recorder.record_move(move)
+
+        if not running:
+            break
+
+        # Chi ve lai khi trang thai thay doi (che do "poll" ve lai moi khung hinh)
+        if needs_redraw or SCHEDULER_MODE == "poll":
+            needs_redraw = False
+            frame_started = time.perf_counter()
+            if session.phase == Phase.START:
+                screen.blit(background_image, (0, 0)) # Draw background image
+                start_buttons = show_dialog("Play with me!", ["Start"])
+            elif session.phase == Phase.COLOR_CHOICE:
+                screen.fill(background)
+                color_choice_buttons = show_color_choice("Choose your color:", ["White", "Black"])
+            elif session.phase == Phase.DIFFICULTY_CHOICE:
+                screen.fill(background)
+                difficulty_choice_buttons = show_dialog("Choose difficulty:", list(PROFILES))
+            elif session.phase == Phase.GAME_OVER:
+                screen.fill(background) # Ensure background is redrawn to cover other elements
+                game_over_buttons = show_dialog(session.game_over_message, ["Quit", "Play Again", "Replay"]) # Add Play Again button
+            elif session.phase == Phase.GIVE_UP_CONFIRM:
+                screen.fill(background) # Ensure background is redrawn to cover other elements
+                give_up_buttons = show_dialog("Are you sure you want to give up?", ["Yes", "No"]) # Only draw give up dialog
+            elif session.phase == Phase.REPLAY:
+                replay_view.draw() # Khung hinh ve san cua nua nuoc hien tai
+            else:
+                draw_board_and_pieces() # Draw the board when no dialog is active, only changed squares are updated
+            metrics.observe("frame_seconds", time.perf_counter() - frame_started)
+            if metrics_overlay:
+                draw_metrics_overlay()
+            if metrics.gauge("startup_seconds", stage="first_frame") is None:
+                report_startup("first_frame", time.perf_counter() - startup_started)
+                load_piece_images() # Man hinh bat dau da hien: tai hinh anh quan co truoc khi can ve ban co
+
+        # Stockfish's turn: gui yeu cau cho luong engine nen, ket qua ve qua ENGINE_RESULT_EVENT
+        if session.bot_should_move() and bot_job_id is None:
+            # Nuoc dau tien cua bot (nguoi choi chon den) khong can cho
+            request_bot_move(min_delay=BOT_MOVE_DELAY if session.game.board.move_stack else 0.0)
+
+        # Check for game over: hop thoai hien sau GAME_OVER_DELAY_MS qua GAME_OVER_EVENT, khong chan vong lap
+        if session.phase == Phase.PLAYING and not game_over_pending and session.game.is_over():
+            end_engine_game()
+            pygame.time.set_timer(CLOCK_EVENT, 0)
+            if session.game.clock is not None:
+                session.game.clock.stop()
+            game_over_pending = True
+            pygame.time.set_timer(GAME_OVER_EVENT, GAME_OVER_DELAY_MS, 1)
+
+        # Xem lai: ve san cac khung hinh quanh con tro khi ranh, tiep tuc o vong lap sau neu chua xong
+        if session.phase == Phase.REPLAY and not needs_redraw and replay_view.prefetch():
+            pygame.event.post(pygame.event.Event(REPLAY_PREFETCH_EVENT))
+
+        # Che do phan tich: bat dau phan tich lai moi khi den luot nguoi choi o the co moi
+        update_analysis()
+
+        clock.tick(FPS_CAP)
+
+    # Ghi not van dang choi do (neu co), cho luong ghi lich su xong va thoat Pygame
+    if recorder is not None:
+        finish_recording()
+        recorder.close()
+    if engine_worker is not None:
+        engine_worker.close()
+    if engine_cache is not None:
+        engine_cache.close()
+    if opening_book is not None:
+        opening_book.close()
+    if tablebase is not None:
+        tablebase.close()
+    if metrics_exporter is not None:
+        metrics_exporter.close()
+    pygame.quit()
+    sys.exit()
@@ -0,0 +1,465 @@
+"""Phân tích hàng loạt các ván trong lịch sử và ghi PGN có chú thích của engine.
+
+Công cụ đọc lần lượt các file lịch sử (PGN và định dạng văn bản cũ), tính khoá
+Zobrist của mọi thế cờ trong từng ván (``history_index.iter_position_keys``) và
+chia các thế cờ chưa có đánh giá cho một pool tiến trình con; mỗi tiến trình mở một
+Stockfish riêng (1 luồng) nên tốc độ tăng gần tuyến tính theo số nhân CPU. Các thế
+cờ trùng nhau (trong một ván, giữa các ván hoặc từ lần chạy trước) chỉ được phân
+tích một lần.
+
+Đánh giá được lưu trong SQLite theo khoá thế cờ và giới hạn tìm kiếm, được commit
+định kỳ; file nào đã ghi xong bản chú thích được đánh dấu kèm thời gian sửa và kích
+thước. Nếu công cụ bị dừng giữa chừng, lần chạy sau bỏ qua các file đã xong và các
+thế cờ đã có đánh giá, nên tiếp tục gần đúng từ chỗ đã dừng.
+
+Mỗi nước đi trong bản chú thích có đánh giá ``[%eval ...]`` sau nước đi; các nước
+làm giảm khả năng thắng của bên đi (theo đường cong win% của Lichess) được đánh dấu
+``?!`` (thiếu chính xác), ``?`` (sai lầm) hoặc ``??`` (sai lầm nghiêm trọng) kèm nước
+tốt nhất. Độ chính xác (accuracy) của mỗi bên được ghi vào thẻ ``WhiteAccuracy`` /
+``BlackAccuracy`` và chú thích đầu ván.
+
+Ví dụ::
+
+    python annotate.py --workers 4 --depth 14
+    python annotate.py history/selfplay --out annotated/selfplay --nodes 200000
+"""
+import argparse
+import math
+import multiprocessing.util
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.engine
+import chess.pgn
+
+from engine_cache import limit_key
+from game_core import STOCKFISH_PATH
+from history_index import HISTORY_FOLDERS, iter_history_files, iter_position_keys, read_games
+from recorder import write_file
+
+ANNOTATE_DB_PATH = os.path.join("cache", "annotate.sqlite3")
+ANNOTATED_FOLDER = "annotated" # Ngoai thu muc lich su de chi muc lich su khong doc trung cac van
+DEFAULT_DEPTH = 14
+BATCH_SIZE = 32 # So the co toi da moi lan giao cho mot tien trinh con
+CHECKPOINT_INTERVAL = 5.0 # Chu ky commit danh gia vao SQLite (giay)
+MATE_SCORE = 100000 # Diem quy doi cua the chieu het (centipawn)
+
+# Muc giam win% (0-100) cua ben di -> (ten, NAG), tu nang den nhe
+JUDGEMENTS = (
+    (15.0, "Blunder", chess.pgn.NAG_BLUNDER),
+    (10.0, "Mistake", chess.pgn.NAG_MISTAKE),
+    (5.0, "Inaccuracy", chess.pgn.NAG_DUBIOUS_MOVE),
+)
+
+# Engine rieng cua moi tien trinh con (khoi tao trong _init_worker)
+_engine = None
+
+
+def win_percent(centipawns):
+    """Khả năng thắng (0-100) ứng với một đánh giá centipawn, theo đường cong của Lichess.
+
+    Args:
+        centipawns (int): Đánh giá theo phía bên cần tính.
+
+    Returns:
+        float: 50 là cân bằng, gần 100 là thắng chắc.
+    """
+    centipawns = max(-1000, min(centipawns, 1000))
+    return 50 + 50 * (2 / (1 + math.exp(-0.00368208 * centipawns)) - 1)
+
+
+def move_accuracy(win_before, win_after):
+    """Độ chính xác (0-100) của một nước đi theo mức giảm win% của bên đi (công thức của Lichess).
+
+    Args:
+        win_before (float): Win% của bên đi trước nước đi.
+        win_after (float): Win% của bên đi sau nước đi.
+
+    Returns:
+        float: 100 nếu nước đi không làm giảm khả năng thắng.
+    """
+    loss = max(0.0, win_before - win_after)
+    return max(0.0, min(103.1668 * math.exp(-0.04354 * loss) - 3.1669, 100.0))
+
+
+def judge(loss):
+    """Phân loại một nước đi theo mức giảm win%.
+
+    Args:
+        loss (float): Mức giảm win% (0-100) của bên đi.
+
+    Returns:
+        tuple or None: ``(tên, NAG)`` (ví dụ ``("Blunder", chess.pgn.NAG_BLUNDER)``), None nếu nước đi ổn.
+    """
+    for threshold, name, nag in JUDGEMENTS:
+        if loss >= threshold:
+            return name, nag
+    return None
+
+
+def terminal_evaluation(board):
+    """Đánh giá thế cờ đã kết thúc mà không cần engine.
+
+    Returns:
+        tuple or None: ``(cp, mate, best, depth)`` như kết quả của engine, None nếu ván chưa kết thúc.
+    """
+    if board.is_checkmate():
+        # Ben den luot da bi chieu het
+        return (-MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE), 0, None, 0
+    if board.is_game_over():
+        return 0, None, None, 0
+    return None
+
+
+def _init_worker(engine_path, options):
+    global _engine
+    _engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    _engine.configure(options)
+    # Tat engine khi tien trinh con ket thuc, neu khong luong nen cua engine giu tien trinh song
+    multiprocessing.util.Finalize(_engine, _engine.quit, exitpriority=10)
+
+
+def evaluate_positions(positions, limit):
+    """Phân tích một nhóm thế cờ trong tiến trình con.
+
+    Args:
+        positions (list): Các cặp ``(key, fen)``, theo thứ tự trong ván để engine dùng lại bảng băm.
+        limit (chess.engine.Limit): Giới hạn tìm kiếm mỗi thế cờ.
+
+    Returns:
+        list: Các tuple ``(key, cp, mate, best, depth)``: ``cp`` theo phía trắng (chiếu hết
+        được quy đổi thành ±MATE_SCORE), ``mate`` là số nước tới chiếu hết theo phía trắng
+        (None nếu không có), ``best`` là nước tốt nhất dạng UCI.
+    """
+    rows = []
+    for key, fen in positions:
+        info = _engine.analyse(chess.Board(fen), limit)
+        score = info["score"].white()
+        pv = info.get("pv")
+        rows.append((key, score.score(mate_score=MATE_SCORE), score.mate(), pv[0].uci() if pv else None, info.get("depth")))
+    return rows
+
+
+class EvaluationStore:
+    """Kho đánh giá thế cờ và danh sách file đã chú thích xong, lưu trong SQLite.
+
+    Args:
+        path (str): Đường dẫn file SQLite.
+        limit (chess.engine.Limit): Giới hạn tìm kiếm của lần chạy (đánh giá với giới hạn
+            khác được lưu riêng).
+    """
+
+    def __init__(self, path=ANNOTATE_DB_PATH, limit=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.limit = limit_key(limit or chess.engine.Limit(depth=DEFAULT_DEPTH))
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS evaluations (
+                hash INTEGER NOT NULL, search_limit TEXT NOT NULL, cp INTEGER NOT NULL, mate INTEGER,
+                best TEXT, depth INTEGER, PRIMARY KEY (hash, search_limit)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS annotated_files (
+                path TEXT NOT NULL, search_limit TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL,
+                PRIMARY KEY (path, search_limit));
+        """)
+        self._last_commit = time.monotonic()
+
+    def get_many(self, keys):
+        """Tra cứu đánh giá của nhiều thế cờ.
+
+        Args:
+            keys (iterable): Khoá thế cờ (``history_index.position_key``).
+
+        Returns:
+            dict: Khoá -> ``(cp, mate, best, depth)`` cho các thế cờ đã có đánh giá.
+        """
+        keys = list(set(keys))
+        found = {}
+        for start in range(0, len(keys), 500): # Gioi han so tham so cua mot cau lenh SQLite
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT hash, cp, mate, best, depth FROM evaluations WHERE search_limit = ? "
+                f"AND hash IN ({','.join('?' * len(chunk))})", (self.limit, *chunk))
+            for key, *evaluation in rows:
+                found[key] = tuple(evaluation)
+        return found
+
+    def put_many(self, rows):
+        """Lưu đánh giá (commit định kỳ, xem ``checkpoint``).
+
+        Args:
+            rows (list): Các tuple ``(key, cp, mate, best, depth)``.
+        """
+        self._db.executemany(
+            "INSERT OR REPLACE INTO evaluations (hash, search_limit, cp, mate, best, depth) VALUES (?, ?, ?, ?, ?, ?)",
+            ((key, self.limit, *evaluation) for key, *evaluation in rows))
+        if time.monotonic() - self._last_commit >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Ghi các đánh giá mới xuống đĩa."""
+        self._db.commit()
+        self._last_commit = time.monotonic()
+
+    def is_annotated(self, path, stat):
+        """bool: True nếu file đã được chú thích xong và không thay đổi từ đó."""
+        row = self._db.execute("SELECT mtime, size FROM annotated_files WHERE path = ? AND search_limit = ?",
+                               (path, self.limit)).fetchone()
+        return row is not None and tuple(row) == (stat.st_mtime, stat.st_size)
+
+    def mark_annotated(self, path, stat):
+        """Đánh dấu file đã được chú thích xong (commit ngay cùng các đánh giá đang chờ)."""
+        self._db.execute("INSERT OR REPLACE INTO annotated_files (path, search_limit, mtime, size) VALUES (?, ?, ?, ?)",
+                         (path, self.limit, stat.st_mtime, stat.st_size))
+        self.checkpoint()
+
+    def close(self):
+        """Commit và đóng file SQLite."""
+        if self._db is not None:
+            self.checkpoint()
+            self._db.close()
+            self._db = None
+
+
+def annotate_game(record, keys, evaluations, annotator=""):
+    """Tạo bản PGN có chú thích của một ván.
+
+    Args:
+        record (history_index.GameRecord): Ván cờ.
+        keys (list): Khoá của từng thế cờ trong ván (từ thế ban đầu tới sau nước cuối).
+        evaluations (dict): Khoá -> ``(cp, mate, best, depth)`` của mọi thế cờ trong ván.
+        annotator (str): Mô tả engine và giới hạn tìm kiếm, ghi vào thẻ ``Annotator``.
+
+    Returns:
+        tuple: ``(pgn, summary)``: nội dung PGN và dict gồm ``accuracy`` và số nước theo
+        từng loại (``Blunder``, ``Mistake``, ``Inaccuracy``) của mỗi bên.
+    """
+    game = chess.pgn.Game()
+    for name, value in record.headers.items():
+        game.headers[name] = value
+    game.headers["Result"] = record.result
+    if annotator:
+        game.headers["Annotator"] = annotator
+
+    summary = {color: {"accuracy": [], "Blunder": 0, "Mistake": 0, "Inaccuracy": 0} for color in chess.COLORS}
+    board = chess.Board()
+    node = game
+    for ply, move in enumerate(record.moves):
+        mover = board.turn
+        cp_before, _, best, _ = evaluations[keys[ply]]
+        cp_after, mate_after, _, _ = evaluations[keys[ply + 1]]
+        sign = 1 if mover == chess.WHITE else -1
+        win_before = win_percent(sign * cp_before)
+        win_after = win_percent(sign * cp_after)
+        summary[mover]["accuracy"].append(move_accuracy(win_before, win_after))
+
+        best_san = board.san(chess.Move.from_uci(best)) if best and best != move.uci() else None
+        node = node.add_variation(move)
+        board.push(move)
+        judgement = judge(win_before - win_after)
+        if judgement is not None:
+            name, nag = judgement
+            summary[mover][name] += 1
+            node.nags.add(nag)
+            node.comment = f"{name}. {best_san} was best." if best_san else f"{name}."
+        if not board.is_game_over():
+            node.set_eval(chess.engine.PovScore(
+                chess.engine.Mate(mate_after) if mate_after is not None else chess.engine.Cp(cp_after), chess.WHITE))
+
+    for color in chess.COLORS:
+        accuracies = summary[color].pop("accuracy")
+        summary[color]["accuracy"] = sum(accuracies) / len(accuracies) if accuracies else None
+        if summary[color]["accuracy"] is not None:
+            game.headers[f"{chess.COLOR_NAMES[color].capitalize()}Accuracy"] = f"{summary[color]['accuracy']:.1f}"
+    game.comment = " ".join(summary_text(color, summary[color]) for color in chess.COLORS)
+    return f"{game}\n\n", summary
+
+
+def summary_text(color, side):
+    """Dòng tóm tắt của một bên, ví dụ ``White: accuracy 87.5%, 1 blunders, 0 mistakes, 2 inaccuracies.``"""
+    accuracy = "-" if side["accuracy"] is None else f"{side['accuracy']:.1f}%"
+    return (f"{chess.COLOR_NAMES[color].capitalize()}: accuracy {accuracy}, {side['Blunder']} blunders, "
+            f"{side['Mistake']} mistakes, {side['Inaccuracy']} inaccuracies.")
+
+
+class _PendingFile:
+    """Một file lịch sử đang chờ đánh giá các thế cờ của nó."""
+
+    def __init__(self, path, stat, out_path, games):
+        self.path = path
+        self.stat = stat
+        self.out_path = out_path
+        self.games = games # Danh sach (record, keys)
+        self.waiting = set()
+
+
+def output_path(path, folders, out_dir):
+    """Đường dẫn bản chú thích của một file lịch sử (giữ cấu trúc thư mục, đuôi ``.pgn``)."""
+    for folder in folders:
+        folder = os.path.normpath(folder)
+        if path.startswith(folder + os.sep):
+            relative = os.path.relpath(path, os.path.dirname(folder) or ".")
+            break
+    else:
+        relative = os.path.basename(path)
+    return os.path.join(out_dir, os.path.splitext(relative)[0] + ".pgn")
+
+
+def annotate_history(folders, out_dir, store, limit, workers, engine_path, batch_size=BATCH_SIZE, options=None):
+    """Chú thích mọi ván trong các thư mục lịch sử.
+
+    Các file được đọc lần lượt; số nhóm thế cờ đang chờ tiến trình con được giới hạn
+    (gấp 4 lần số tiến trình) nên bộ nhớ không tăng theo kích thước lịch sử.
+
+    Args:
+        folders (list): Các thư mục lịch sử.
+        out_dir (str): Thư mục ghi bản chú thích (bị loại khỏi việc quét).
+        store (EvaluationStore): Kho đánh giá của lần chạy.
+        limit (chess.engine.Limit): Giới hạn tìm kiếm mỗi thế cờ.
+        workers (int): Số tiến trình Stockfish song song.
+        engine_path (str): Đường dẫn tới Stockfish.
+        batch_size (int): Số thế cờ tối đa mỗi lần giao cho một tiến trình con.
+        options (dict or None): Tuỳ chọn UCI của engine (mặc định 1 luồng).
+
+    Returns:
+        dict: Thống kê ``files``, ``games``, ``skipped_files``, ``positions``, ``evaluated``.
+    """
+    out_root = os.path.normpath(out_dir) + os.sep
+    stats = {"files": 0, "games": 0, "skipped_files": 0, "positions": 0, "evaluated": 0}
+    annotator = f"{os.path.basename(engine_path)} ({store.limit})"
+    waiters = {} # Khoa the co dang duoc phan tich -> cac file dang cho
+    futures = {}
+
+    def finish(pending):
+        evaluations = store.get_many(key for _, keys in pending.games for key in keys)
+        texts = []
+        for record, keys in pending.games:
+            text, _ = annotate_game(record, keys, evaluations, annotator)
+            texts.append(text)
+            stats["games"] += 1
+        os.makedirs(os.path.dirname(pending.out_path) or ".", exist_ok=True)
+        write_file(pending.out_path, "".join(texts))
+        store.mark_annotated(pending.path, pending.stat)
+        stats["files"] += 1
+        print(f"[{stats['files']}] {pending.path} -> {pending.out_path} ({len(pending.games)} games)")
+
+    def collect(done):
+        for future in done:
+            positions = futures.pop(future)
+            rows = future.result()
+            store.put_many(rows)
+            stats["evaluated"] += len(rows)
+            for key, _ in positions:
+                for pending in waiters.pop(key, ()):
+                    pending.waiting.discard(key)
+                    if not pending.waiting:
+                        finish(pending)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine_path, options or {"Threads": 1})) as pool:
+        for entry in iter_history_files(folders):
+            path = os.path.normpath(entry.path)
+            if path.startswith(out_root):
+                continue
+            stat = entry.stat()
+            if store.is_annotated(path, stat):
+                stats["skipped_files"] += 1
+                continue
+            try:
+                records = read_games(path)
+            except (OSError, ValueError) as e:
+                print(f"Loi khi doc {path}: {e}")
+                continue
+
+            pending = _PendingFile(path, stat, output_path(path, folders, out_dir), [])
+            positions = {}
+            terminal = []
+            for record in records:
+                keys = []
+                for board, key in iter_position_keys(record.moves):
+                    keys.append(key)
+                    if key not in positions:
+                        evaluation = terminal_evaluation(board)
+                        if evaluation is not None:
+                            terminal.append((key, *evaluation))
+                        positions[key] = board.fen()
+                pending.games.append((record, keys))
+            stats["positions"] += len(positions)
+            if terminal:
+                store.put_many(terminal)
+
+            known = store.get_many(positions)
+            missing = []
+            for key, fen in positions.items():
+                if key in known:
+                    continue
+                pending.waiting.add(key)
+                if key in waiters:
+                    waiters[key].append(pending) # Dang duoc phan tich cho file khac
+                else:
+                    waiters[key] = [pending]
+                    missing.append((key, fen))
+            if not pending.waiting:
+                finish(pending)
+                continue
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                futures[pool.submit(evaluate_positions, batch, limit)] = batch
+                while len(futures) >= workers * 4:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect(done)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            collect(done)
+    return stats
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của công cụ chú thích.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Annotate the game history with engine evaluations")
+    parser.add_argument("folders", nargs="*", default=HISTORY_FOLDERS, help="cac thu muc lich su")
+    parser.add_argument("--out", default=ANNOTATED_FOLDER, help="thu muc ghi PGN co chu thich")
+    parser.add_argument("--db", default=ANNOTATE_DB_PATH, help="file SQLite luu danh gia va tien do")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="so tien trinh Stockfish song song")
+    parser.add_argument("--depth", type=int, default=None, help=f"do sau moi the co (mac dinh {DEFAULT_DEPTH})")
+    parser.add_argument("--nodes", type=int, default=None, help="gioi han so node moi the co")
+    parser.add_argument("--time", type=float, default=None, help="thoi gian moi the co (giay)")
+    parser.add_argument("--hash", type=int, default=16, help="bo nho bang bam (MB) cua moi engine")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="so the co moi lan giao cho mot tien trinh")
+    parser.add_argument("--engine", default=STOCKFISH_PATH, help="duong dan toi Stockfish")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chú thích lịch sử ván đấu và in thống kê tốc độ."""
+    args = parse_args(argv)
+    if args.depth is None and args.nodes is None and args.time is None:
+        args.depth = DEFAULT_DEPTH
+    limit = chess.engine.Limit(time=args.time, nodes=args.nodes, depth=args.depth)
+    store = EvaluationStore(args.db, limit)
+    started = time.perf_counter()
+    try:
+        stats = annotate_history(args.folders, args.out, store, limit, args.workers, args.engine,
+                                 batch_size=args.batch, options={"Threads": 1, "Hash": args.hash})
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - started
+    rate = stats["evaluated"] / elapsed if elapsed > 0 else 0.0
+    print(f"Annotated {stats['games']} games in {stats['files']} files ({stats['skipped_files']} files already done)")
+    print(f"{stats['positions']} positions, {stats['evaluated']} evaluated by the engine "
+          f"in {elapsed:.1f}s: {rate:.1f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""Đo hiệu năng của trò chơi mà không cần mở cửa sổ.
+
+Bộ đo dùng driver video ``dummy`` của SDL nên chạy được trên máy không có màn
+hình (ví dụ máy CI). Các nhóm phép đo:
+
+- ``board``: thời gian vẽ một khung hình bàn cờ (vẽ lại toàn bộ, chọn quân, đi
+  quân) ở một số thế cờ điển hình;
+- ``dialog``: thời gian vẽ các hộp thoại (chọn màu, chọn độ khó, kết thúc ván);
+- ``rules``: thời gian xử lý luật mỗi nước đi (``legal_moves``, ``is_game_over``
+  và game_core.PositionState);
+- ``engine``: thời gian khứ hồi của một yêu cầu tìm nước đi qua EngineWorker ở
+  từng mức độ khó;
+- ``nps``: số node mỗi giây của Stockfish (lệnh ``bench``).
+
+Kết quả được in ra và có thể ghi thành file JSON. Với ``--compare`` kết quả được so
+với một file JSON đã lưu trước đó và các phép đo chậm đi quá ngưỡng bị đánh dấu
+là suy giảm (mã thoát 1).
+
+Ví dụ::
+
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --only board,rules --compare baseline.json --threshold 0.2
+"""
+import os
+
+# Phai dat truoc khi import pygame de khong mo cua so that
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+
+import chess
+import pygame
+
+import ChessGame
+from difficulty import PROFILES
+from engine_worker import EngineWorker
+from game_core import PositionState
+from stockfish_build import bench_nps
+
+SECTIONS = ("board", "dialog", "rules", "engine", "nps")
+ENGINE_RESULT_TIMEOUT = 60.0 # Thoi gian toi da (giay) cho mot ket qua cua engine truoc khi bo phep do
+# Nguong so sanh: phep do phai cham di qua ca ti le lan do lech tuyet doi moi bi coi la suy giam
+MIN_REGRESSION_SECONDS = 20e-6 # Do lech tuyet doi toi thieu (giay), nho hon muc nhieu cua dong ho
+SUB_MS_THRESHOLD = 1.0 # Ti le toi thieu cho cac phep do duoi 1 ms (nhieu hon han so voi phep do dai)
+UNIT_SCALE = {"ms": 1000.0, "us": 1e6} # He so doi tu giay sang don vi cua ket qua
+
+# Cac the co dien hinh: khai cuoc, trung cuoc nhieu quan, tan cuoc va the bi chieu
+POSITIONS = {
+    "start": chess.STARTING_FEN,
+    "middlegame": "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 9",
+    "endgame": "8/5pk1/6p1/3R4/1r6/6P1/5PK1/8 w - - 0 40",
+    "check": "rnbqkbnr/ppp2ppp/8/1B1pp3/4P3/8/PPPP1PPP/RNBQK1NR b KQkq - 1 3",
+}
+
+
+def summarize(samples, unit="ms", scale=1000.0):
+    """Tính các thống kê của một dãy thời gian đo.
+
+    Args:
+        samples (list): Thời gian mỗi lần đo (giây).
+        unit (str): Đơn vị hiển thị.
+        scale (float): Hệ số đổi từ giây sang đơn vị hiển thị.
+
+    Returns:
+        dict: ``value`` (trung vị), ``mean``, ``p95``, ``min`` (dùng khi so sánh),
+        ``samples``, ``unit`` và ``better`` (``"lower"``).
+    """
+    values = sorted(sample * scale for sample in samples)
+    return {
+        "value": statistics.median(values),
+        "mean": statistics.fmean(values),
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "min": values[0],
+        "samples": len(values),
+        "unit": unit,
+        "better": "lower",
+    }
+
+
+def measure(func, repeat, number=1, warmup=3):
+    """Đo thời gian chạy một hàm.
+
+    Args:
+        func (callable): Hàm cần đo (không tham số).
+        repeat (int): Số lần đo.
+        number (int): Số lần gọi hàm trong mỗi lần đo (cho các hàm rất nhanh).
+        warmup (int): Số lần gọi bỏ qua trước khi đo (làm nóng bộ nhớ đệm).
+
+    Returns:
+        list: Thời gian trung bình mỗi lần gọi (giây) của từng lần đo.
+    """
+    for _ in range(warmup * number):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+
+def _setup_position(fen):
+    session = ChessGame.session
+    session.reset()
+    session.game.board = chess.Board(fen)
+    # Nguoi choi den luot di de co the chon quan
+    session.game.user_color = session.game.board.turn
+    return session.game
+
+
+def bench_board(frames):
+    """Đo thời gian vẽ bàn cờ ở các thế cờ trong POSITIONS.
+
+    Args:
+        frames (int): Số khung hình đo cho mỗi trường hợp.
+
+    Returns:
+        dict: Kết quả theo tên phép đo (``board.full.<the co>``, ``board.select.<the co>``,
+        ``board.move.<the co>``).
+    """
+    results = {}
+    renderer = ChessGame.board_renderer
+    for name, fen in POSITIONS.items():
+        game = _setup_position(fen)
+        ChessGame.draw_board_and_pieces()
+
+        def full_frame():
+            renderer.invalidate()
+            ChessGame.draw_board_and_pieces()
+        results[f"board.full.{name}"] = summarize(measure(full_frame, frames))
+
+        # Chon roi bo chon mot quan co nuoc di: chi cac o lien quan duoc ve lai
+        square = next(iter(game.state.moves_from))
+        empty = next(sq for sq in chess.SQUARES if game.board.piece_at(sq) is None)
+        def select_frame():
+            game.select(square if game.selected_square is None else empty)
+            ChessGame.draw_board_and_pieces()
+        results[f"board.select.{name}"] = summarize(measure(select_frame, frames))
+
+        move = next(iter(game.board.legal_moves))
+        def move_frame():
+            if game.board.move_stack and game.board.peek() == move:
+                game.board.pop()
+            else:
+                game.board.push(move)
+            ChessGame.draw_board_and_pieces()
+        results[f"board.move.{name}"] = summarize(measure(move_frame, frames))
+    return results
+
+
+def bench_dialogs(frames):
+    """Đo thời gian vẽ các hộp thoại của trò chơi.
+
+    Args:
+        frames (int): Số lần vẽ mỗi hộp thoại.
+
+    Returns:
+        dict: Kết quả theo tên phép đo (``dialog.<hop thoai>``).
+    """
+    _setup_position(chess.STARTING_FEN)
+    dialogs = {
+        "color": lambda: ChessGame.show_color_choice("Choose your color:", ["White", "Black"]),
+        "difficulty": lambda: ChessGame.show_dialog("Choose difficulty:", list(PROFILES)),
+        "game_over": lambda: ChessGame.show_dialog("Checkmate! Winner: White", ["Quit", "Play Again"]),
+    }
+    return {f"dialog.{name}": summarize(measure(draw, frames)) for name, draw in dialogs.items()}
+
+
+def bench_rules(repeat, number=200):
+    """Đo thời gian xử lý luật chơi cho mỗi nước đi.
+
+    Args:
+        repeat (int): Số lần đo.
+        number (int): Số lần gọi trong mỗi lần đo.
+
+    Returns:
+        dict: Kết quả (micro giây mỗi lần gọi) theo tên phép đo
+        (``rules.legal_moves.<the co>``, ``rules.is_game_over.<the co>``, ``rules.state.<the co>``).
+    """
+    results = {}
+    for name, fen in POSITIONS.items():
+        board = chess.Board(fen)
+        cases = {
+            "legal_moves": lambda: list(board.legal_moves),
+            "is_game_over": board.is_game_over,
+            "state": lambda: PositionState(board),
+        }
+        for case, func in cases.items():
+            samples = measure(func, repeat, number)
+            results[f"rules.{case}.{name}"] = summarize(samples, unit="us", scale=1e6)
+    return results
+
+
+def bench_engine(engine_path, repeat):
+    """Đo thời gian khứ hồi của yêu cầu tìm nước đi qua EngineWorker ở mỗi mức độ khó.
+
+    Không dùng ponder, bộ đệm hay sách khai cuộc để mọi yêu cầu đều tới engine.
+
+    Args:
+        engine_path (str): Đường dẫn engine.
+        repeat (int): Số lần đo cho mỗi thế cờ.
+
+    Returns:
+        dict: Kết quả theo tên phép đo (``engine.<muc do kho>``); các yêu cầu lỗi không
+        được tính, mức độ khó không có yêu cầu thành công nào bị bỏ qua.
+
+    Raises:
+        RuntimeError: Nếu một yêu cầu không có kết quả sau ENGINE_RESULT_TIMEOUT giây.
+    """
+    done = threading.Event()
+    results = {}
+    errors = []
+    last = []
+
+    def on_result(result):
+        if result.error is not None:
+            errors.append(result.error)
+        if result.job_id is None:
+            # Loi cau hinh engine, khong phai ket qua cua yeu cau dang cho
+            return
+        last[:] = [result]
+        done.set()
+
+    worker = EngineWorker(engine_path, on_result)
+    worker.start()
+    try:
+        for name, profile in PROFILES.items():
+            worker.configure(profile.options())
+            samples = []
+            for fen in POSITIONS.values():
+                board = chess.Board(fen)
+                for _ in range(repeat):
+                    done.clear()
+                    started = time.perf_counter()
+                    worker.submit(board, profile.limit())
+                    if not done.wait(ENGINE_RESULT_TIMEOUT):
+                        raise RuntimeError(f"khong co ket qua sau {ENGINE_RESULT_TIMEOUT:.0f} giay ({name})")
+                    if last[0].error is None:
+                        # Yeu cau loi khong phai thoi gian tim nuoc di
+                        samples.append(time.perf_counter() - started)
+            worker.new_game()
+            if samples:
+                results[f"engine.{name}"] = summarize(samples)
+    finally:
+        worker.close()
+    if errors:
+        print(f"Engine errors during benchmark: {errors[0]!r} ({len(errors)} total)")
+    return results
+
+
+def bench_engine_nps(engine_path):
+    """Đo số node mỗi giây bằng lệnh ``bench`` của Stockfish.
+
+    Returns:
+        dict: Kết quả ``engine.bench_nps`` (càng cao càng tốt).
+    """
+    return {"engine.bench_nps": {"value": bench_nps(engine_path), "unit": "nodes/s", "better": "higher"}}
+
+
+def run(sections, frames, repeat, engine_path):
+    """Chạy các nhóm phép đo đã chọn.
+
+    Args:
+        sections (list): Tên các nhóm trong SECTIONS.
+        frames (int): Số khung hình cho các phép đo vẽ.
+        repeat (int): Số lần đo cho các phép đo luật chơi và engine.
+        engine_path (str): Đường dẫn engine.
+
+    Returns:
+        dict: Báo cáo gồm ``host`` (thông tin máy) và ``results``.
+    """
+    results = {}
+    if "board" in sections or "dialog" in sections:
+        ChessGame.load_piece_images()
+    if "board" in sections:
+        results.update(bench_board(frames))
+    if "dialog" in sections:
+        results.update(bench_dialogs(frames))
+    if "rules" in sections:
+        results.update(bench_rules(repeat * 10))
+    if "engine" in sections or "nps" in sections:
+        try:
+            if "engine" in sections:
+                results.update(bench_engine(engine_path, repeat))
+            if "nps" in sections:
+                results.update(bench_engine_nps(engine_path))
+        except (OSError, RuntimeError, chess.engine.EngineError) as e:
+            print(f"Bo qua phep do engine ({engine_path}): {e}")
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": {
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "chess": chess.__version__,
+            "engine": engine_path,
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """So sánh kết quả với một lần đo trước.
+
+    Phép đo thời gian được so theo giá trị nhỏ nhất của các lần đo (ít bị ảnh hưởng
+    bởi nhiễu của máy hơn trung vị) và chỉ bị coi là suy giảm khi chậm đi quá
+    ``threshold`` và quá MIN_REGRESSION_SECONDS. Phép đo dưới 1 ms dùng ngưỡng ít
+    nhất SUB_MS_THRESHOLD.
+
+    Args:
+        results (dict): Kết quả hiện tại (``report["results"]``).
+        baseline (dict): Kết quả đã lưu.
+        threshold (float): Tỉ lệ chậm đi tối đa được chấp nhận (0.15 = 15%).
+
+    Returns:
+        list: Các dòng ``(ten, gia tri cu, gia tri moi, ti le thay doi, suy giam)``,
+        chỉ gồm những phép đo có trong cả hai lần đo.
+    """
+    rows = []
+    for name, current in results.items():
+        old = baseline.get(name)
+        key = "min" if "min" in current and "min" in (old or {}) else "value"
+        if old is None or not old[key]:
+            continue
+        change = current[key] / old[key] - 1
+        limit, significant = threshold, True
+        scale = UNIT_SCALE.get(current.get("unit"))
+        if current.get("better") == "higher":
+            # Gia tri giam la cham di
+            change = -change
+        elif scale is not None:
+            if old[key] / scale < 1e-3:
+                limit = max(threshold, SUB_MS_THRESHOLD)
+            significant = (current[key] - old[key]) / scale > MIN_REGRESSION_SECONDS
+        rows.append((name, old[key], current[key], change, change > limit and significant))
+    return rows
+
+
+def print_results(results):
+    """In kết quả dạng bảng."""
+    for name, result in results.items():
+        if "mean" in result:
+            print(f"{name:32} {result['value']:10.3f} {result['unit']:7} "
+                  f"(mean {result['mean']:.3f}, p95 {result['p95']:.3f}, n={result['samples']})")
+        else:
+            print(f"{name:32} {result['value']:10.0f} {result['unit']}")
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của bộ đo.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="ChessGame headless benchmarks")
+    parser.add_argument("--only", default=",".join(SECTIONS),
+                        help=f"cac nhom phep do, cach nhau bang dau phay ({', '.join(SECTIONS)})")
+    parser.add_argument("--frames", type=int, default=200, help="so khung hinh moi phep do ve")
+    parser.add_argument("--repeat", type=int, default=5, help="so lan do cho luat choi va engine")
+    parser.add_argument("--engine", default=ChessGame.STOCKFISH_PATH, help="duong dan toi Stockfish")
+    parser.add_argument("--output", default=None, help="ghi ket qua ra file JSON")
+    parser.add_argument("--compare", default=None, help="file JSON ket qua truoc do de so sanh")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="ti le cham di toi da truoc khi bao suy giam (mac dinh 0.15)")
+    args = parser.parse_args(argv)
+    args.only = [section.strip() for section in args.only.split(",") if section.strip()]
+    unknown = set(args.only) - set(SECTIONS)
+    if unknown:
+        parser.error(f"nhom phep do khong hop le: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    """Chạy bộ đo từ dòng lệnh.
+
+    Returns:
+        int: 0 nếu không có suy giảm, 1 nếu có phép đo chậm đi quá ngưỡng.
+    """
+    args = parse_args(argv)
+    for name in ("engine", "output", "compare"):
+        path = getattr(args, name)
+        if path and (name != "engine" or os.path.exists(path)):
+            setattr(args, name, os.path.abspath(path))
+    # Hinh anh duoc tai theo duong dan tuong doi
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    report = run(args.only, args.frames, args.repeat, args.engine)
+    pygame.quit()
+    print_results(report["results"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Ket qua da duoc ghi vao {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(report["results"], baseline, args.threshold)
+        regressions = [row for row in rows if row[4]]
+        print(f"\nSo sanh gia tri nho nhat voi {args.compare} (nguong {args.threshold:.0%}, "
+              f"{SUB_MS_THRESHOLD:.0%} duoi 1 ms):")
+        for name, old, new, change, regressed in rows:
+            print(f"{name:32} {old:10.3f} -> {new:10.3f} {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+        print(f"{len(regressions)} regression(s)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
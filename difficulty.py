@@ -0,0 +1,204 @@
+"""Các mức độ khó của bot và đồng hồ thi đấu.
+
+Mỗi mức độ khó (DifficultyProfile) kết hợp ba thứ: sức mạnh của engine (Skill Level
+hoặc ``UCI_LimitStrength``/``UCI_Elo``), giới hạn tìm kiếm (số node, độ sâu) và
+ngân sách thời gian cho mỗi nước đi. Mức dễ dùng ít node nên trả lời gần như tức
+thì và tốn rất ít CPU; mức khó dùng toàn bộ ngân sách thời gian. Muốn thêm mức
+độ khó chỉ cần thêm một mục vào PROFILES (hộp thoại chọn độ khó tự co giãn theo
+số mức).
+
+Khi ván cờ có đồng hồ (TimeControl), ngân sách thời gian của mỗi nước được tính
+từ thời gian còn lại và thời gian cộng thêm sau mỗi nước, không vượt quá ngân
+sách của mức độ khó.
+"""
+import time
+
+import chess
+import chess.engine
+
+# So nuoc du kien con lai khi chia thoi gian con lai cho moi nuoc
+MOVES_TO_GO = 30
+
+
+class DifficultyProfile:
+    """Cấu hình sức mạnh và giới hạn tìm kiếm của bot ở một mức độ khó.
+
+    Args:
+        name (str): Tên hiển thị trên hộp thoại.
+        skill_level (int): Skill Level của Stockfish (0-20).
+        move_time (float): Ngân sách thời gian tối đa (giây) cho mỗi nước đi.
+        elo (int or None): Nếu có, bật ``UCI_LimitStrength`` với ``UCI_Elo`` này
+            (Stockfish bỏ qua Skill Level khi giới hạn theo Elo).
+        nodes (int or None): Số node tối đa mỗi nước.
+        depth (int or None): Độ sâu tối đa mỗi nước.
+    """
+
+    def __init__(self, name, skill_level, move_time, elo=None, nodes=None, depth=None):
+        self.name = name
+        self.skill_level = skill_level
+        self.move_time = move_time
+        self.elo = elo
+        self.nodes = nodes
+        self.depth = depth
+
+    def options(self):
+        """Các tuỳ chọn UCI của mức độ khó.
+
+        ``UCI_LimitStrength`` luôn được gửi (kể cả khi tắt) để mức độ khó trước đó
+        không còn ảnh hưởng khi engine được dùng lại.
+
+        Returns:
+            dict: Tuỳ chọn cho ``EngineWorker.configure``.
+        """
+        options = {"Skill Level": self.skill_level, "UCI_LimitStrength": self.elo is not None}
+        if self.elo is not None:
+            options["UCI_Elo"] = self.elo
+        return options
+
+    def time_budget(self, remaining=None, increment=0.0):
+        """Tính thời gian suy nghĩ cho nước đi tiếp theo.
+
+        Args:
+            remaining (float or None): Thời gian còn lại (giây) trên đồng hồ của bot,
+                None nếu ván không có đồng hồ.
+            increment (float): Thời gian cộng thêm (giây) sau mỗi nước.
+
+        Returns:
+            float: Số giây tối đa cho nước đi.
+        """
+        if remaining is None:
+            return self.move_time
+        budget = remaining / MOVES_TO_GO + increment * 0.75
+        # Khong bao gio dung qua mot nua thoi gian con lai
+        return max(0.01, min(self.move_time, budget, remaining / 2))
+
+    def limit(self, remaining=None, increment=0.0):
+        """Tạo giới hạn tìm kiếm cho nước đi tiếp theo.
+
+        Args:
+            remaining (float or None): Thời gian còn lại (giây) của bot, None nếu không có đồng hồ.
+            increment (float): Thời gian cộng thêm (giây) sau mỗi nước.
+
+        Returns:
+            chess.engine.Limit: Giới hạn gồm thời gian, số node và độ sâu.
+        """
+        return chess.engine.Limit(time=self.time_budget(remaining, increment), nodes=self.nodes, depth=self.depth)
+
+
+# Cac muc do kho hien thi tren hop thoai, theo thu tu tu de den kho
+PROFILES = {
+    profile.name: profile for profile in (
+        DifficultyProfile("Beginner", skill_level=0, move_time=0.05, elo=1320, nodes=2000),
+        DifficultyProfile("Easy", skill_level=2, move_time=0.1, elo=1600, nodes=20000),
+        DifficultyProfile("Medium", skill_level=10, move_time=0.3, elo=2000, nodes=200000),
+        DifficultyProfile("Hard", skill_level=20, move_time=1.0),
+        DifficultyProfile("Master", skill_level=20, move_time=3.0),
+    )
+}
+
+
+class TimeControl:
+    """Thể thức thời gian của ván cờ, ví dụ ``5+3`` (5 phút, cộng 3 giây mỗi nước).
+
+    Args:
+        base (float): Thời gian ban đầu của mỗi bên (giây).
+        increment (float): Thời gian cộng thêm sau mỗi nước (giây).
+    """
+
+    def __init__(self, base, increment=0.0):
+        self.base = base
+        self.increment = increment
+
+    @classmethod
+    def parse(cls, text):
+        """Đọc thể thức thời gian dạng ``"phut+giay"`` (ví dụ ``"5+3"`` hoặc ``"10"``).
+
+        Args:
+            text (str): Thể thức thời gian.
+
+        Returns:
+            TimeControl: Thể thức đã đọc.
+
+        Raises:
+            ValueError: Nếu chuỗi không đúng định dạng.
+        """
+        minutes, _, increment = text.partition("+")
+        return cls(float(minutes) * 60, float(increment or 0))
+
+    def __str__(self):
+        return f"{self.base / 60:g}+{self.increment:g}"
+
+
+class GameClock:
+    """Đồng hồ thi đấu của hai bên.
+
+    Đồng hồ của bên đang đến lượt chạy từ lúc ``start`` (hoặc lần ``press`` gần
+    nhất); ``press`` dừng đồng hồ của bên vừa đi, cộng thời gian cộng thêm và bấm
+    sang bên kia.
+
+    Args:
+        time_control (TimeControl): Thể thức thời gian.
+        now (callable): Hàm trả về thời điểm hiện tại (giây), mặc định ``time.monotonic``.
+    """
+
+    def __init__(self, time_control, now=time.monotonic):
+        self.time_control = time_control
+        self._now = now
+        self._remaining = {chess.WHITE: time_control.base, chess.BLACK: time_control.base}
+        self.turn = chess.WHITE
+        self._started_at = None
+
+    @property
+    def running(self):
+        """bool: True nếu đồng hồ đang chạy."""
+        return self._started_at is not None
+
+    def start(self, turn=chess.WHITE):
+        """Bắt đầu chạy đồng hồ của bên ``turn``."""
+        self.turn = turn
+        self._started_at = self._now()
+
+    def stop(self):
+        """Dừng đồng hồ (ví dụ khi ván kết thúc)."""
+        self._remaining[self.turn] = self.remaining(self.turn)
+        self._started_at = None
+
+    def press(self):
+        """Bên đang đến lượt vừa đi xong: cộng thời gian và chuyển lượt."""
+        running = self.running
+        self._remaining[self.turn] = self.remaining(self.turn) + self.time_control.increment
+        self.turn = not self.turn
+        self._started_at = self._now() if running else None
+
+    def remaining(self, color):
+        """Thời gian còn lại của một bên.
+
+        Args:
+            color (chess.Color): Màu quân.
+
+        Returns:
+            float: Số giây còn lại (không âm).
+        """
+        remaining = self._remaining[color]
+        if color == self.turn and self._started_at is not None:
+            remaining -= self._now() - self._started_at
+        return max(0.0, remaining)
+
+    def flagged(self):
+        """chess.Color or None: Màu của bên đã hết giờ, None nếu chưa bên nào hết giờ."""
+        return self.turn if self.remaining(self.turn) <= 0 else None
+
+
+def format_clock(seconds):
+    """Định dạng thời gian còn lại để hiển thị, ví dụ ``"4:05"`` hoặc ``"0:09.3"`` khi dưới 10 giây.
+
+    Args:
+        seconds (float): Số giây còn lại.
+
+    Returns:
+        str: Chuỗi hiển thị.
+    """
+    if seconds < 10:
+        return f"0:{seconds:04.1f}"
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}:{secs:02d}"
@@ -0,0 +1,217 @@
+"""Bộ nhớ đệm kết quả tìm kiếm của engine theo thế cờ.
+
+Nhiều thế cờ lặp lại giữa các ván (đặc biệt là các thế khai cuộc phổ biến), nên
+kết quả của engine được lưu lại theo khoá gồm mã Zobrist của thế cờ
+(``chess.polyglot.zobrist_hash``), các tuỳ chọn UCI ảnh hưởng tới nước đi (ví dụ
+Skill Level; các tuỳ chọn tài nguyên như Threads, Hash không tính) và giới hạn tìm
+kiếm. Thời gian tìm kiếm được làm tròn theo luỹ thừa của 2: ván có đồng hồ tính lại
+ngân sách thời gian ở mỗi nước, nếu dùng nguyên giá trị thì bộ đệm gần như không bao
+giờ trúng. Bộ đệm có hai tầng: một LRU trong bộ nhớ cho các thế cờ gần đây và một
+file SQLite giữ kết quả qua các lần chạy chương trình. Thế cờ đã gặp được trả lời
+ngay mà không cần gửi lệnh nào tới engine.
+"""
+import collections
+import math
+import os
+import sqlite3
+import threading
+
+import chess
+import chess.polyglot
+
+# Tuy chon chi anh huong toc do hoac tai nguyen cua engine, khong tinh vao khoa
+RESOURCE_OPTIONS = frozenset(("Threads", "Hash", "SyzygyPath", "NumaPolicy"))
+
+
+def time_bucket(seconds):
+    """Làm tròn thời gian tìm kiếm về luỹ thừa của 2 gần nhất (ví dụ 0.3 -> 0.25, 3 -> 4)."""
+    if not seconds or seconds <= 0:
+        return seconds
+    return 2.0 ** round(math.log2(seconds))
+
+
+def limit_key(limit, bucket_time=False):
+    """Tạo chuỗi đại diện cho một giới hạn tìm kiếm.
+
+    Args:
+        limit (chess.engine.Limit): Giới hạn tìm kiếm.
+        bucket_time (bool): True để làm tròn thời gian bằng ``time_bucket``, để các
+            ngân sách thời gian gần nhau (ván có đồng hồ) dùng chung một khoá.
+
+    Returns:
+        str: Chuỗi ổn định, ví dụ ``"time=1,depth=None,nodes=None,mate=None"``.
+    """
+    seconds = time_bucket(limit.time) if bucket_time else limit.time
+    return f"time={seconds},depth={limit.depth},nodes={limit.nodes},mate={limit.mate}"
+
+
+def options_key(options):
+    """Tạo chuỗi đại diện cho các tuỳ chọn UCI đang dùng.
+
+    Args:
+        options (dict): Các tuỳ chọn UCI (ví dụ ``{"Skill Level": 10}``).
+
+    Returns:
+        str: Chuỗi ổn định, không phụ thuộc thứ tự các tuỳ chọn, bỏ qua RESOURCE_OPTIONS
+        (kết quả dùng chung giữa các máy và cấu hình Threads/Hash khác nhau).
+    """
+    return ",".join(f"{name}={value}" for name, value in sorted(options.items()) if name not in RESOURCE_OPTIONS)
+
+
+class CacheStats:
+    """Thống kê truy cập bộ đệm.
+
+    Attributes:
+        hits (int): Số lần tìm thấy trong bộ nhớ.
+        disk_hits (int): Số lần tìm thấy trong file SQLite (không có trong bộ nhớ).
+        misses (int): Số lần không tìm thấy, phải hỏi engine.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """float: Tỉ lệ tìm thấy trên tổng số lần tra cứu (0.0 nếu chưa tra lần nào)."""
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def __str__(self):
+        return f"cache hits {self.hits} (+{self.disk_hits} from disk), misses {self.misses} ({self.hit_rate:.0%})"
+
+
+class EngineCache:
+    """Bộ đệm LRU trong bộ nhớ, lưu bền vào SQLite, cho kết quả tìm kiếm của engine.
+
+    Các phương thức có thể được gọi từ luồng nền của EngineWorker và từ luồng
+    chính, nên mọi truy cập đều được bảo vệ bằng một khoá.
+
+    Args:
+        path (str or None): Đường dẫn file SQLite, None để chỉ dùng bộ nhớ.
+        max_entries (int): Số thế cờ tối đa giữ trong bộ nhớ.
+
+    Attributes:
+        stats (CacheStats): Thống kê truy cập kể từ lần gọi ``reset_stats`` gần nhất.
+    """
+
+    def __init__(self, path=None, max_entries=4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, move TEXT NOT NULL, pv TEXT NOT NULL, depth INTEGER)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(board, limit, options):
+        """Tạo khoá bộ đệm cho một yêu cầu tìm kiếm.
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm nước đi.
+            limit (chess.engine.Limit): Giới hạn tìm kiếm.
+            options (dict): Các tuỳ chọn UCI đang dùng.
+
+        Returns:
+            str: Khoá gồm mã Zobrist, tuỳ chọn và giới hạn tìm kiếm (thời gian đã làm tròn).
+        """
+        return f"{chess.polyglot.zobrist_hash(board):016x}|{options_key(options)}|{limit_key(limit, bucket_time=True)}"
+
+    def get(self, board, limit, options):
+        """Tra cứu kết quả đã lưu cho một yêu cầu tìm kiếm.
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm nước đi.
+            limit (chess.engine.Limit): Giới hạn tìm kiếm.
+            options (dict): Các tuỳ chọn UCI đang dùng.
+
+        Returns:
+            tuple or None: ``(move, info)`` nếu đã có kết quả hợp lệ cho thế cờ,
+            ngược lại None. ``info`` chứa ``pv`` và ``depth`` như kết quả của engine.
+        """
+        key = self.make_key(board, limit, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            from_disk = False
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT move, pv, depth FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], row[2])
+                    from_disk = True
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            move_uci, pv_uci, depth = entry
+            move = chess.Move.from_uci(move_uci)
+            # Ma Zobrist co the trung: chi dung ket qua neu nuoc di hop le o the co nay
+            if not board.is_legal(move):
+                self.stats.misses += 1
+                return None
+            if from_disk:
+                self._remember(key, entry)
+                self.stats.disk_hits += 1
+            else:
+                self.stats.hits += 1
+        info = {"pv": [chess.Move.from_uci(uci) for uci in pv_uci.split()]}
+        if depth is not None:
+            info["depth"] = depth
+        return move, info
+
+    def put(self, board, limit, options, move, info):
+        """Lưu kết quả tìm kiếm của engine.
+
+        Args:
+            board (chess.Board): Thế cờ đã tìm nước đi.
+            limit (chess.engine.Limit): Giới hạn tìm kiếm đã dùng.
+            options (dict): Các tuỳ chọn UCI đã dùng.
+            move (chess.Move): Nước đi engine chọn.
+            info (dict): Thông tin phân tích engine trả về.
+        """
+        key = self.make_key(board, limit, options)
+        entry = (move.uci(), " ".join(m.uci() for m in info.get("pv", [move])), info.get("depth"))
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO results (key, move, pv, depth) VALUES (?, ?, ?, ?)", (key, *entry))
+                self._db.commit()
+
+    def reset_stats(self):
+        """Bắt đầu đếm thống kê lại từ đầu.
+
+        Returns:
+            CacheStats: Thống kê trước khi đặt lại.
+        """
+        with self._lock:
+            stats, self.stats = self.stats, CacheStats()
+        return stats
+
+    def close(self):
+        """Đóng file SQLite."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,227 @@
+"""Pool các tiến trình Stockfish dùng chung, có kiểm tra sức khoẻ và tự khởi động lại.
+
+Pool giữ sẵn K tiến trình engine đã khởi động (đã nạp mạng NNUE) để các ván cờ hoặc
+các yêu cầu phân tích mượn dùng thay vì mở tiến trình mới mỗi lần. Khi một engine
+được trả lại, pool đặt lại các tuỳ chọn UCI về mặc định và gửi ``ucinewgame``; nếu
+giữ bảng băm (``keep_hash``), Threads/Hash được giữ nguyên và không gửi ``ucinewgame``.
+Một luồng giám sát (watchdog) định kỳ gửi ``isready`` tới các engine đang rảnh và
+theo dõi thời gian tìm kiếm của các engine đang bận; engine chết hoặc bị treo sẽ bị
+tắt và được thay bằng tiến trình mới mà người dùng pool không cần biết.
+
+Pool chạy trên một event loop asyncio (ví dụ luồng nền của EngineWorker).
+"""
+import asyncio
+import contextlib
+
+import chess.engine
+
+# Doi mot trong cac tuy chon nay khien Stockfish cap phat lai (va xoa) bang bam
+HASH_OPTIONS = ("Threads", "Hash")
+
+
+class PooledEngine:
+    """Một tiến trình engine thuộc pool.
+
+    Attributes:
+        index (int): Vị trí của engine trong pool.
+        transport (asyncio.SubprocessTransport): Tiến trình của engine.
+        protocol (chess.engine.UciProtocol): Kết nối UCI tới engine.
+        busy_since (float or None): Thời điểm (theo đồng hồ của event loop) bắt
+            đầu lệnh tìm kiếm hiện tại, None nếu engine không tìm kiếm.
+        lock (asyncio.Lock): Khoá phải giữ khi gửi lệnh tới engine; python-chess
+            không cho phép xếp hàng hai lệnh cùng lúc trên một kết nối.
+    """
+
+    def __init__(self, index, transport, protocol):
+        self.index = index
+        self.transport = transport
+        self.protocol = protocol
+        self.busy_since = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self):
+        """bool: True nếu tiến trình engine vẫn đang chạy."""
+        return not self.protocol.returncode.done()
+
+    @contextlib.contextmanager
+    def busy(self):
+        """Đánh dấu engine đang tìm kiếm để watchdog phát hiện nếu bị treo."""
+        self.busy_since = asyncio.get_running_loop().time()
+        try:
+            yield self
+        finally:
+            self.busy_since = None
+
+    def kill(self):
+        """Tắt ngay tiến trình engine (dùng khi engine bị treo)."""
+        with contextlib.suppress(ProcessLookupError):
+            self.transport.kill()
+
+
+class EnginePool:
+    """Giữ sẵn K tiến trình engine và cho các ván cờ mượn.
+
+    Args:
+        engine_path (str): Đường dẫn tới file thực thi của engine.
+        size (int): Số tiến trình engine giữ sẵn.
+        options (dict or None): Tuỳ chọn UCI mặc định áp dụng cho mọi engine.
+        ping_interval (float): Chu kỳ (giây) watchdog kiểm tra các engine đang rảnh.
+        ping_timeout (float): Thời gian tối đa (giây) chờ ``readyok``.
+        hang_timeout (float): Thời gian tối đa (giây) cho một lệnh tìm kiếm trước
+            khi engine bị coi là treo và bị khởi động lại.
+        keep_hash (bool): True để giữ bảng băm khi engine được trả lại (không đặt lại
+            Threads/Hash, không gửi ``ucinewgame``).
+    """
+
+    def __init__(self, engine_path, size=1, options=None, ping_interval=5.0, ping_timeout=5.0, hang_timeout=60.0,
+                 keep_hash=False):
+        self.engine_path = engine_path
+        self.size = size
+        self.options = dict(options or {})
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.hang_timeout = hang_timeout
+        self.keep_hash = keep_hash
+        self.max_respawn_attempts = 3
+        self.restarts = 0
+        self._engines = []
+        self._idle = None
+        self._watchdog = None
+        self._closed = False
+
+    async def start(self):
+        """Khởi động tất cả engine và watchdog.
+
+        Raises:
+            FileNotFoundError: Nếu không tìm thấy file thực thi của engine.
+            chess.engine.EngineError: Nếu engine không khởi động được.
+        """
+        self._idle = asyncio.Queue()
+        self._engines = list(await asyncio.gather(*(self._spawn(i) for i in range(self.size))))
+        for engine in self._engines:
+            self._idle.put_nowait(engine)
+        self._watchdog = asyncio.get_running_loop().create_task(self._watch())
+
+    async def acquire(self):
+        """Mượn một engine đang rảnh, chờ nếu tất cả đều bận.
+
+        Returns:
+            PooledEngine: Engine đã sẵn sàng, phải trả lại bằng ``release``.
+
+        Raises:
+            chess.engine.EngineTerminatedError: Nếu engine đã chết và không khởi động lại được.
+        """
+        engine = await self._idle.get()
+        for _ in range(self.max_respawn_attempts):
+            if engine.alive:
+                return engine
+            engine = await self._respawn(engine)
+            if not engine.alive:
+                await asyncio.sleep(self.ping_interval)
+        if engine.alive:
+            return engine
+        self._idle.put_nowait(engine)
+        raise chess.engine.EngineTerminatedError(f"khong the khoi dong lai engine {engine.index}")
+
+    async def release(self, engine):
+        """Trả engine về pool: đặt lại tuỳ chọn, gửi ``ucinewgame``; khởi động lại nếu engine đã chết.
+
+        Args:
+            engine (PooledEngine): Engine đã mượn bằng ``acquire``.
+        """
+        engine.busy_since = None
+        try:
+            if not engine.alive:
+                raise chess.engine.EngineTerminatedError("engine process dead")
+            await asyncio.wait_for(self._reset(engine), self.ping_timeout)
+        except (chess.engine.EngineError, asyncio.TimeoutError):
+            engine = await self._respawn(engine)
+        self._idle.put_nowait(engine)
+
+    @contextlib.asynccontextmanager
+    async def lease(self):
+        """Mượn một engine trong khối ``async with`` và tự trả lại khi ra khỏi khối."""
+        engine = await self.acquire()
+        try:
+            yield engine
+        finally:
+            await self.release(engine)
+
+    async def close(self):
+        """Dừng watchdog và tắt tất cả engine."""
+        self._closed = True
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._watchdog
+            self._watchdog = None
+        for engine in self._engines:
+            with contextlib.suppress(chess.engine.EngineError, asyncio.TimeoutError):
+                await asyncio.wait_for(engine.protocol.quit(), self.ping_timeout)
+            engine.kill()
+        self._engines = []
+
+    async def _spawn(self, index):
+        transport, protocol = await chess.engine.popen_uci(self.engine_path)
+        options = {name: value for name, value in self.options.items() if name in protocol.options}
+        for name in self.options.keys() - options.keys():
+            # Vi du NumaPolicy tren cac ban Stockfish cu
+            print(f"Engine khong ho tro tuy chon {name}, bo qua")
+        if options:
+            await protocol.configure(options)
+        return PooledEngine(index, transport, protocol)
+
+    async def _respawn(self, engine):
+        """Thay một engine chết hoặc treo bằng tiến trình mới ở cùng vị trí."""
+        engine.kill()
+        if self._closed:
+            return engine
+        self.restarts += 1
+        print(f"Engine {engine.index} khong phan hoi, dang khoi dong lai")
+        try:
+            new_engine = await self._spawn(engine.index)
+        except (OSError, chess.engine.EngineError) as e:
+            print(f"Loi khi khoi dong lai engine {engine.index}: {e}")
+            return engine
+        self._engines[engine.index] = new_engine
+        return new_engine
+
+    async def _reset(self, engine):
+        protocol = engine.protocol
+        defaults = {}
+        for name in protocol.config:
+            option = protocol.options.get(name)
+            if option is None or name.lower() in chess.engine.MANAGED_OPTIONS or option.type == "button":
+                continue
+            if self.keep_hash and name in HASH_OPTIONS:
+                continue
+            defaults[name] = self.options.get(name, option.default)
+        async with engine.lock:
+            await protocol.configure(defaults)
+            if not self.keep_hash:
+                protocol.send_line("ucinewgame")
+            await protocol.ping()
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            # Engine dang ban: tat neu lenh tim kiem chay qua lau
+            for engine in list(self._engines):
+                if engine.busy_since is not None and loop.time() - engine.busy_since > self.hang_timeout:
+                    print(f"Engine {engine.index} bi treo qua {self.hang_timeout:.0f}s")
+                    engine.kill()
+            # Engine dang ranh: gui isready, khoi dong lai neu khong tra loi
+            idle = []
+            while not self._idle.empty():
+                idle.append(self._idle.get_nowait())
+            for engine in idle:
+                try:
+                    if not engine.alive:
+                        raise chess.engine.EngineTerminatedError("engine process dead")
+                    async with engine.lock:
+                        await asyncio.wait_for(engine.protocol.ping(), self.ping_timeout)
+                except (chess.engine.EngineError, asyncio.TimeoutError):
+                    engine = await self._respawn(engine)
+                self._idle.put_nowait(engine)
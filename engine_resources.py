@@ -0,0 +1,216 @@
+"""Tài nguyên của engine: số luồng (Threads), bảng băm (Hash) và NUMA theo máy và độ khó.
+
+Stockfish mặc định chỉ dùng 1 luồng và 16 MB bảng băm. EngineResources chọn ``Threads``
+và ``Hash`` theo máy đang chạy (số nhân CPU được phép dùng, dung lượng RAM, số nút
+NUMA) và theo độ khó: độ khó thấp bị giới hạn số node nên chỉ cần 1 luồng, độ khó
+Khó và Cao thủ dùng toàn bộ số nhân khi chỉ có một engine. Khi nhiều engine chạy
+trong cùng một tiến trình (máy chủ nhiều ván), các nhân được chia đều giữa các
+engine (``fair_share``) để tổng số luồng không vượt quá số nhân của máy.
+
+Chính sách bảng băm quyết định việc giữa hai ván. ``"clear"`` (mặc định) gửi
+``ucinewgame`` và chọn Threads/Hash theo độ khó; đổi độ khó đổi Threads/Hash nên
+Stockfish cấp phát lại và xoá bảng băm. ``"keep"`` không gửi ``ucinewgame`` và dùng
+một cấu hình Threads/Hash cho cả tiến trình (như engine dùng chung của máy chủ), để
+bảng băm được giữ cả khi người chơi đổi độ khó.
+"""
+import argparse
+import glob
+import os
+
+# Chinh sach bang bam giua hai van
+HASH_POLICIES = ("clear", "keep")
+MEMORY_FRACTION = 0.25 # Ti le RAM toi da danh cho bang bam cua tat ca engine
+MIN_HASH_MB = 16 # Bang bam mac dinh cua Stockfish
+
+
+class HostResources:
+    """Tài nguyên của máy đang chạy.
+
+    Args:
+        cpus (int): Số nhân CPU tiến trình được phép dùng.
+        memory_mb (int or None): Dung lượng RAM (MB), None nếu không xác định được.
+        numa_nodes (int): Số nút NUMA.
+    """
+
+    def __init__(self, cpus, memory_mb=None, numa_nodes=1):
+        self.cpus = cpus
+        self.memory_mb = memory_mb
+        self.numa_nodes = numa_nodes
+
+    @classmethod
+    def detect(cls):
+        """Đọc tài nguyên của máy hiện tại.
+
+        Returns:
+            HostResources: Số nhân theo CPU affinity của tiến trình (nếu hệ điều hành
+            hỗ trợ), dung lượng RAM và số nút NUMA (Linux).
+        """
+        if hasattr(os, "sched_getaffinity"):
+            cpus = len(os.sched_getaffinity(0))
+        else:
+            cpus = os.cpu_count() or 1
+        try:
+            memory_mb = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2 ** 20
+        except (AttributeError, ValueError, OSError):
+            memory_mb = None
+        numa_nodes = len(glob.glob("/sys/devices/system/node/node[0-9]*")) or 1
+        return cls(cpus, memory_mb, numa_nodes)
+
+    def __str__(self):
+        memory = f"{self.memory_mb / 1024:.1f} GB" if self.memory_mb is not None else "? GB"
+        return f"{self.cpus} CPUs, {memory}, {self.numa_nodes} NUMA node(s)"
+
+
+class ResourceProfile:
+    """Tài nguyên engine cho một độ khó.
+
+    Args:
+        max_threads (int or None): Số luồng tối đa, None để dùng toàn bộ phần nhân của engine.
+        hash_mb (int): Kích thước bảng băm mong muốn (MB), bị giới hạn theo RAM của máy.
+    """
+
+    def __init__(self, max_threads=None, hash_mb=MIN_HASH_MB):
+        self.max_threads = max_threads
+        self.hash_mb = hash_mb
+
+
+# Tai nguyen theo muc do kho (cung ten voi difficulty.PROFILES)
+RESOURCE_PROFILES = {
+    "Beginner": ResourceProfile(max_threads=1, hash_mb=16),
+    "Easy": ResourceProfile(max_threads=1, hash_mb=16),
+    "Medium": ResourceProfile(max_threads=2, hash_mb=64),
+    "Hard": ResourceProfile(hash_mb=256),
+    "Master": ResourceProfile(hash_mb=512),
+}
+# Engine dung chung cho moi do kho (may chu): cau hinh mot lan khi khoi dong
+SHARED_PROFILE = ResourceProfile(hash_mb=128)
+
+
+def round_hash(megabytes):
+    """Làm tròn xuống luỹ thừa của 2 gần nhất, không nhỏ hơn MIN_HASH_MB."""
+    megabytes = max(MIN_HASH_MB, int(megabytes))
+    return 1 << (megabytes.bit_length() - 1)
+
+
+class EngineResources:
+    """Chọn tuỳ chọn UCI về tài nguyên cho các engine của một tiến trình.
+
+    Args:
+        host (HostResources or None): Tài nguyên của máy, None để tự phát hiện.
+        engines (int): Số engine có thể tìm kiếm cùng lúc trong tiến trình.
+        fair_share (bool): True để chia đều số nhân giữa ``engines`` engine, False để
+            mỗi engine được dùng toàn bộ số nhân (có thể dùng quá số nhân của máy).
+        threads (int or None): Số luồng cố định cho mọi độ khó, None để tự chọn.
+        hash_mb (int or None): Kích thước bảng băm cố định (MB), None để tự chọn.
+        hash_policy (str): ``"clear"`` hoặc ``"keep"`` (xem HASH_POLICIES); với ``"keep"``
+            mọi độ khó dùng chung một cấu hình Threads/Hash.
+        numa_policy (str or None): Giá trị tuỳ chọn ``NumaPolicy`` của Stockfish (ví dụ
+            ``"auto"``, ``"none"``, ``"hardware"``), None để dùng mặc định của engine.
+
+    Raises:
+        ValueError: Nếu ``hash_policy`` không hợp lệ.
+    """
+
+    def __init__(self, host=None, engines=1, fair_share=True, threads=None, hash_mb=None, hash_policy="clear",
+                 numa_policy=None):
+        if hash_policy not in HASH_POLICIES:
+            raise ValueError(f"chinh sach bang bam khong hop le: {hash_policy}")
+        self.host = host or HostResources.detect()
+        self.engines = max(1, engines)
+        self.fair_share = fair_share
+        self.fixed_threads = threads
+        self.fixed_hash_mb = hash_mb
+        self.hash_policy = hash_policy
+        self.numa_policy = numa_policy
+
+    @property
+    def keep_hash(self):
+        """bool: True nếu bảng băm được giữ giữa các ván."""
+        return self.hash_policy == "keep"
+
+    @property
+    def core_share(self):
+        """int: Số nhân dành cho mỗi engine."""
+        if not self.fair_share:
+            return self.host.cpus
+        return max(1, self.host.cpus // self.engines)
+
+    def _profile(self, difficulty):
+        if self.keep_hash:
+            # Doi Threads hoac Hash se xoa bang bam: giu mot cau hinh cho ca tien trinh
+            return SHARED_PROFILE
+        return RESOURCE_PROFILES.get(difficulty, SHARED_PROFILE)
+
+    def threads(self, difficulty=None):
+        """Số luồng cho một độ khó (None: engine dùng chung cho mọi độ khó).
+
+        Returns:
+            int: Giá trị tuỳ chọn ``Threads`` (như nhau cho mọi độ khó khi giữ bảng băm).
+        """
+        if self.fixed_threads is not None:
+            return self.fixed_threads
+        profile = self._profile(difficulty)
+        share = self.core_share
+        return share if profile.max_threads is None else min(profile.max_threads, share)
+
+    def hash_mb(self, difficulty=None):
+        """Kích thước bảng băm cho một độ khó (None: engine dùng chung cho mọi độ khó).
+
+        Returns:
+            int: Giá trị tuỳ chọn ``Hash`` (MB), luỹ thừa của 2 và không vượt quá phần
+            RAM dành cho mỗi engine (như nhau cho mọi độ khó khi giữ bảng băm).
+        """
+        if self.fixed_hash_mb is not None:
+            return self.fixed_hash_mb
+        megabytes = self._profile(difficulty).hash_mb
+        if self.host.memory_mb is not None:
+            megabytes = min(megabytes, self.host.memory_mb * MEMORY_FRACTION / self.engines)
+        return round_hash(megabytes)
+
+    def options(self, difficulty=None):
+        """Tuỳ chọn ``Threads`` và ``Hash`` cho một độ khó.
+
+        Returns:
+            dict: Tuỳ chọn cho ``EngineWorker.configure`` (cùng với ``DifficultyProfile.options``).
+        """
+        return {"Threads": self.threads(difficulty), "Hash": self.hash_mb(difficulty)}
+
+    def pool_options(self, shared=False):
+        """Tuỳ chọn áp dụng cho mọi engine của pool ngay khi khởi động.
+
+        Args:
+            shared (bool): True nếu engine dùng chung cho mọi độ khó (máy chủ): Threads
+                và Hash được đặt một lần ở đây thay vì theo từng độ khó.
+
+        Returns:
+            dict: Tuỳ chọn cho ``EnginePool(options=...)``.
+        """
+        options = self.options() if shared else {}
+        if self.numa_policy is not None:
+            options["NumaPolicy"] = self.numa_policy
+        return options
+
+    def describe(self, difficulty=None):
+        """Mô tả ngắn tài nguyên của engine, ví dụ ``Threads 8, Hash 256 MB, clear hash``."""
+        text = f"Threads {self.threads(difficulty)}, Hash {self.hash_mb(difficulty)} MB, {self.hash_policy} hash"
+        if self.numa_policy is not None:
+            text += f", NUMA {self.numa_policy}"
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tai nguyen engine theo may va do kho")
+    parser.add_argument("--engines", type=int, default=1, help="so engine chay cung luc")
+    parser.add_argument("--no-fair-share", action="store_true", help="moi engine dung toan bo so nhan CPU")
+    parser.add_argument("--hash-policy", choices=HASH_POLICIES, default="clear")
+    parser.add_argument("--numa", default=None, metavar="POLICY", help='tuy chon NumaPolicy cua Stockfish, vi du "auto"')
+    args = parser.parse_args()
+    resources = EngineResources(engines=args.engines, fair_share=not args.no_fair_share, hash_policy=args.hash_policy,
+                                numa_policy=args.numa)
+    print(f"Host: {resources.host}")
+    for difficulty in RESOURCE_PROFILES:
+        print(f"{difficulty:10} {resources.describe(difficulty)}")
+    print(f"{'Shared':10} {resources.describe()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+"""Luồng nền chạy engine Stockfish để vòng lặp giao diện không bị chặn.
+
+Module này cung cấp lớp EngineWorker: một luồng riêng chạy event loop asyncio,
+mượn engine Stockfish từ một EnginePool (mở bằng ``chess.engine.popen_uci``) và
+nhận các yêu cầu tìm nước đi từ vòng lặp chính. Kết quả được trả về qua một hàm callback (vòng lặp Pygame dùng
+callback này để đẩy sự kiện vào hàng đợi sự kiện), nhờ đó cửa sổ vẫn vẽ và nhận
+click trong lúc engine đang suy nghĩ.
+
+Khi bật chế độ ponder, sau mỗi nước đi engine tiếp tục suy nghĩ trên nước trả lời
+được dự đoán (nước thứ hai trong PV). Nếu người chơi đi đúng nước đó, lần tìm kiếm
+tiếp theo dùng lệnh UCI ``ponderhit`` để tiếp tục thay vì bắt đầu lại.
+
+Nếu engine chết hoặc bị watchdog của pool tắt giữa chừng, yêu cầu được thử lại
+một lần với engine mới thay vì báo lỗi về giao diện.
+
+Nếu có sách khai cuộc (OpeningBook), các nước khai cuộc được chọn từ sách; nếu có
+bảng tàn cuộc (Tablebase), thế cờ còn ít quân được trả lời từ bảng; nếu có
+EngineCache, thế cờ đã gặp với cùng tuỳ chọn và giới hạn tìm kiếm được trả lời từ
+bộ đệm. Trong các trường hợp này không có lệnh nào được gửi tới engine. Thư mục
+bảng tàn cuộc cũng được truyền cho engine qua tuỳ chọn ``SyzygyPath``.
+
+Ngoài tìm nước đi, EngineWorker có chế độ phân tích liên tục (``analyse``): engine
+phân tích thế cờ không giới hạn thời gian bằng ``analysis()`` của python-chess và
+các dòng phân tích (đánh giá, độ sâu, N biến chính) được gửi về ngay khi có, không
+nhiều hơn một lần mỗi ``interval`` giây. Yêu cầu mới (tìm nước đi hoặc phân tích thế
+cờ khác) dừng lần phân tích đang chạy ngay lập tức.
+
+Việc khởi động có thể chạy nền (``start(wait=False)``): mở các engine, bắt tay
+``isready``, áp dụng tuỳ chọn và một lần tìm kiếm ngắn để engine nạp mạng NNUE và
+cấp phát bảng băm trước nước đi đầu tiên. Yêu cầu gửi tới trước khi khởi động xong
+sẽ chờ tới khi engine sẵn sàng.
+
+Nếu có Metrics, mỗi yêu cầu được ghi nhận thời gian trả lời theo nguồn (engine,
+ponderhit, bộ đệm, sách khai cuộc) cùng độ sâu, số node và số node mỗi giây.
+"""
+import asyncio
+import contextlib
+import itertools
+import os
+import threading
+
+import chess
+import chess.engine
+
+from engine_pool import EnginePool
+
+# Tim kiem ngan khi khoi dong de engine nap mang NNUE va cap phat bang bam
+WARMUP_LIMIT = chess.engine.Limit(nodes=20000)
+
+
+class EngineResult:
+    """Kết quả của một yêu cầu tìm nước đi gửi về vòng lặp chính.
+
+    Attributes:
+        job_id (int or None): Mã của yêu cầu đã tạo ra kết quả này, None nếu là lỗi
+            khi cấu hình engine (không thuộc yêu cầu nào).
+        move (chess.Move or None): Nước đi tốt nhất engine chọn, None nếu có lỗi.
+        info (dict): Thông tin phân tích engine trả về (pv, score, depth...).
+        error (Exception or None): Lỗi engine nếu việc tìm kiếm thất bại.
+        elapsed (float or None): Thời gian (giây) để có nước đi, không tính thời gian
+            chờ tối thiểu ``min_delay``; None nếu có lỗi.
+    """
+
+    def __init__(self, job_id, move=None, info=None, error=None, elapsed=None):
+        self.job_id = job_id
+        self.move = move
+        self.info = info or {}
+        self.error = error
+        self.elapsed = elapsed
+
+
+class AnalysisUpdate:
+    """Kết quả tạm thời của chế độ phân tích liên tục.
+
+    Attributes:
+        job_id (int): Mã của yêu cầu phân tích.
+        board (chess.Board): Thế cờ đang được phân tích.
+        lines (list): Thông tin của từng biến chính (dict có ``score``, ``depth``, ``pv``...),
+            biến tốt nhất trước.
+        error (Exception or None): Lỗi engine nếu việc phân tích thất bại.
+    """
+
+    def __init__(self, job_id, board, lines=None, error=None):
+        self.job_id = job_id
+        self.board = board
+        self.lines = lines or []
+        self.error = error
+
+
+class PonderStats:
+    """Thống kê ponder của một ván cờ.
+
+    Attributes:
+        ponders (int): Số lần engine ponder sau nước đi của mình.
+        hits (int): Số lần người chơi đi đúng nước được dự đoán.
+        time_saved (float): Tổng thời gian (giây) tiết kiệm được nhờ ponderhit.
+    """
+
+    def __init__(self):
+        self.ponders = 0
+        self.hits = 0
+        self.time_saved = 0.0
+
+    @property
+    def hit_rate(self):
+        """float: Tỉ lệ dự đoán đúng (0.0 nếu chưa ponder lần nào)."""
+        return self.hits / self.ponders if self.ponders else 0.0
+
+    def __str__(self):
+        return f"ponder hits {self.hits}/{self.ponders} ({self.hit_rate:.0%}), time saved {self.time_saved:.2f}s"
+
+
+class EngineWorker:
+    """Chạy engine UCI trên một luồng nền và xử lý các yêu cầu tìm nước đi.
+
+    Mỗi lần chỉ có một yêu cầu được xử lý; gửi yêu cầu mới sẽ huỷ yêu cầu cũ.
+    Kết quả của yêu cầu bị huỷ không bao giờ được gửi về. Mỗi ván cờ mượn một
+    engine từ pool ở lần tìm kiếm đầu tiên và trả lại khi gọi ``new_game``.
+
+    Args:
+        engine_path (str): Đường dẫn tới file thực thi của engine.
+        on_result (callable): Hàm nhận một EngineResult, được gọi từ luồng nền.
+        ponder (bool): Bật chế độ ponder trong thời gian của người chơi.
+        pool_size (int): Số tiến trình engine giữ sẵn trong pool.
+        cache (engine_cache.EngineCache or None): Bộ đệm kết quả theo thế cờ.
+        book (opening_book.OpeningBook or None): Sách khai cuộc, được tra trước engine.
+        tablebase (tablebase.Tablebase or None): Bảng tàn cuộc Syzygy, được tra trước engine.
+        metrics (metrics.Metrics or None): Nơi ghi nhận thời gian và thông tin tìm kiếm.
+        warmup_limit (chess.engine.Limit or None): Giới hạn của lần tìm kiếm làm nóng
+            engine khi khởi động, None để bỏ qua.
+        resources (engine_resources.EngineResources or None): Tuỳ chọn chung của các engine
+            trong pool (NUMA) và chính sách giữ bảng băm giữa các ván; Threads/Hash theo
+            độ khó được gửi qua ``configure``.
+    """
+
+    def __init__(self, engine_path, on_result, ponder=False, pool_size=1, cache=None, book=None, tablebase=None,
+                 metrics=None, warmup_limit=WARMUP_LIMIT, resources=None):
+        self.engine_path = engine_path
+        self.on_result = on_result
+        self.ponder = ponder
+        self.pool_size = pool_size
+        self.cache = cache
+        self.book = book
+        self.tablebase = tablebase
+        self.metrics = metrics
+        self.warmup_limit = warmup_limit
+        self.resources = resources
+        self.ponder_stats = PonderStats()
+        self.pool = None
+        self._engine = None
+        self._options = {}
+        if tablebase is not None:
+            # Engine cung dung bang tan cuoc trong tim kiem (duong dan tuyet doi vi engine co the chay o thu muc khac)
+            paths = tablebase.path.split(os.pathsep)
+            self._options["SyzygyPath"] = os.pathsep.join(os.path.abspath(path) for path in paths)
+        self._ponder_board = None
+        self._loop = None
+        self._thread = None
+        self._job_ids = itertools.count(1)
+        self._current = None
+        self._current_job_id = None
+        self._startup = None
+        self._lock = threading.Lock()
+
+    def start(self, wait=True, on_ready=None):
+        """Khởi động luồng nền, mở các engine của pool và làm nóng engine đầu tiên.
+
+        Args:
+            wait (bool): True để chờ khởi động xong, False để khởi động nền (giao diện
+                dùng được ngay; các yêu cầu gửi tới sớm sẽ chờ engine sẵn sàng).
+            on_ready (callable or None): Hàm nhận lỗi khởi động (None nếu thành công),
+                được gọi từ luồng nền khi khởi động xong.
+
+        Raises:
+            FileNotFoundError: Nếu ``wait`` và không tìm thấy file thực thi của engine.
+            chess.engine.EngineError: Nếu ``wait`` và engine không khởi động được.
+        """
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="engine-worker", daemon=True)
+        self._thread.start()
+        resources = self.resources
+        self.pool = EnginePool(self.engine_path, size=self.pool_size,
+                               options=resources.pool_options() if resources is not None else None,
+                               keep_hash=resources is not None and resources.keep_hash)
+        self._startup = asyncio.run_coroutine_threadsafe(self._start_engines(on_ready), self._loop)
+        if wait:
+            try:
+                self.wait_ready()
+            except BaseException:
+                self._stop_loop()
+                raise
+
+    @property
+    def ready(self):
+        """bool: True nếu engine đã khởi động và làm nóng xong."""
+        return self._startup is not None and self._startup.done() and not self._startup.cancelled() \
+            and self._startup.exception() is None
+
+    def wait_ready(self, timeout=None):
+        """Chờ tới khi việc khởi động engine kết thúc.
+
+        Args:
+            timeout (float or None): Thời gian chờ tối đa (giây), None để chờ tới khi xong.
+
+        Raises:
+            FileNotFoundError: Nếu không tìm thấy file thực thi của engine.
+            chess.engine.EngineError: Nếu engine không khởi động được.
+            concurrent.futures.TimeoutError: Nếu hết thời gian chờ.
+        """
+        self._startup.result(timeout)
+
+    def configure(self, options):
+        """Cấu hình các tuỳ chọn UCI của engine (ví dụ ``{"Skill Level": 10}``).
+
+        Các tuỳ chọn được giữ lại và áp dụng lại mỗi khi mượn engine mới từ pool.
+        Hàm không chờ engine (có thể đang khởi động); các yêu cầu gửi sau đó luôn
+        chạy với tuỳ chọn mới. Lỗi khi áp dụng tuỳ chọn được ghi log và gửi về qua
+        ``on_result`` dưới dạng EngineResult có ``job_id`` là None.
+
+        Args:
+            options (dict): Các tuỳ chọn UCI cần thiết lập.
+        """
+        self.cancel()
+        # Tao dict moi thay vi sua tai cho: luong engine co the dang duyet dict cu (khoi dong, tra cache)
+        self._options = {**self._options, **options}
+        future = asyncio.run_coroutine_threadsafe(self._configure(), self._loop)
+        future.add_done_callback(self._configured)
+
+    def _configured(self, future):
+        """Báo lỗi của lần cấu hình engine chạy nền (nếu có) về vòng lặp chính.
+
+        Args:
+            future (concurrent.futures.Future): Future của coroutine ``_configure``.
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Loi khi cau hinh engine: {error!r}")
+            self.on_result(EngineResult(None, error=error))
+
+    def submit(self, board, limit, min_delay=0.0):
+        """Gửi một yêu cầu tìm nước đi cho thế cờ hiện tại.
+
+        Args:
+            board (chess.Board): Bàn cờ cần tìm nước đi (được sao chép trước khi gửi).
+            limit (chess.engine.Limit): Giới hạn tìm kiếm.
+            min_delay (float): Thời gian tối thiểu (giây) trước khi trả kết quả,
+                để người chơi kịp nhìn thấy nước đi của mình.
+
+        Returns:
+            int: Mã của yêu cầu, dùng để đối chiếu với EngineResult.job_id.
+        """
+        job_id = next(self._job_ids)
+        self._start(job_id, self._search(job_id, board.copy(), limit, min_delay))
+        return job_id
+
+    def analyse(self, board, on_update, multipv=1, interval=0.0):
+        """Bắt đầu phân tích liên tục một thế cờ (dừng yêu cầu đang chạy, nếu có).
+
+        Việc phân tích chạy cho tới khi có yêu cầu mới, ``stop_analysis`` hoặc ``cancel``.
+
+        Args:
+            board (chess.Board): Thế cờ cần phân tích (được sao chép trước khi gửi).
+            on_update (callable): Hàm nhận một AnalysisUpdate, được gọi từ luồng nền.
+            multipv (int): Số biến chính cần phân tích.
+            interval (float): Khoảng thời gian tối thiểu (giây) giữa hai lần gọi ``on_update``
+                (ví dụ ``1 / fps`` để không cập nhật nhanh hơn tốc độ khung hình).
+
+        Returns:
+            int: Mã của yêu cầu phân tích.
+        """
+        job_id = next(self._job_ids)
+        self._start(job_id, self._analyse(job_id, board.copy(), multipv, interval, on_update))
+        return job_id
+
+    def stop_analysis(self, job_id):
+        """Dừng lần phân tích ``job_id`` nếu nó vẫn đang chạy (không ảnh hưởng yêu cầu khác)."""
+        with self._lock:
+            if self._current is not None and self._current_job_id == job_id:
+                self._current.cancel()
+                self._current = None
+
+    def _start(self, job_id, coro):
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+            self._current = asyncio.run_coroutine_threadsafe(coro, self._loop)
+            self._current_job_id = job_id
+
+    def cancel(self):
+        """Huỷ yêu cầu đang chạy (nếu có) và dừng ponder. Kết quả của nó sẽ bị bỏ qua."""
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+                self._current = None
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._stop_pondering(), self._loop)
+
+    def new_game(self):
+        """Bắt đầu ván mới: huỷ tìm kiếm và trả engine về pool (pool gửi ``ucinewgame`` trừ khi giữ bảng băm).
+
+        Returns:
+            PonderStats: Thống kê ponder của ván vừa kết thúc.
+        """
+        self.cancel()
+        stats = self.ponder_stats
+        self.ponder_stats = PonderStats()
+        if self._loop is not None:
+            # Tra engine ve pool: pool dat lai tuy chon va gui ucinewgame
+            asyncio.run_coroutine_threadsafe(self._release_engine(), self._loop)
+        return stats
+
+    def close(self):
+        """Huỷ mọi yêu cầu, tắt các engine và dừng luồng nền."""
+        if self._loop is None:
+            return
+        self.cancel()
+        if self._startup is not None:
+            self._startup.cancel()
+        try:
+            self._call(self._shutdown(), timeout=10)
+        except Exception:
+            pass
+        self._stop_loop()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def _call(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def _configure(self):
+        engine = self._engine
+        if engine is not None:
+            async with engine.lock:
+                await engine.protocol.configure(self._options)
+
+    async def _start_engines(self, on_ready):
+        started = self._loop.time()
+        try:
+            await self.pool.start()
+            # Giu engine da lam nong cho van dau tien thay vi tra ve pool
+            engine = self._engine = await self.pool.acquire()
+            async with engine.lock:
+                await engine.protocol.configure(self._options)
+                await engine.protocol.ping()
+                if self.warmup_limit is not None:
+                    with engine.busy():
+                        await engine.protocol.analyse(chess.Board(), self.warmup_limit)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            if on_ready is not None:
+                on_ready(e)
+            raise
+        if self.metrics is not None:
+            self.metrics.set("engine_startup_seconds", self._loop.time() - started)
+        if on_ready is not None:
+            on_ready(None)
+
+    async def _acquire_engine(self):
+        if self._startup is not None and not self.ready:
+            # Nguoi choi bat dau truoc khi engine khoi dong xong
+            try:
+                await asyncio.wrap_future(self._startup)
+            except (OSError, chess.engine.EngineError) as e:
+                raise chess.engine.EngineTerminatedError(f"engine khong khoi dong duoc: {e}") from e
+        if self._engine is None:
+            self._engine = await self.pool.acquire()
+            await self._configure()
+        return self._engine
+
+    async def _release_engine(self):
+        engine, self._engine = self._engine, None
+        self._ponder_board = None
+        if engine is not None:
+            await self.pool.release(engine)
+
+    async def _shutdown(self):
+        await self._release_engine()
+        await self.pool.close()
+
+    async def _stop_pondering(self):
+        engine = self._engine
+        if self._ponder_board is not None and engine is not None:
+            self._ponder_board = None
+            # Lenh moi bat ky se khien python-chess gui "stop" cho lan ponder dang chay
+            try:
+                async with engine.lock:
+                    await engine.protocol.ping()
+            except chess.engine.EngineError:
+                pass
+
+    async def _search(self, job_id, board, limit, min_delay):
+        started = self._loop.time()
+        known = self._lookup(board, limit)
+        if known is not None:
+            # Nuoc di tu sach khai cuoc, bang tan cuoc hoac bo dem: khong can engine, dung ponder dang chay (neu co)
+            await self._stop_pondering()
+            move, info = known
+            source = "book" if info.get("book") else "tablebase" if info.get("tablebase") else "cache"
+            self._record_search(source, started, info)
+            elapsed = await self._wait_min_delay(started, min_delay)
+            self.on_result(EngineResult(job_id, move=move, info=info, elapsed=elapsed))
+            return
+        ponder_hit = self._ponder_board is not None and board.move_stack == self._ponder_board.move_stack
+        self._ponder_board = None
+        for attempt in range(2):
+            try:
+                engine = await self._acquire_engine()
+                async with engine.lock:
+                    with engine.busy():
+                        if self.ponder:
+                            result = await engine.protocol.play(board, limit, ponder=True, info=chess.engine.INFO_ALL)
+                            info = result.info
+                            move = result.move
+                            if move is None:
+                                raise chess.engine.EngineError("engine returned no move")
+                        else:
+                            info = await engine.protocol.analyse(board, limit)
+                            move = info["pv"][0]
+                break
+            except asyncio.CancelledError:
+                raise
+            except chess.engine.EngineTerminatedError as e:
+                # Engine chet hoac bi watchdog tat: tra ve pool de khoi dong lai roi thu lai
+                await self._release_engine()
+                ponder_hit = False
+                if attempt == 1:
+                    self.on_result(EngineResult(job_id, error=e))
+                    return
+            except (chess.engine.EngineError, KeyError, IndexError) as e:
+                self.on_result(EngineResult(job_id, error=e))
+                return
+        if self.cache is not None:
+            self.cache.put(board, limit, self._options, move, info)
+        self._record_search("ponderhit" if ponder_hit else "engine", started, info)
+        if self.ponder:
+            elapsed = self._loop.time() - started
+            if ponder_hit:
+                self.ponder_stats.hits += 1
+                if limit.time is not None:
+                    self.ponder_stats.time_saved += max(0.0, limit.time - elapsed)
+            if result.ponder is not None:
+                # Engine dang ponder tren the co sau nuoc tra loi du doan
+                self._ponder_board = board.copy()
+                self._ponder_board.push(move)
+                self._ponder_board.push(result.ponder)
+                self.ponder_stats.ponders += 1
+        elapsed = await self._wait_min_delay(started, min_delay)
+        self.on_result(EngineResult(job_id, move=move, info=info, elapsed=elapsed))
+
+    async def _analyse(self, job_id, board, multipv, interval, on_update):
+        await self._stop_pondering()
+        try:
+            engine = await self._acquire_engine()
+        except chess.engine.EngineError as e:
+            on_update(AnalysisUpdate(job_id, board, error=e))
+            return
+        loop = self._loop
+        started = loop.time()
+        multipv = max(1, min(multipv, board.legal_moves.count()))
+        # Khong danh dau engine ban: phan tich khong gioi han thoi gian, watchdog khong duoc tat engine
+        async with engine.lock:
+            try:
+                analysis = await engine.protocol.analysis(
+                    board, multipv=multipv, info=chess.engine.INFO_BASIC | chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+            except chess.engine.EngineError as e:
+                on_update(AnalysisUpdate(job_id, board, error=e))
+                return
+            try:
+                last_update = None
+                pending = False
+                while True:
+                    # Gom cac dong info den trong mot khoang interval, gui ban moi nhat
+                    timeout = None
+                    if pending:
+                        timeout = max(0.0, last_update + interval - loop.time())
+                    try:
+                        await asyncio.wait_for(analysis.get(), timeout)
+                        pending = True
+                    except asyncio.TimeoutError:
+                        pass
+                    except chess.engine.AnalysisComplete:
+                        break
+                    if pending and (last_update is None or loop.time() - last_update >= interval):
+                        if last_update is None and self.metrics is not None:
+                            self.metrics.observe("analysis_first_update_seconds", loop.time() - started)
+                        last_update = loop.time()
+                        pending = False
+                        on_update(AnalysisUpdate(job_id, board, [dict(info) for info in analysis.multipv]))
+                if pending:
+                    on_update(AnalysisUpdate(job_id, board, [dict(info) for info in analysis.multipv]))
+            finally:
+                # Dung ngay khi the co thay doi (yeu cau moi huy coroutine nay)
+                analysis.stop()
+                with contextlib.suppress(chess.engine.EngineError):
+                    await analysis.wait()
+
+    def _lookup(self, board, limit):
+        if self.book is not None:
+            move = self.book.choose(board)
+            if move is not None:
+                return move, {"pv": [move], "book": True}
+        if self.tablebase is not None:
+            move = self.tablebase.choose(board)
+            if move is not None:
+                return move, {"pv": [move], "tablebase": True}
+        if self.cache is not None:
+            return self.cache.get(board, limit, self._options)
+        return None
+
+    def _record_search(self, source, started, info):
+        if self.metrics is not None:
+            self.metrics.record_search(source, self._loop.time() - started, info)
+
+    async def _wait_min_delay(self, started, min_delay):
+        # Cho du thoi gian toi thieu de nguoi choi nhin thay nuoc di cua minh; tra ve thoi gian truoc khi cho
+        elapsed = self._loop.time() - started
+        if min_delay > elapsed:
+            await asyncio.sleep(min_delay - elapsed)
+        return elapsed
@@ -0,0 +1,545 @@
+"""Kho lưu trữ nhị phân cho rất nhiều ván cờ, đọc ngẫu nhiên qua mmap.
+
+Mỗi ván một file văn bản trong ``history`` tiện khi chơi, nhưng với hàng triệu ván tự
+đấu thì liệt kê, sao lưu và đọc lại đều chậm. Kho lưu trữ gồm hai file chỉ ghi nối
+thêm:
+
+- file dữ liệu (``.cga``): 8 byte nhận dạng, sau đó là các bản ghi ván cờ nối tiếp
+  nhau. Mỗi bản ghi gồm phần đầu cố định (GAME_HEADER: thời điểm, số nửa nước, kết
+  quả, Skill Level, độ dài tên hai bên và độ khó), tên hai bên và độ khó (UTF-8), một
+  byte đệm nếu cần để các nước đi bắt đầu ở địa chỉ chẵn, rồi mỗi nước đi một mã 16
+  bit (``from | to << 6 | promotion << 12``).
+- file chỉ mục (``.cga.idx``): vị trí (8 byte) của từng bản ghi, nên ván thứ ``n`` được
+  tìm thấy trong O(1).
+
+ArchiveReader ánh xạ cả hai file vào bộ nhớ (mmap): duyệt các ván chỉ đọc phần đầu
+của bản ghi, danh sách mã nước đi là một ``memoryview`` trên chính vùng nhớ của file
+(không sao chép) và chỉ được giải mã thành ``chess.Move`` khi cần. Nếu chương trình
+dừng giữa lúc ghi, lần mở tiếp theo bằng ArchiveWriter bổ sung chỉ mục cho các bản
+ghi hoàn chỉnh và cắt bỏ bản ghi dở.
+
+Các thẻ PGN khác (Event, Site...) không được lưu; chuyển đổi ngược ra PGN tạo lại
+White, Black, Result, Difficulty, SkillLevel, Date và Time.
+
+Ví dụ::
+
+    python game_archive.py pack history docs/history --out history.cga
+    python game_archive.py unpack history.cga exported --format pgn
+    python game_archive.py unpack history.cga all_games.pgn
+    python game_archive.py bench history --archive history.cga
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+import chess
+
+from game_core import format_history_line
+from history_index import GameRecord, iter_history_files, read_games
+from recorder import build_pgn, write_file
+
+ARCHIVE_MAGIC = b"CGARC\x00\x01\x00" # Ten dinh dang va phien ban
+GAME_HEADER = struct.Struct("<dHBbBBB") # timestamp, plies, result, skill, len(white), len(black), len(difficulty)
+INDEX_ENTRY = struct.Struct("<Q")
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+MAX_PLIES = 0xFFFF
+
+_MOVE_TABLE = {} # Ma 16 bit -> chess.Move, dien dan khi giai ma
+
+
+def encode_move(move):
+    """Mã hoá một nước đi thành số 16 bit.
+
+    Args:
+        move (chess.Move): Nước đi (không dùng nước đi rỗng).
+
+    Returns:
+        int: ``from_square | to_square << 6 | (promotion - 1) << 12`` (0 ở 4 bit cao nếu không phong cấp).
+    """
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.from_square | move.to_square << 6 | promotion << 12
+
+
+def decode_move(code):
+    """Giải mã số 16 bit thành nước đi (ngược với ``encode_move``)."""
+    move = _MOVE_TABLE.get(code)
+    if move is None:
+        promotion = code >> 12
+        move = _MOVE_TABLE[code] = chess.Move(code & 0x3F, code >> 6 & 0x3F, promotion + 1 if promotion else None)
+    return move
+
+
+def _text(value):
+    # Cat ten qua dai de do dai vua mot byte, khong cat giua mot ky tu UTF-8
+    return (value or "").encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _record_size(plies, text_length):
+    size = GAME_HEADER.size + text_length
+    return size + size % 2 + 2 * plies
+
+
+def _record_end(data, offset):
+    if offset + GAME_HEADER.size > len(data):
+        return len(data) + 1
+    _, plies, _, _, white_length, black_length, difficulty_length = GAME_HEADER.unpack_from(data, offset)
+    return offset + _record_size(plies, white_length + black_length + difficulty_length)
+
+
+class ArchivedGame:
+    """Một ván cờ trong kho lưu trữ; các nước đi chỉ được giải mã khi cần.
+
+    Attributes:
+        id (int): Số thứ tự của ván trong kho (bắt đầu từ 0).
+        white (str): Tên bên trắng.
+        black (str): Tên bên đen.
+        result (str): Kết quả theo ký hiệu PGN.
+        skill_level (int or None): Skill Level của bot, None nếu không rõ.
+        difficulty (str or None): Tên độ khó, None nếu không rõ.
+        timestamp (float or None): Thời điểm bắt đầu ván (Unix time), None nếu không rõ.
+        plies (int): Số nửa nước.
+    """
+
+    def __init__(self, reader, game_id, offset):
+        self._reader = reader
+        self.id = game_id
+        data = reader._data
+        timestamp, plies, result, skill, white_length, black_length, difficulty_length = GAME_HEADER.unpack_from(data, offset)
+        position = offset + GAME_HEADER.size
+        texts = []
+        for length in (white_length, black_length, difficulty_length):
+            texts.append(bytes(data[position:position + length]).decode("utf-8"))
+            position += length
+        self.white, self.black, difficulty = texts
+        self.difficulty = difficulty or None
+        self.result = RESULTS[result] if result < len(RESULTS) else "*"
+        self.skill_level = skill if skill >= 0 else None
+        self.timestamp = timestamp or None
+        self.plies = plies
+        self._moves_start = position + (position - offset) % 2
+
+    @property
+    def move_codes(self):
+        """memoryview: Các mã nước đi 16 bit, trỏ thẳng vào vùng nhớ của file (không sao chép).
+
+        Không dùng memoryview này sau khi đóng ArchiveReader.
+        """
+        view = memoryview(self._reader._data)[self._moves_start:self._moves_start + 2 * self.plies]
+        return view.cast("H")
+
+    @property
+    def moves(self):
+        """list: Các nước đi (chess.Move) của ván."""
+        with memoryview(self._reader._data) as data:
+            with data[self._moves_start:self._moves_start + 2 * self.plies] as raw:
+                if sys.byteorder == "little":
+                    with raw.cast("H") as codes:
+                        return [decode_move(code) for code in codes]
+                return [decode_move(code) for (code,) in struct.iter_unpack("<H", raw)]
+
+    @property
+    def headers(self):
+        """dict: Các thẻ PGN tạo lại từ phần đầu của bản ghi."""
+        headers = {"White": self.white, "Black": self.black}
+        if self.timestamp is not None:
+            started_at = datetime.fromtimestamp(self.timestamp)
+            headers["Date"] = started_at.strftime("%Y.%m.%d")
+            headers["Time"] = started_at.strftime("%H:%M:%S")
+        if self.difficulty is not None:
+            headers["Difficulty"] = self.difficulty
+        if self.skill_level is not None:
+            headers["SkillLevel"] = str(self.skill_level)
+        return headers
+
+    def to_record(self):
+        """Chuyển thành history_index.GameRecord (dùng chung với chỉ mục, xem lại, chú thích)."""
+        return GameRecord(self._reader.path, self.id, self.headers, self.moves, self.result)
+
+
+class ArchiveReader:
+    """Đọc kho lưu trữ qua mmap: ``len(reader)``, ``reader[game_id]`` (O(1)) và duyệt lười.
+
+    Args:
+        path (str): File dữ liệu ``.cga`` (chỉ mục là ``path + ".idx"``; nếu thiếu hoặc
+            không khớp, vị trí các bản ghi được tính lại bằng cách quét file dữ liệu).
+
+    Raises:
+        ValueError: Nếu file không phải kho lưu trữ của trò chơi.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if bytes(self._data[:len(ARCHIVE_MAGIC)]) != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} khong phai kho luu tru van co")
+        self._index_file = None
+        self._index = None
+        self._offsets = None
+        index_path = path + ".idx"
+        if os.path.exists(index_path) and os.path.getsize(index_path) >= INDEX_ENTRY.size:
+            self._index_file = open(index_path, "rb")
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._count = len(self._index) // INDEX_ENTRY.size
+            if _record_end(self._data, self._offset(self._count - 1)) > len(self._data):
+                # Chi muc khong khop voi file du lieu (ban ghi cuoi bi cat)
+                self._index.close()
+                self._index = None
+        if self._index is None:
+            self._offsets = scan_records(self._data)
+            self._count = len(self._offsets)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, game_id):
+        if game_id < 0:
+            game_id += self._count
+        if not 0 <= game_id < self._count:
+            raise IndexError(game_id)
+        return ArchivedGame(self, game_id, self._offset(game_id))
+
+    def __iter__(self):
+        for game_id in range(self._count):
+            yield ArchivedGame(self, game_id, self._offset(game_id))
+
+    def _offset(self, game_id):
+        if self._offsets is not None:
+            return self._offsets[game_id]
+        return INDEX_ENTRY.unpack_from(self._index, game_id * INDEX_ENTRY.size)[0]
+
+    def close(self):
+        """Đóng các file; không dùng các ván đã đọc sau khi đóng."""
+        for mapped in (self._data, getattr(self, "_index", None)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        for f in (self._file, getattr(self, "_index_file", None)):
+            if f is not None:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scan_records(data, start=len(ARCHIVE_MAGIC)):
+    """Tìm vị trí các bản ghi hoàn chỉnh bằng cách đọc lần lượt phần đầu của từng bản ghi.
+
+    Args:
+        data (bytes or mmap.mmap): Nội dung file dữ liệu.
+        start (int): Vị trí của bản ghi đầu tiên cần quét.
+
+    Returns:
+        list: Vị trí của từng bản ghi hoàn chỉnh (bản ghi dở ở cuối file bị bỏ qua).
+    """
+    offsets = []
+    offset = start
+    while offset + GAME_HEADER.size <= len(data):
+        end = _record_end(data, offset)
+        if end > len(data):
+            break
+        offsets.append(offset)
+        offset = end
+    return offsets
+
+
+class ArchiveWriter:
+    """Ghi nối thêm các ván vào kho lưu trữ (tạo mới nếu chưa có).
+
+    Khi mở một kho đã có, các bản ghi hoàn chỉnh chưa có trong chỉ mục (chương trình
+    dừng giữa hai lần ghi) được bổ sung vào chỉ mục và bản ghi dở ở cuối bị cắt bỏ.
+
+    Args:
+        path (str): File dữ liệu ``.cga``.
+
+    Raises:
+        ValueError: Nếu file đã có nhưng không phải kho lưu trữ của trò chơi.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._data = open(path, "a+b")
+        self._index = open(path + ".idx", "a+b")
+        self._data.seek(0)
+        magic = self._data.read(len(ARCHIVE_MAGIC))
+        if not magic:
+            self._data.write(ARCHIVE_MAGIC)
+            self._data.flush()
+        elif magic != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} khong phai kho luu tru van co")
+        self._recover()
+
+    def _recover(self):
+        self._index.seek(0)
+        indexed = self._index.read()
+        offsets = [offset for (offset,) in INDEX_ENTRY.iter_unpack(indexed[:len(indexed) - len(indexed) % INDEX_ENTRY.size])]
+        size = os.fstat(self._data.fileno()).st_size
+        data = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Bo cac muc chi muc tro toi ban ghi khong hoan chinh, roi quet tiep phan chua co trong chi muc
+            while offsets and _record_end(data, offsets[-1]) > size:
+                offsets.pop()
+            start = _record_end(data, offsets[-1]) if offsets else len(ARCHIVE_MAGIC)
+            missing = scan_records(data, start)
+            end = _record_end(data, missing[-1]) if missing else start
+        finally:
+            data.close()
+        if end < size:
+            self._data.truncate(end) # Bo ban ghi do o cuoi file
+        offsets += missing
+        if len(offsets) * INDEX_ENTRY.size != len(indexed):
+            self._index.truncate(0)
+            self._index.write(b"".join(INDEX_ENTRY.pack(offset) for offset in offsets))
+            self._index.flush()
+        self._count = len(offsets)
+        self._data.seek(0, os.SEEK_END)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, moves, white, black, result="*", skill_level=None, difficulty=None, timestamp=None):
+        """Ghi thêm một ván.
+
+        Args:
+            moves (list): Các nước đi (chess.Move) từ thế cờ ban đầu.
+            white (str): Tên bên trắng.
+            black (str): Tên bên đen.
+            result (str): Kết quả theo ký hiệu PGN.
+            skill_level (int or None): Skill Level của bot.
+            difficulty (str or None): Tên độ khó.
+            timestamp (float or None): Thời điểm bắt đầu ván (Unix time).
+
+        Returns:
+            int: Số thứ tự của ván trong kho.
+
+        Raises:
+            ValueError: Nếu ván dài quá MAX_PLIES nửa nước.
+        """
+        if len(moves) > MAX_PLIES:
+            raise ValueError(f"Van co qua dai: {len(moves)} nua nuoc")
+        texts = [_text(white), _text(black), _text(difficulty)]
+        text_length = sum(len(text) for text in texts)
+        header = GAME_HEADER.pack(timestamp or 0.0, len(moves), RESULTS.index(result) if result in RESULTS else 0,
+                                  skill_level if skill_level is not None and -1 < skill_level < 128 else -1,
+                                  *(len(text) for text in texts))
+        padding = b"\0" * ((GAME_HEADER.size + text_length) % 2)
+        codes = struct.pack(f"<{len(moves)}H", *(encode_move(move) for move in moves))
+        offset = self._data.tell()
+        self._data.write(b"".join((header, *texts, padding, codes)))
+        self._index.write(INDEX_ENTRY.pack(offset))
+        game_id = self._count
+        self._count += 1
+        return game_id
+
+    def append_record(self, record):
+        """Ghi thêm một ván đọc từ file lịch sử (history_index.GameRecord).
+
+        Returns:
+            int: Số thứ tự của ván trong kho.
+        """
+        headers = record.headers
+        skill_level = headers.get("SkillLevel")
+        return self.append(record.moves, headers.get("White", "?"), headers.get("Black", "?"), record.result,
+                           int(skill_level) if skill_level and skill_level.isdigit() else None,
+                           headers.get("Difficulty"), header_timestamp(headers))
+
+    def flush(self):
+        """Đẩy dữ liệu đã ghi xuống hệ điều hành (file dữ liệu trước, chỉ mục sau)."""
+        self._data.flush()
+        self._index.flush()
+
+    def close(self):
+        """Ghi nốt dữ liệu và đóng các file."""
+        for f in (self._data, self._index):
+            if not f.closed:
+                f.flush()
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def header_timestamp(headers):
+    """Thời điểm bắt đầu ván (Unix time) từ thẻ Date và Time, None nếu không rõ."""
+    try:
+        return datetime.strptime(f"{headers['Date']} {headers.get('Time', '00:00:00')}", "%Y.%m.%d %H:%M:%S").timestamp()
+    except (KeyError, ValueError):
+        return None
+
+
+def format_legacy_history(game):
+    """Tạo nội dung file lịch sử định dạng văn bản cũ (mỗi dòng một nước đi).
+
+    Args:
+        game (ArchivedGame or history_index.GameRecord): Ván cờ.
+
+    Returns:
+        str: Các dòng như ``White (Stockfish): e2e4``.
+    """
+    headers = game.headers
+    engines = {chess.WHITE: headers.get("White", "").startswith("Stockfish"),
+               chess.BLACK: headers.get("Black", "").startswith("Stockfish")}
+    lines = []
+    color = chess.WHITE
+    for move in game.moves:
+        lines.append(format_history_line(color, move, engines[color]))
+        color = not color
+    return "".join(f"{line}\n" for line in lines)
+
+
+def pack(sources, archive_path):
+    """Ghi các ván trong các file/thư mục lịch sử vào kho lưu trữ.
+
+    Args:
+        sources (list): File ``.pgn``/``.txt`` hoặc thư mục lịch sử.
+        archive_path (str): File dữ liệu ``.cga`` (được ghi nối thêm).
+
+    Returns:
+        int: Số ván đã ghi.
+    """
+    count = 0
+    with ArchiveWriter(archive_path) as writer:
+        for path in _history_paths(sources):
+            try:
+                records = read_games(path)
+            except (OSError, ValueError) as e:
+                print(f"Loi khi doc {path}: {e}")
+                continue
+            for record in records:
+                writer.append_record(record)
+                count += 1
+    return count
+
+
+def unpack(archive_path, out, text_format="pgn"):
+    """Xuất các ván trong kho lưu trữ ra file lịch sử.
+
+    Args:
+        archive_path (str): File dữ liệu ``.cga``.
+        out (str): File ``.pgn`` (mọi ván trong một file) hoặc thư mục (mỗi ván một file).
+        text_format (str): ``"pgn"`` hoặc ``"txt"`` (định dạng văn bản cũ) khi ``out`` là thư mục.
+
+    Returns:
+        int: Số ván đã xuất.
+    """
+    with ArchiveReader(archive_path) as reader:
+        if out.endswith(".pgn"):
+            write_file(out, "".join(build_pgn(game.headers, game.moves, game.result) for game in reader))
+            return len(reader)
+        os.makedirs(out, exist_ok=True)
+        for game in reader:
+            path = os.path.join(out, f"game_{game.id:06d}.{text_format}")
+            if text_format == "txt":
+                write_file(path, format_legacy_history(game))
+            else:
+                write_file(path, build_pgn(game.headers, game.moves, game.result))
+        return len(reader)
+
+
+def _history_paths(sources):
+    for source in sources:
+        if os.path.isdir(source):
+            yield from sorted(entry.path for entry in iter_history_files([source]))
+        else:
+            yield source
+
+
+def bench(sources, archive_path):
+    """So sánh dung lượng và thời gian đọc mọi nước đi giữa file văn bản và kho lưu trữ.
+
+    Args:
+        sources (list): File hoặc thư mục lịch sử đã được ghi vào ``archive_path``.
+        archive_path (str): File dữ liệu ``.cga``.
+
+    Returns:
+        dict: ``text_bytes``, ``archive_bytes``, ``text_seconds``, ``archive_seconds``, ``games``.
+    """
+    paths = list(_history_paths(sources))
+    # Dung luong tren dia tinh theo block (moi file nho chiem it nhat mot block)
+    text_bytes = sum(os.stat(path).st_blocks * 512 for path in paths)
+    started = time.perf_counter()
+    text_plies = sum(len(record.moves) for path in paths for record in read_games(path))
+    text_seconds = time.perf_counter() - started
+
+    archive_bytes = sum(os.stat(path).st_blocks * 512 for path in (archive_path, archive_path + ".idx"))
+    started = time.perf_counter()
+    with ArchiveReader(archive_path) as reader:
+        archive_plies = sum(len(game.moves) for game in reader)
+        games = len(reader)
+    archive_seconds = time.perf_counter() - started
+    if archive_plies != text_plies:
+        print(f"Canh bao: so nua nuoc khac nhau ({text_plies} trong file van ban, {archive_plies} trong kho)")
+    return {"games": games, "text_bytes": text_bytes, "archive_bytes": archive_bytes,
+            "text_seconds": text_seconds, "archive_seconds": archive_seconds}
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của công cụ lưu trữ.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Compact binary game archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pack_command = commands.add_parser("pack", help="ghi cac van trong file/thu muc lich su vao kho")
+    pack_command.add_argument("sources", nargs="+", help="file .pgn/.txt hoac thu muc lich su")
+    pack_command.add_argument("--out", required=True, help="file kho luu tru (.cga), ghi noi them neu da co")
+
+    unpack_command = commands.add_parser("unpack", help="xuat cac van trong kho ra file lich su")
+    unpack_command.add_argument("archive", help="file kho luu tru (.cga)")
+    unpack_command.add_argument("out", help="file .pgn (moi van trong mot file) hoac thu muc (moi van mot file)")
+    unpack_command.add_argument("--format", choices=["pgn", "txt"], default="pgn", help="dinh dang file khi xuat ra thu muc")
+
+    info_command = commands.add_parser("info", help="so van va dung luong cua kho")
+    info_command.add_argument("archive", help="file kho luu tru (.cga)")
+
+    bench_command = commands.add_parser("bench", help="so sanh dung luong va thoi gian doc voi file van ban")
+    bench_command.add_argument("sources", nargs="+", help="file hoac thu muc lich su da ghi vao kho")
+    bench_command.add_argument("--archive", required=True, help="file kho luu tru (.cga)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy công cụ lưu trữ từ dòng lệnh."""
+    args = parse_args(argv)
+    started = time.perf_counter()
+    if args.command == "pack":
+        count = pack(args.sources, args.out)
+        print(f"Packed {count} games into {args.out} in {time.perf_counter() - started:.1f}s")
+    elif args.command == "unpack":
+        count = unpack(args.archive, args.out, args.format)
+        print(f"Unpacked {count} games to {args.out} in {time.perf_counter() - started:.1f}s")
+    elif args.command == "info":
+        with ArchiveReader(args.archive) as reader:
+            plies = sum(game.plies for game in reader)
+            print(f"{args.archive}: {len(reader)} games, {plies} plies, {os.path.getsize(args.archive)} bytes")
+    else:
+        result = bench(args.sources, args.archive)
+        print(f"{result['games']} games")
+        print(f"Disk: text {result['text_bytes'] / 1024:.0f} KiB, archive {result['archive_bytes'] / 1024:.0f} KiB "
+              f"({result['text_bytes'] / max(result['archive_bytes'], 1):.1f}x smaller)")
+        print(f"Load all moves: text {result['text_seconds']:.2f}s, archive {result['archive_seconds']:.3f}s "
+              f"({result['text_seconds'] / max(result['archive_seconds'], 1e-9):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""Lõi trò chơi cờ vua không phụ thuộc Pygame.
+
+Module này chứa luật chơi, lượt đi và luồng của một ván cờ (chọn màu, chọn độ khó,
+bỏ cuộc, phát hiện kết thúc ván, ghi lịch sử) dưới dạng hai lớp Game và Session.
+Giao diện Pygame trong ChessGame.py và các công cụ chạy không cần cửa sổ (ví dụ
+selfplay.py) đều điều khiển trò chơi thông qua module này, nên có thể import mà
+không mở cửa sổ nào.
+"""
+import chess
+
+from difficulty import PROFILES, GameClock
+from stockfish_build import find_stockfish
+
+# Ban bien dich cho CPU nay (stockfish_build.py) neu co, neu khong dung ban Windows di kem
+STOCKFISH_PATH = find_stockfish() or "stockfish\\stockfish.exe"
+
+# Muc do kho hien thi tren hop thoai -> Skill Level cua Stockfish (cau hinh day du trong difficulty.PROFILES)
+DIFFICULTY_LEVELS = {name: profile.skill_level for name, profile in PROFILES.items()}
+
+
+def color_name(color):
+    """Trả về tên màu quân ("White" hoặc "Black").
+
+    Args:
+        color (chess.Color): Màu quân.
+
+    Returns:
+        str: Tên màu bằng tiếng Anh, dùng trong lịch sử và thông báo.
+    """
+    return "White" if color == chess.WHITE else "Black"
+
+
+def format_history_line(color, move, by_engine):
+    """Tạo một dòng lịch sử nước đi theo định dạng của thư mục ``history``.
+
+    Args:
+        color (chess.Color): Màu của bên vừa đi.
+        move (chess.Move): Nước đi.
+        by_engine (bool): True nếu nước đi do Stockfish chọn.
+
+    Returns:
+        str: Dòng lịch sử, ví dụ ``"White (Stockfish): e2e4"``.
+    """
+    player = f"{color_name(color)} (Stockfish)" if by_engine else color_name(color)
+    return f"{player}: {move.uci()}"
+
+
+def game_over_text(board):
+    """Trả về thông báo kết thúc ván cờ dựa trên trạng thái bàn cờ.
+
+    Args:
+        board (chess.Board): Bàn cờ cần kiểm tra.
+
+    Returns:
+        str: Thông báo kết thúc ván, chuỗi rỗng nếu ván cờ chưa kết thúc.
+    """
+    winner = "Black" if board.turn else "White"
+    if board.is_checkmate():
+        return f"Checkmate! Winner: {winner}"
+    elif board.is_stalemate():
+        return "Stalemate!"
+    elif board.is_insufficient_material():
+        return "Draw due to insufficient material!"
+    elif board.is_seventyfive_moves():
+        return "Draw by 75-move rule!"
+    elif board.is_fivefold_repetition():
+        return "Draw by fivefold repetition!"
+    return ""
+
+
+def tablebase_text(result):
+    """Trả về thông báo kết thúc ván theo bảng tàn cuộc.
+
+    Args:
+        result (str): Kết quả theo ký hiệu PGN ("1-0", "0-1" hoặc "1/2-1/2").
+
+    Returns:
+        str: Thông báo kết thúc ván.
+    """
+    if result == "1/2-1/2":
+        return "Tablebase draw!"
+    return f"Tablebase win! Winner: {'White' if result == '1-0' else 'Black'}"
+
+
+class PositionState:
+    """Thông tin luật chơi của một thế cờ, được tính một lần sau mỗi nước đi.
+
+    Giao diện cần các thông tin này ở mỗi khung hình (nước đi khả thi của quân
+    được chọn, ô vua bị chiếu, ván đã kết thúc chưa); tính sẵn một lần cho mỗi thế
+    cờ giúp mỗi khung hình chỉ còn tra cứu thay vì sinh lại nước đi hợp lệ.
+
+    Args:
+        board (chess.Board): Thế cờ cần tính.
+        tablebase (tablebase.Tablebase or None): Bảng tàn cuộc dùng để kết thúc ván sớm.
+
+    Attributes:
+        moves_from (dict): Ô xuất phát -> danh sách nước đi hợp lệ từ ô đó.
+        targets (dict): Ô xuất phát -> bitboard các ô đích hợp lệ.
+        check_square (chess.Square or None): Ô của vua đang bị chiếu, None nếu không bị chiếu.
+        outcome (chess.Outcome or None): Kết quả nếu ván đã kết thúc theo luật, ngược lại None.
+        tablebase_result (str or None): Kết quả theo bảng tàn cuộc ("1-0", "0-1",
+            "1/2-1/2") nếu ván chưa kết thúc theo luật nhưng thế cờ có trong bảng.
+    """
+
+    def __init__(self, board, tablebase=None):
+        self.moves_from = {}
+        self.targets = {}
+        for move in board.legal_moves:
+            self.moves_from.setdefault(move.from_square, []).append(move)
+            self.targets[move.from_square] = self.targets.get(move.from_square, 0) | chess.BB_SQUARES[move.to_square]
+        self.check_square = board.king(board.turn) if board.is_check() else None
+        self.outcome = board.outcome()
+        self.tablebase_result = None
+        if tablebase is not None and self.outcome is None:
+            self.tablebase_result = tablebase.result(board)
+
+    @property
+    def is_game_over(self):
+        """bool: True nếu ván đã kết thúc theo luật (chiếu hết, hết nước, hoà bắt buộc) hoặc theo bảng tàn cuộc."""
+        return self.outcome is not None or self.tablebase_result is not None
+
+
+class Game:
+    """Một ván cờ giữa người chơi và bot.
+
+    Lớp này giữ bàn cờ, màu của hai bên, ô đang được chọn và lịch sử nước đi.
+    Nó không biết gì về Pygame hay engine: giao diện gọi ``click_square`` khi
+    người chơi bấm vào một ô, và gọi ``push_move(move, by_engine=True)`` khi
+    engine trả về nước đi.
+
+    Args:
+        user_color (chess.Color or None): Màu của người chơi, None nếu chưa chọn.
+        skill_level (int or None): Skill Level của Stockfish, None nếu chưa chọn.
+
+    Attributes:
+        profile (difficulty.DifficultyProfile or None): Mức độ khó đã chọn.
+        clock (difficulty.GameClock or None): Đồng hồ thi đấu, None nếu ván không tính giờ.
+        tablebase (tablebase.Tablebase or None): Bảng tàn cuộc để kết thúc ván ngay khi
+            kết quả đã được định đoạt, None để chơi tới khi kết thúc theo luật.
+    """
+
+    def __init__(self, user_color=None, skill_level=None):
+        self.board = chess.Board()
+        self.user_color = user_color
+        self.skill_level = skill_level
+        self.difficulty = None
+        self.profile = None
+        self.clock = None
+        self.tablebase = None
+        self.selected_square = None
+        self.possible_moves = []
+        self.giveup = False
+        self.history = []
+        self._state = None
+        self._state_key = None
+
+    @property
+    def bot_color(self):
+        """chess.Color or None: Màu của bot (ngược với màu người chơi)."""
+        return None if self.user_color is None else not self.user_color
+
+    @property
+    def state(self):
+        """PositionState: Thông tin luật chơi của thế cờ hiện tại (chỉ tính lại khi bàn cờ thay đổi)."""
+        move_stack = self.board.move_stack
+        key = (id(self.board), len(move_stack), move_stack[-1] if move_stack else None)
+        if self._state is None or key != self._state_key:
+            self._state = PositionState(self.board, self.tablebase)
+            self._state_key = key
+        return self._state
+
+    def player_name(self, color):
+        """Trả về tên người chơi của một màu, dùng cho thẻ White/Black trong PGN.
+
+        Args:
+            color (chess.Color): Màu quân.
+
+        Returns:
+            str: "Stockfish" nếu là màu của bot, ngược lại "Player".
+        """
+        return "Stockfish" if color == self.bot_color else "Player"
+
+    def flagged(self):
+        """chess.Color or None: Màu của bên đã hết giờ, None nếu chưa ai hết giờ hoặc ván không tính giờ."""
+        return None if self.clock is None else self.clock.flagged()
+
+    def is_over(self):
+        """bool: True nếu ván cờ đã kết thúc (hết nước, hoà theo luật, theo bảng tàn cuộc, hết giờ hoặc bỏ cuộc)."""
+        return self.giveup or self.state.is_game_over or self.flagged() is not None
+
+    def engine_limit(self):
+        """Giới hạn tìm kiếm cho nước đi tiếp theo của bot theo mức độ khó và đồng hồ.
+
+        Returns:
+            chess.engine.Limit: Giới hạn tìm kiếm.
+        """
+        if self.clock is None:
+            return self.profile.limit()
+        return self.profile.limit(self.clock.remaining(self.bot_color), self.clock.time_control.increment)
+
+    def is_user_turn(self):
+        """bool: True nếu đến lượt người chơi và ván cờ chưa kết thúc."""
+        return self.user_color is not None and self.board.turn == self.user_color and not self.is_over()
+
+    def is_bot_turn(self):
+        """bool: True nếu đến lượt bot và ván cờ chưa kết thúc."""
+        return self.user_color is not None and self.board.turn == self.bot_color and not self.is_over()
+
+    def select(self, square):
+        """Chọn ô ``square`` nếu trên đó có quân của người chơi, ngược lại bỏ chọn.
+
+        Args:
+            square (chess.Square): Ô được bấm.
+        """
+        piece = self.board.piece_at(square)
+        if piece is not None and piece.color == self.user_color:
+            self.selected_square = square
+            self.possible_moves = self.state.moves_from.get(square, [])
+        else:
+            self.selected_square = None
+            self.possible_moves = []
+
+    def click_square(self, square):
+        """Xử lý việc người chơi bấm vào một ô trên bàn cờ.
+
+        Lần bấm đầu chọn quân, lần bấm sau đi quân nếu nước đi hợp lệ, hoặc
+        chuyển sang quân khác của người chơi.
+
+        Args:
+            square (chess.Square): Ô được bấm.
+
+        Returns:
+            chess.Move or None: Nước đi vừa thực hiện, None nếu chưa có nước đi nào.
+        """
+        if not self.is_user_turn():
+            return None
+        if self.selected_square is not None:
+            move = chess.Move(self.selected_square, square)
+            if move in self.possible_moves:
+                self.push_move(move)
+                return move
+        self.select(square)
+        return None
+
+    def push_move(self, move, by_engine=False):
+        """Thực hiện một nước đi và ghi vào lịch sử.
+
+        Args:
+            move (chess.Move): Nước đi hợp lệ.
+            by_engine (bool): True nếu nước đi do Stockfish chọn.
+
+        Returns:
+            str: Dòng lịch sử tương ứng với nước đi.
+        """
+        line = format_history_line(self.board.turn, move, by_engine)
+        self.board.push(move)
+        if self.clock is not None:
+            self.clock.press()
+            if self.state.is_game_over:
+                self.clock.stop()
+        self.selected_square = None
+        self.possible_moves = []
+        self.history.append(line)
+        return line
+
+    def give_up(self):
+        """Người chơi bỏ cuộc."""
+        self.giveup = True
+        if self.clock is not None:
+            self.clock.stop()
+        self.selected_square = None
+        self.possible_moves = []
+
+    def result(self):
+        """Trả về kết quả ván theo ký hiệu PGN.
+
+        Returns:
+            str: "1-0", "0-1", "1/2-1/2", hoặc "*" nếu ván cờ chưa kết thúc.
+        """
+        if self.giveup:
+            return "1-0" if self.bot_color == chess.WHITE else "0-1"
+        outcome = self.state.outcome
+        if outcome is None and self.state.tablebase_result is not None:
+            return self.state.tablebase_result
+        if outcome is None and self.flagged() is not None:
+            return "0-1" if self.flagged() == chess.WHITE else "1-0"
+        return outcome.result() if outcome is not None else "*"
+
+    def result_message(self):
+        """Trả về thông báo kết thúc ván.
+
+        Returns:
+            str: Thông báo kết thúc, chuỗi rỗng nếu ván cờ chưa kết thúc.
+        """
+        if self.giveup:
+            return "You gave up!"
+        if not self.state.is_game_over and self.flagged() is not None:
+            return f"Time out! Winner: {color_name(not self.flagged())}"
+        if self.state.outcome is None and self.state.tablebase_result is not None:
+            return tablebase_text(self.state.tablebase_result)
+        return game_over_text(self.board)
+
+
+class Phase:
+    """Các giai đoạn của một phiên chơi, tương ứng với các hộp thoại của giao diện."""
+    START = "start"
+    COLOR_CHOICE = "color_choice"
+    DIFFICULTY_CHOICE = "difficulty_choice"
+    PLAYING = "playing"
+    GIVE_UP_CONFIRM = "give_up_confirm"
+    GAME_OVER = "game_over"
+    REPLAY = "replay"
+
+
+class Session:
+    """Một phiên chơi: luồng từ màn hình bắt đầu tới khi ván cờ kết thúc.
+
+    Session giữ ván cờ hiện tại và giai đoạn của phiên (Phase). Các phương thức
+    chuyển giai đoạn tương ứng với các nút trên hộp thoại của giao diện.
+
+    Args:
+        time_control (difficulty.TimeControl or None): Thể thức thời gian của các
+            ván trong phiên, None nếu không tính giờ.
+        tablebase (tablebase.Tablebase or None): Bảng tàn cuộc để kết thúc các ván
+            của phiên sớm khi kết quả đã được định đoạt.
+    """
+
+    def __init__(self, time_control=None, tablebase=None):
+        self.time_control = time_control
+        self.tablebase = tablebase
+        self.reset()
+
+    def reset(self):
+        """Quay về màn hình bắt đầu với một ván cờ mới."""
+        self.phase = Phase.START
+        self.game = Game()
+        self.game_over_message = ""
+        self.replay = None
+        self._replay_return = None
+
+    @property
+    def game_started(self):
+        """bool: True khi người chơi đã chọn màu và độ khó."""
+        return self.game.skill_level is not None
+
+    def start(self):
+        """Người chơi bấm "Start": chuyển sang chọn màu."""
+        self.phase = Phase.COLOR_CHOICE
+
+    def choose_color(self, color):
+        """Người chơi chọn màu quân.
+
+        Args:
+            color (chess.Color): Màu của người chơi.
+        """
+        self.game.user_color = color
+        self.phase = Phase.DIFFICULTY_CHOICE
+
+    def choose_difficulty(self, name):
+        """Người chơi chọn độ khó, ván cờ bắt đầu (đồng hồ bắt đầu chạy nếu ván tính giờ).
+
+        Args:
+            name (str): Tên độ khó trong difficulty.PROFILES.
+
+        Returns:
+            difficulty.DifficultyProfile: Mức độ khó tương ứng.
+        """
+        game = self.game
+        game.profile = PROFILES[name]
+        game.skill_level = game.profile.skill_level
+        game.difficulty = name
+        game.tablebase = self.tablebase
+        if self.time_control is not None:
+            game.clock = GameClock(self.time_control)
+            game.clock.start(game.board.turn)
+        self.phase = Phase.PLAYING
+        return game.profile
+
+    def ask_give_up(self):
+        """Người chơi bấm vào ô bỏ cuộc: hỏi xác nhận."""
+        self.phase = Phase.GIVE_UP_CONFIRM
+
+    def cancel_give_up(self):
+        """Người chơi không bỏ cuộc nữa."""
+        self.phase = Phase.PLAYING
+
+    def give_up(self):
+        """Người chơi xác nhận bỏ cuộc, ván cờ kết thúc."""
+        self.game.give_up()
+        self.finish()
+
+    def finish(self):
+        """Kết thúc ván và lưu thông báo kết thúc."""
+        self.game_over_message = self.game.result_message()
+        self.phase = Phase.GAME_OVER
+
+    def start_replay(self, replay):
+        """Chuyển sang xem lại một ván cờ (ván vừa kết thúc hoặc ván đọc từ file lịch sử).
+
+        Args:
+            replay (replay.Replay): Ván cờ cần xem lại.
+        """
+        self.replay = replay
+        if self.phase != Phase.REPLAY:
+            self._replay_return = self.phase
+        self.phase = Phase.REPLAY
+
+    def end_replay(self):
+        """Thoát chế độ xem lại, quay về màn hình trước đó."""
+        self.replay = None
+        self.phase = self._replay_return or Phase.START
+        self._replay_return = None
+
+    def bot_should_move(self):
+        """bool: True nếu đang chơi và đến lượt bot."""
+        return self.phase == Phase.PLAYING and self.game.is_bot_turn()
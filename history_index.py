@@ -0,0 +1,538 @@
+"""Chỉ mục tra cứu thế cờ trên toàn bộ lịch sử ván đấu.
+
+Module này đọc mọi file lịch sử (PGN của GameRecorder và định dạng văn bản cũ
+``White (Stockfish): e2e4``), đi lại từng ván bằng python-chess và xây một chỉ mục
+ngược trong SQLite: mã Zobrist của thế cờ -> (ván, nửa nước). Nhờ đó các câu hỏi
+như "những ván nào đã đi qua thế cờ này" hay "độ khó Hard thua bao nhiêu ván trong
+phòng thủ Sicilian" được trả lời bằng một truy vấn chỉ mục thay vì đọc lại mọi file.
+
+Chỉ mục được cập nhật tăng dần: chỉ những file mới hoặc đã thay đổi (theo thời
+gian sửa và kích thước) mới được đọc lại.
+
+Ví dụ::
+
+    python history_index.py update history docs/history
+    python history_index.py stats --moves "e2e4 c7c5"
+    python history_index.py find --moves "d2d4 g8f6"
+    python history_index.py openings --difficulty Hard
+"""
+import argparse
+import contextlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+INDEX_PATH = os.path.join("cache", "history_index.sqlite3")
+HISTORY_FOLDERS = ["history", os.path.join("docs", "history")]
+
+# So nua nuoc dau tien dung lam khoa khai cuoc (vi du "e4 c5 Nf3 d6 d4 cxd4")
+OPENING_PLIES = 6
+
+# Dong nuoc di cua dinh dang lich su cu, ca ban tieng Anh va tieng Viet khong dau
+_LEGACY_MOVE = re.compile(r"^(White|Black|Trang|Den)( \(Stockfish\))?: ([a-h][1-8][a-h][1-8][qrbn]?)$")
+_LEGACY_GAVE_UP = ("You gave up!", "Ban da bo cuoc!")
+
+_HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+
+class GameRecord:
+    """Một ván cờ đọc từ file lịch sử.
+
+    Attributes:
+        path (str): File chứa ván cờ.
+        number (int): Số thứ tự của ván trong file (bắt đầu từ 0).
+        headers (dict): Các thẻ PGN (với file cũ chỉ có White/Black).
+        moves (list): Các nước đi hợp lệ của ván (file cũ có thể chứa nước sai, phần
+            sau nước sai bị bỏ qua).
+        result (str): Kết quả theo ký hiệu PGN.
+    """
+
+    def __init__(self, path, number, headers, moves, result):
+        self.path = path
+        self.number = number
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    @property
+    def user_color(self):
+        """chess.Color or None: Màu của người chơi, None nếu cả hai bên đều là engine."""
+        if self.headers.get("White") == "Player":
+            return chess.WHITE
+        if self.headers.get("Black") == "Player":
+            return chess.BLACK
+        return None
+
+    @property
+    def bot_result(self):
+        """str or None: Kết quả của bot ("win", "loss", "draw"), None nếu chưa kết thúc hoặc không có người chơi."""
+        if self.user_color is None or self.result not in ("1-0", "0-1", "1/2-1/2"):
+            return None
+        if self.result == "1/2-1/2":
+            return "draw"
+        bot_won = (self.result == "1-0") == (self.user_color == chess.BLACK)
+        return "win" if bot_won else "loss"
+
+
+def read_legacy_history(path):
+    """Đọc một file lịch sử định dạng văn bản cũ (mỗi dòng một nước đi).
+
+    Args:
+        path (str): Đường dẫn file ``.txt``.
+
+    Returns:
+        GameRecord or None: Ván cờ trong file, None nếu file không có nước đi nào.
+    """
+    board = chess.Board()
+    players = {}
+    gave_up = False
+    valid = True
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            match = _LEGACY_MOVE.match(line)
+            if match is None:
+                gave_up = gave_up or line.startswith(_LEGACY_GAVE_UP)
+                continue
+            color = chess.WHITE if match.group(1) in ("White", "Trang") else chess.BLACK
+            players[color] = "Stockfish" if match.group(2) else "Player"
+            move = chess.Move.from_uci(match.group(3))
+            # Mot so file cu ghi lap hoac ghi sai nuoc di: chi giu phan hop le
+            if valid and board.turn == color and board.is_legal(move):
+                board.push(move)
+            else:
+                valid = False
+    if not board.move_stack:
+        return None
+    headers = {"White": players.get(chess.WHITE, "?"), "Black": players.get(chess.BLACK, "?")}
+    record = GameRecord(path, 0, headers, list(board.move_stack), board.result())
+    if gave_up and record.user_color is not None:
+        record.result = "0-1" if record.user_color == chess.WHITE else "1-0"
+    return record
+
+
+class _MovesVisitor(chess.pgn.BaseVisitor):
+    """Chỉ lấy các thẻ và nước đi chính của ván, không dựng cây GameNode."""
+
+    def begin_game(self):
+        self.headers = {}
+        self.moves = []
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        self.moves.append(move)
+
+    def result(self):
+        return self.headers, self.moves
+
+
+def read_pgn_history(path):
+    """Đọc lần lượt các ván trong một file PGN.
+
+    Args:
+        path (str): Đường dẫn file ``.pgn``.
+
+    Yields:
+        GameRecord: Từng ván trong file.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        number = 0
+        while True:
+            game = chess.pgn.read_game(f, Visitor=_MovesVisitor)
+            if game is None:
+                return
+            headers, moves = game
+            yield GameRecord(path, number, headers, moves, headers.get("Result", "*"))
+            number += 1
+
+
+def read_games(path):
+    """Đọc các ván trong một file lịch sử, tự nhận dạng định dạng theo phần mở rộng.
+
+    Args:
+        path (str): File ``.pgn`` hoặc ``.txt``.
+
+    Returns:
+        list: Danh sách GameRecord.
+    """
+    if path.endswith(".pgn"):
+        return list(read_pgn_history(path))
+    record = read_legacy_history(path)
+    return [record] if record is not None else []
+
+
+def iter_history_files(folders):
+    """Liệt kê các file lịch sử (``.pgn``, ``.txt``) trong các thư mục, kể cả thư mục con.
+
+    Args:
+        folders (list): Danh sách thư mục lịch sử.
+
+    Yields:
+        os.DirEntry: Từng file lịch sử.
+    """
+    pending = [folder for folder in folders if os.path.isdir(folder)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.endswith((".pgn", ".txt")):
+                    yield entry
+
+
+def position_key(board):
+    """Mã Zobrist của thế cờ dưới dạng số nguyên có dấu 64 bit (kiểu INTEGER của SQLite).
+
+    Args:
+        board (chess.Board): Thế cờ.
+
+    Returns:
+        int: Khoá thế cờ trong chỉ mục.
+    """
+    return _signed(chess.polyglot.zobrist_hash(board))
+
+
+def _signed(key):
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _piece_key(bitboards, square):
+    # Phan tu cua bang Polyglot ung voi quan tai o square (0 neu o trong)
+    mask = chess.BB_SQUARES[square]
+    for index, pieces in enumerate(bitboards[:6]):
+        if pieces & mask:
+            return _HASHER.array[64 * (index * 2 + bool(bitboards[6] & mask)) + square]
+    return 0
+
+
+def _bitboards(board):
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK])
+
+
+def iter_position_keys(moves):
+    """Tính khoá của mọi thế cờ trong một ván, từ thế ban đầu tới sau nước cuối.
+
+    Phần mã Zobrist của các quân được cập nhật tăng dần theo các ô thay đổi sau mỗi
+    nước đi thay vì tính lại cả 64 ô, nên nhanh hơn nhiều so với gọi
+    ``position_key`` cho từng thế cờ; kết quả giống hệt nhau.
+
+    Args:
+        moves (list): Các nước đi hợp lệ từ thế cờ ban đầu.
+
+    Yields:
+        tuple: ``(board, key)`` với board là bàn cờ dùng chung (bị thay đổi sau mỗi bước).
+    """
+    board = chess.Board()
+    pieces_hash = _HASHER.hash_board(board)
+    yield board, _signed(pieces_hash ^ _HASHER.hash_castling(board) ^ _HASHER.hash_ep_square(board) ^ _HASHER.hash_turn(board))
+    for move in moves:
+        before = _bitboards(board)
+        board.push(move)
+        after = _bitboards(board)
+        changed = (chess.BB_SQUARES[move.from_square] | chess.BB_SQUARES[move.to_square]
+                   | (before[6] ^ after[6]) | (before[7] ^ after[7]))
+        for square in chess.scan_forward(changed):
+            pieces_hash ^= _piece_key(before, square) ^ _piece_key(after, square)
+        yield board, _signed(pieces_hash ^ _HASHER.hash_castling(board) ^ _HASHER.hash_ep_square(board) ^ _HASHER.hash_turn(board))
+
+
+def board_from_moves(moves):
+    """Tạo bàn cờ từ chuỗi nước đi UCI cách nhau bởi dấu cách (ví dụ ``"e2e4 c7c5"``).
+
+    Args:
+        moves (str): Các nước đi từ thế cờ ban đầu.
+
+    Returns:
+        chess.Board: Thế cờ sau các nước đi.
+
+    Raises:
+        ValueError: Nếu có nước đi không hợp lệ.
+    """
+    board = chess.Board()
+    for uci in moves.split():
+        board.push_uci(uci)
+    return board
+
+
+class HistoryIndex:
+    """Chỉ mục SQLite: thế cờ -> (ván, nửa nước), kèm thông tin và khai cuộc của từng ván.
+
+    Args:
+        path (str): Đường dẫn file SQLite của chỉ mục.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY, path TEXT NOT NULL, number INTEGER NOT NULL,
+                white TEXT, black TEXT, difficulty TEXT, skill_level INTEGER, date TEXT,
+                result TEXT NOT NULL, bot_result TEXT, plies INTEGER NOT NULL, opening TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS games_path ON games (path);
+            CREATE INDEX IF NOT EXISTS games_opening ON games (opening);
+            CREATE TABLE IF NOT EXISTS positions (
+                hash INTEGER NOT NULL, game_id INTEGER NOT NULL, ply INTEGER NOT NULL,
+                PRIMARY KEY (hash, game_id, ply)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS positions_game ON positions (game_id);
+        """)
+
+    def update(self, folders=HISTORY_FOLDERS, workers=1):
+        """Cập nhật chỉ mục với các file mới, đã thay đổi hoặc đã bị xoá.
+
+        Args:
+            folders (list): Các thư mục lịch sử cần quét.
+            workers (int): Số tiến trình đọc file song song (1: đọc trong tiến trình hiện tại).
+
+        Returns:
+            tuple: ``(files_indexed, files_removed)``.
+        """
+        known = {path: (mtime, size) for path, mtime, size in self._db.execute("SELECT path, mtime, size FROM files")}
+        seen = set()
+        changed = []
+        for entry in iter_history_files(folders):
+            path = os.path.normpath(entry.path)
+            seen.add(path)
+            stat = entry.stat()
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append((path, stat))
+        # Chi xoa file da mat trong cac thu muc vua quet
+        roots = tuple(os.path.normpath(folder) + os.sep for folder in folders)
+        removed = [path for path in known if path not in seen and path.startswith(roots)]
+
+        paths = [path for path, _ in changed]
+        with contextlib.ExitStack() as stack:
+            if workers > 1 and len(paths) > 1:
+                pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                all_rows = pool.map(read_index_rows, paths, chunksize=16)
+            else:
+                all_rows = map(read_index_rows, paths)
+            with self._db:
+                for (path, stat), rows in zip(changed, all_rows):
+                    self._index_file(path, stat, rows)
+                for path in removed:
+                    self._remove_file(path)
+        return len(changed), len(removed)
+
+    def add_file(self, path):
+        """Đưa (hoặc đưa lại) một file lịch sử vào chỉ mục, ví dụ ngay sau khi ván được lưu.
+
+        Args:
+            path (str): File lịch sử.
+        """
+        path = os.path.normpath(path)
+        with self._db:
+            self._index_file(path, os.stat(path))
+
+    def find_games(self, board, limit=20):
+        """Tìm các ván đã đi qua một thế cờ.
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm.
+            limit (int): Số ván tối đa trả về.
+
+        Returns:
+            list: Các tuple ``(path, number, ply, white, black, difficulty, result)``,
+            ván mới nhất trước.
+        """
+        return self._db.execute(
+            "SELECT g.path, g.number, MIN(p.ply), g.white, g.black, g.difficulty, g.result "
+            "FROM positions p JOIN games g ON g.id = p.game_id WHERE p.hash = ? "
+            "GROUP BY g.id ORDER BY g.date DESC, g.id DESC LIMIT ?", (position_key(board), limit)).fetchall()
+
+    def position_stats(self, board):
+        """Thống kê kết quả của bot theo độ khó trong các ván đã đi qua một thế cờ.
+
+        Args:
+            board (chess.Board): Thế cờ cần thống kê.
+
+        Returns:
+            dict: Độ khó (None với ván không rõ độ khó) -> dict ``{"games", "win", "loss", "draw"}``.
+        """
+        rows = self._db.execute(
+            "SELECT g.difficulty, g.bot_result, COUNT(*) FROM games g "
+            "WHERE g.id IN (SELECT game_id FROM positions WHERE hash = ?) "
+            "GROUP BY g.difficulty, g.bot_result", (position_key(board),))
+        stats = {}
+        for difficulty, bot_result, count in rows:
+            entry = stats.setdefault(difficulty, {"games": 0, "win": 0, "loss": 0, "draw": 0})
+            entry["games"] += count
+            if bot_result is not None:
+                entry[bot_result] += count
+        return stats
+
+    def opening_stats(self, prefix="", difficulty=None, limit=20):
+        """Thống kê theo khai cuộc (OPENING_PLIES nửa nước đầu, ký hiệu SAN).
+
+        Args:
+            prefix (str): Chỉ lấy các khai cuộc bắt đầu bằng các nước này (ví dụ ``"e4 c5"``).
+            difficulty (str or None): Chỉ lấy các ván ở độ khó này.
+            limit (int): Số khai cuộc tối đa trả về.
+
+        Returns:
+            list: Các tuple ``(opening, games, bot_wins, bot_losses, draws)``, nhiều ván nhất trước.
+        """
+        query = ("SELECT opening, COUNT(*), SUM(bot_result = 'win'), SUM(bot_result = 'loss'), "
+                 "SUM(result = '1/2-1/2') FROM games WHERE 1")
+        params = []
+        if prefix:
+            query += " AND (opening = ? OR opening LIKE ?)"
+            params += [prefix, prefix.replace("%", "").replace("_", "") + " %"]
+        if difficulty is not None:
+            query += " AND difficulty = ?"
+            params.append(difficulty)
+        query += " GROUP BY opening ORDER BY COUNT(*) DESC LIMIT ?"
+        params.append(limit)
+        return self._db.execute(query, params).fetchall()
+
+    def game_count(self):
+        """int: Số ván trong chỉ mục."""
+        return self._db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self):
+        """Đóng file SQLite."""
+        self._db.close()
+
+    def _remove_file(self, path):
+        game_ids = [(row[0],) for row in self._db.execute("SELECT id FROM games WHERE path = ?", (path,))]
+        self._db.executemany("DELETE FROM positions WHERE game_id = ?", game_ids)
+        self._db.execute("DELETE FROM games WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _index_file(self, path, stat, rows=None):
+        self._remove_file(path)
+        if rows is None:
+            rows = read_index_rows(path)
+        for game, keys in rows:
+            cursor = self._db.execute(
+                "INSERT INTO games (path, number, white, black, difficulty, skill_level, date, result, bot_result, plies, opening) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", game)
+            game_id = cursor.lastrowid
+            self._db.executemany("INSERT OR IGNORE INTO positions (hash, game_id, ply) VALUES (?, ?, ?)",
+                                 ((key, game_id, ply) for ply, key in enumerate(keys)))
+        self._db.execute("INSERT INTO files (path, mtime, size) VALUES (?, ?, ?)", (path, stat.st_mtime, stat.st_size))
+
+
+def read_index_rows(path):
+    """Đọc một file lịch sử và tính dữ liệu chỉ mục của các ván trong file.
+
+    Hàm không dùng SQLite nên có thể chạy trong tiến trình con khi cập nhật song song.
+
+    Args:
+        path (str): File lịch sử.
+
+    Returns:
+        list: Các tuple ``(game, keys)``: game là giá trị các cột của bảng games,
+        keys là khoá của từng thế cờ theo nửa nước.
+    """
+    try:
+        records = read_games(path)
+    except (OSError, ValueError) as e:
+        print(f"Loi khi doc {path}: {e}")
+        return []
+    rows = []
+    for record in records:
+        opening = []
+        keys = []
+        for ply, (board, key) in enumerate(iter_position_keys(record.moves)):
+            keys.append(key)
+            if ply < min(OPENING_PLIES, len(record.moves)):
+                opening.append(board.san(record.moves[ply]))
+        headers = record.headers
+        skill_level = headers.get("SkillLevel")
+        game = (record.path, record.number, headers.get("White"), headers.get("Black"), headers.get("Difficulty"),
+                int(skill_level) if skill_level and skill_level.isdigit() else None, headers.get("Date"),
+                record.result, record.bot_result, len(record.moves), " ".join(opening))
+        rows.append((game, keys))
+    return rows
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của công cụ chỉ mục.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Search the game history by position")
+    parser.add_argument("--index", default=INDEX_PATH, help="file SQLite cua chi muc")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update = commands.add_parser("update", help="cap nhat chi muc voi cac file lich su moi")
+    update.add_argument("folders", nargs="*", default=HISTORY_FOLDERS, help="cac thu muc lich su")
+    update.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="so tien trinh doc file song song")
+
+    for name, help_text in (("find", "liet ke cac van da di qua the co"), ("stats", "ket qua cua bot theo do kho tai the co")):
+        command = commands.add_parser(name, help=help_text)
+        position = command.add_mutually_exclusive_group(required=True)
+        position.add_argument("--moves", help='cac nuoc di UCI tu the co ban dau, vi du "e2e4 c7c5"')
+        position.add_argument("--fen", help="the co dang FEN")
+        command.add_argument("--limit", type=int, default=20, help="so van toi da")
+
+    openings = commands.add_parser("openings", help="thong ke theo khai cuoc")
+    openings.add_argument("--prefix", default="", help='cac nuoc SAN dau tien, vi du "e4 c5"')
+    openings.add_argument("--difficulty", default=None, help="chi lay cac van o do kho nay")
+    openings.add_argument("--limit", type=int, default=20, help="so khai cuoc toi da")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy công cụ chỉ mục từ dòng lệnh.
+
+    Returns:
+        int: Mã thoát, 1 nếu thế cờ (FEN hoặc nước đi) không hợp lệ.
+    """
+    args = parse_args(argv)
+    board = None
+    if args.command in ("find", "stats"):
+        try:
+            board = chess.Board(args.fen) if args.fen else board_from_moves(args.moves)
+        except ValueError as e:
+            print(f"The co khong hop le: {e}")
+            return 1
+    index = HistoryIndex(args.index)
+    started = time.perf_counter()
+    try:
+        if args.command == "update":
+            indexed, removed = index.update(args.folders, args.workers)
+            print(f"Indexed {indexed} files, removed {removed}; {index.game_count()} games in index")
+        elif args.command in ("find", "stats"):
+            if args.command == "find":
+                for path, number, ply, white, black, difficulty, result in index.find_games(board, args.limit):
+                    print(f"{path}#{number} ply {ply}: {white} - {black} {result} ({difficulty or '?'})")
+            else:
+                for difficulty, entry in sorted(index.position_stats(board).items(), key=lambda item: str(item[0])):
+                    print(f"{difficulty or '?'}: {entry['games']} games, bot +{entry['win']} "
+                          f"={entry['draw']} -{entry['loss']}")
+        else:
+            for opening, games, wins, losses, draws in index.opening_stats(args.prefix, args.difficulty, args.limit):
+                print(f"{opening or '(no moves)'}: {games} games, bot +{wins or 0} ={draws or 0} -{losses or 0}")
+    finally:
+        index.close()
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
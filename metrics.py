@@ -0,0 +1,343 @@
+"""Số liệu vận hành của trò chơi: thời gian vẽ, engine, ghi lịch sử, độ trễ sự kiện.
+
+Metrics là một bộ đếm dùng chung giữa các luồng (vòng lặp giao diện, luồng engine,
+luồng ghi lịch sử). Ba loại số liệu được hỗ trợ, cùng ý nghĩa với Prometheus:
+
+- counter (``inc``): giá trị chỉ tăng, ví dụ số lần tìm nước đi;
+- gauge (``set``): giá trị gần nhất, ví dụ số node mỗi giây của lần tìm kiếm cuối;
+- histogram (``observe``): phân bố giá trị theo các ngưỡng (bucket), ví dụ thời gian
+  vẽ một khung hình. Histogram giữ thêm các giá trị gần nhất để tính trung vị và
+  phân vị 95 cho lớp hiển thị số liệu trên màn hình.
+
+MetricsExporter ghi số liệu định kỳ trên một luồng nền vào hai nơi: một file JSONL
+(mỗi dòng một ảnh chụp, tự xoay vòng khi file quá lớn) và một file văn bản theo định
+dạng của Prometheus (dùng với textfile collector của node_exporter). Nhờ đó có thể
+tìm ra các lần giật, chậm trên máy người chơi mà không cần chạy profiler.
+"""
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+from recorder import write_file
+
+# Nguong bucket (giay) cho thoi gian ve mot khung hinh va do tre su kien
+FRAME_BUCKETS = (0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.05, 0.1, 0.25, 1.0)
+# Nguong bucket (giay) cho thoi gian tim nuoc di
+SEARCH_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+# Nguong bucket (giay) cho thao tac o dia
+IO_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+DEPTH_BUCKETS = (1, 2, 4, 6, 8, 10, 12, 16, 20, 25, 30, 40)
+
+# Bucket cua tung histogram, cac histogram khac dung FRAME_BUCKETS
+BUCKETS = {
+    "frame_seconds": FRAME_BUCKETS,
+    "event_lag_seconds": FRAME_BUCKETS,
+    "engine_search_seconds": SEARCH_BUCKETS,
+    "engine_depth": DEPTH_BUCKETS,
+    "history_write_seconds": IO_BUCKETS,
+    "analysis_first_update_seconds": SEARCH_BUCKETS,
+}
+
+HELP = {
+    "frame_seconds": "Time to draw one frame",
+    "event_lag_seconds": "Delay between posting an event and handling it in the main loop",
+    "engine_search_seconds": "Engine search latency, excluding the minimum bot move delay",
+    "engine_depth": "Search depth reported by the engine",
+    "engine_nodes_total": "Nodes searched by the engine",
+    "engine_nps": "Nodes per second of the last engine search",
+    "engine_searches_total": "Move requests answered, by source",
+    "engine_errors_total": "Engine errors reported to the main loop",
+    "history_write_seconds": "Time to write a PGN history file",
+    "analysis_first_update_seconds": "Time from starting an analysis to its first streamed update",
+    "engine_startup_seconds": "Time to spawn, configure and warm up the engine",
+    "startup_seconds": "Time from launch to a startup milestone (first frame, engine ready, first bot move)",
+}
+
+
+class Histogram:
+    """Phân bố của một số liệu theo các ngưỡng bucket.
+
+    Args:
+        buckets (tuple): Các ngưỡng tăng dần (giá trị lớn hơn ngưỡng cuối được tính vào ``+Inf``).
+        window (int): Số giá trị gần nhất được giữ để tính phân vị.
+
+    Attributes:
+        counts (list): Số giá trị rơi vào từng bucket (không cộng dồn), phần tử cuối là ``+Inf``.
+        count (int): Tổng số giá trị.
+        sum (float): Tổng các giá trị.
+        last (float or None): Giá trị gần nhất.
+    """
+
+    def __init__(self, buckets, window=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.last = None
+        self._recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        """Ghi nhận một giá trị."""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+        self._recent.append(value)
+
+    def quantile(self, q):
+        """Phân vị của các giá trị gần nhất.
+
+        Args:
+            q (float): Phân vị cần tính (0.5 là trung vị).
+
+        Returns:
+            float or None: Giá trị phân vị, None nếu chưa có giá trị nào.
+        """
+        if not self._recent:
+            return None
+        values = sorted(self._recent)
+        return values[max(0, math.ceil(q * len(values)) - 1)]
+
+    def to_dict(self):
+        """dict: Ảnh chụp của histogram (dùng khi xuất JSONL)."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "last": self.last,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": max(self._recent) if self._recent else None,
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    text = ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in pairs)
+    return "{" + text + "}"
+
+
+class Metrics:
+    """Bộ số liệu dùng chung giữa các luồng.
+
+    Mỗi số liệu được xác định bởi tên và các nhãn (ví dụ ``source="cache"``).
+
+    Args:
+        prefix (str): Tiền tố tên số liệu khi xuất theo định dạng Prometheus.
+    """
+
+    def __init__(self, prefix="chessgame"):
+        self.prefix = prefix
+        self.started_at = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Tăng một counter.
+
+        Args:
+            name (str): Tên số liệu.
+            value (float): Giá trị cộng thêm.
+            **labels: Các nhãn của số liệu.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Đặt giá trị của một gauge."""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        """Ghi nhận một giá trị vào histogram ``name`` (bucket lấy từ BUCKETS)."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(BUCKETS.get(name, FRAME_BUCKETS))
+            histogram.observe(value)
+
+    def record_search(self, source, elapsed, info):
+        """Ghi nhận một lần trả lời yêu cầu tìm nước đi.
+
+        Độ sâu, số node và số node mỗi giây được lấy từ ``info`` mà engine trả về;
+        nước đi từ sách khai cuộc hoặc bộ đệm chỉ được tính thời gian.
+
+        Args:
+            source (str): Nguồn của nước đi: ``"engine"``, ``"ponderhit"``, ``"cache"``, ``"book"``
+                hoặc ``"tablebase"``.
+            elapsed (float): Thời gian trả lời (giây).
+            info (dict): Thông tin phân tích của engine.
+        """
+        self.inc("engine_searches_total", source=source)
+        self.observe("engine_search_seconds", elapsed, source=source)
+        if source not in ("engine", "ponderhit"):
+            return
+        if info.get("depth") is not None:
+            self.observe("engine_depth", info["depth"])
+        nodes = info.get("nodes")
+        if nodes is not None:
+            self.inc("engine_nodes_total", nodes)
+        nps = info.get("nps")
+        if nps is None and nodes is not None and info.get("time"):
+            nps = nodes / info["time"]
+        if nps is not None:
+            self.set("engine_nps", nps)
+
+    def summary(self, name, **labels):
+        """Thống kê của một histogram, tính trong lúc giữ khoá (an toàn khi luồng khác đang ghi).
+
+        Returns:
+            dict or None: Như ``Histogram.to_dict``, None nếu chưa có giá trị nào.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.to_dict() if histogram is not None else None
+
+    def counter(self, name, **labels):
+        """float: Giá trị của một counter (0 nếu chưa có)."""
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def gauge(self, name, **labels):
+        """float or None: Giá trị của một gauge."""
+        with self._lock:
+            return self._gauges.get((name, _label_key(labels)))
+
+    def snapshot(self):
+        """Ảnh chụp tất cả số liệu.
+
+        Returns:
+            dict: ``time``, ``uptime``, ``counters``, ``gauges`` và ``histograms``; khoá của
+            mỗi số liệu có dạng ``ten{nhan="gia tri"}``.
+        """
+        with self._lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started_at,
+                "counters": {name + _format_labels(key): value for (name, key), value in self._counters.items()},
+                "gauges": {name + _format_labels(key): value for (name, key), value in self._gauges.items()},
+                "histograms": {name + _format_labels(key): histogram.to_dict()
+                               for (name, key), histogram in self._histograms.items()},
+            }
+
+    def prometheus_text(self):
+        """Nội dung các số liệu theo định dạng văn bản của Prometheus.
+
+        Returns:
+            str: Nội dung file textfile.
+        """
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                metric = f"{self.prefix}_{name}"
+                if name in HELP:
+                    lines.append(f"# HELP {metric} {HELP[name]}")
+                lines.append(f"# TYPE {metric} {kind}")
+
+        with self._lock:
+            for (name, key), value in sorted(self._counters.items()):
+                declare(name, "counter")
+                lines.append(f"{self.prefix}_{name}{_format_labels(key)} {value:g}")
+            for (name, key), value in sorted(self._gauges.items()):
+                declare(name, "gauge")
+                lines.append(f"{self.prefix}_{name}{_format_labels(key)} {value:g}")
+            for (name, key), histogram in sorted(self._histograms.items()):
+                declare(name, "histogram")
+                metric = f"{self.prefix}_{name}"
+                cumulative = 0
+                for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum:g}")
+                lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Ghi số liệu định kỳ ra file JSONL (xoay vòng) và file Prometheus trên một luồng nền.
+
+    Args:
+        metrics (Metrics): Bộ số liệu cần xuất.
+        jsonl_path (str or None): File JSONL, None để không ghi.
+        prometheus_path (str or None): File văn bản Prometheus, None để không ghi.
+        interval (float): Chu kỳ ghi (giây).
+        max_bytes (int): Kích thước tối đa của file JSONL trước khi xoay vòng.
+        backups (int): Số file JSONL cũ được giữ lại (``.1``, ``.2``...).
+    """
+
+    def __init__(self, metrics, jsonl_path=None, prometheus_path=None, interval=10.0,
+                 max_bytes=1024 * 1024, backups=3):
+        self.metrics = metrics
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        """Bắt đầu luồng ghi nền."""
+        self._thread.start()
+
+    def export(self):
+        """Ghi số liệu hiện tại ra các file (gọi được từ bất kỳ luồng nào)."""
+        try:
+            if self.jsonl_path:
+                self._append_jsonl(json.dumps(self.metrics.snapshot()))
+            if self.prometheus_path:
+                os.makedirs(os.path.dirname(self.prometheus_path) or ".", exist_ok=True)
+                # Ghi qua file tam: textfile collector khong bao gio doc file ghi do
+                write_file(self.prometheus_path, self.metrics.prometheus_text())
+        except OSError as e:
+            print(f"Loi khi ghi so lieu: {e}")
+
+    def close(self):
+        """Dừng luồng nền và ghi số liệu lần cuối."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.export()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def _append_jsonl(self, line):
+        os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+        if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _rotate(self):
+        # metrics.jsonl -> metrics.jsonl.1 -> metrics.jsonl.2 ..., file cu nhat bi xoa
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.jsonl_path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.jsonl_path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+        else:
+            os.remove(self.jsonl_path)
@@ -0,0 +1,101 @@
+"""Sách khai cuộc Polyglot (``.bin``) cho bot.
+
+Trong giai đoạn khai cuộc, bot chọn nước đi từ sách khai cuộc thay vì hỏi engine.
+Mỗi độ khó có một cấu hình riêng (BookProfile): độ sâu tối đa dùng sách và cách
+chọn nước trong sách. Độ khó thấp chọn ngẫu nhiên trong nhiều nước (kể cả nước ít
+được chơi), độ khó cao chỉ chơi những nước có trọng số cao nhất. Khi thế cờ ra
+khỏi sách hoặc vượt quá độ sâu cho phép, engine được dùng như bình thường.
+"""
+import random
+
+import chess
+import chess.polyglot
+
+
+class BookProfile:
+    """Cấu hình dùng sách khai cuộc cho một độ khó.
+
+    Args:
+        max_ply (int): Số nửa nước tối đa (tính từ đầu ván) còn dùng sách.
+        min_weight_ratio (float): Chỉ chọn các nước có trọng số tối thiểu bằng
+            tỉ lệ này so với nước có trọng số cao nhất (0.0: mọi nước trong sách,
+            1.0: chỉ nước tốt nhất).
+        weighted (bool): True để chọn ngẫu nhiên theo trọng số, False để chọn
+            đều giữa các nước còn lại.
+    """
+
+    def __init__(self, max_ply, min_weight_ratio=0.0, weighted=True):
+        self.max_ply = max_ply
+        self.min_weight_ratio = min_weight_ratio
+        self.weighted = weighted
+
+
+# Cau hinh sach khai cuoc theo muc do kho (cung ten voi difficulty.PROFILES)
+BOOK_PROFILES = {
+    "Beginner": BookProfile(max_ply=6, min_weight_ratio=0.0, weighted=False),
+    "Easy": BookProfile(max_ply=8, min_weight_ratio=0.0, weighted=False),
+    "Medium": BookProfile(max_ply=12, min_weight_ratio=0.1),
+    "Hard": BookProfile(max_ply=20, min_weight_ratio=0.5),
+    "Master": BookProfile(max_ply=24, min_weight_ratio=0.8),
+}
+
+
+class OpeningBook:
+    """Đọc một sách khai cuộc Polyglot và chọn nước đi theo cấu hình độ khó.
+
+    Args:
+        path (str): Đường dẫn file sách ``.bin``.
+        profile (BookProfile or None): Cấu hình đang dùng, None để tắt sách.
+        rng (random.Random or None): Bộ sinh số ngẫu nhiên (để tái lập kết quả khi thử nghiệm).
+
+    Attributes:
+        moves_played (int): Số nước đi đã chọn từ sách kể từ lần gọi ``reset_stats`` gần nhất.
+
+    Raises:
+        OSError: Nếu không mở được file sách.
+    """
+
+    def __init__(self, path, profile=None, rng=None):
+        self.path = path
+        self.profile = profile
+        self.moves_played = 0
+        self._rng = rng or random.Random()
+        self._reader = chess.polyglot.open_reader(path)
+
+    def choose(self, board):
+        """Chọn nước đi từ sách cho thế cờ hiện tại.
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm nước đi.
+
+        Returns:
+            chess.Move or None: Nước đi trong sách, None nếu sách đang tắt, thế cờ
+            không có trong sách hoặc đã vượt quá độ sâu của cấu hình.
+        """
+        profile = self.profile
+        if profile is None or board.ply() >= profile.max_ply:
+            return None
+        entries = list(self._reader.find_all(board))
+        if not entries:
+            return None
+        best_weight = max(entry.weight for entry in entries)
+        entries = [entry for entry in entries if entry.weight >= best_weight * profile.min_weight_ratio]
+        if profile.weighted and best_weight > 0:
+            entry = self._rng.choices(entries, weights=[entry.weight for entry in entries])[0]
+        else:
+            entry = self._rng.choice(entries)
+        self.moves_played += 1
+        return entry.move
+
+    def reset_stats(self):
+        """Bắt đầu đếm lại số nước đi từ sách.
+
+        Returns:
+            int: Số nước đi từ sách trước khi đặt lại.
+        """
+        played, self.moves_played = self.moves_played, 0
+        return played
+
+    def close(self):
+        """Đóng file sách."""
+        self._reader.close()
@@ -0,0 +1,199 @@
+"""Ghi lịch sử ván cờ dưới dạng PGN trên một luồng nền.
+
+GameRecorder giữ các nước đi của ván hiện tại trong bộ nhớ; việc tạo nội dung PGN
+và ghi file được giao cho một luồng ghi nền, nên vòng lặp giao diện không bao giờ
+chờ ổ đĩa. File chỉ được tạo khi ván cờ đã có ít nhất một nước đi (ván bị bỏ
+trước nước đầu tiên không để lại file rỗng), được ghi lại định kỳ trong khi chơi
+và được ghi lần cuối kèm ``fsync`` khi ván kết thúc. Mỗi lần ghi dùng file tạm rồi
+``os.replace`` nên file trong thư mục lịch sử luôn là một PGN hoàn chỉnh, đọc được
+bằng các công cụ cờ vua thông thường. Tên file chứa thời điểm bắt đầu ván tới micro
+giây (kèm số thứ tự nếu trùng) để hai ván bắt đầu cùng một giây không ghi đè lên nhau.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import chess
+import chess.pgn
+
+
+def build_pgn(headers, moves, result="*", comment=""):
+    """Tạo nội dung PGN của một ván cờ.
+
+    Args:
+        headers (dict): Các thẻ PGN (Event, Site, Date, White, Black...).
+        moves (list): Danh sách chess.Move theo thứ tự đã đi.
+        result (str): Kết quả ván ("1-0", "0-1", "1/2-1/2" hoặc "*" nếu chưa kết thúc).
+        comment (str): Chú thích đặt sau nước cuối (ví dụ thông báo kết thúc ván).
+
+    Returns:
+        str: Nội dung PGN, kết thúc bằng một dòng trống.
+    """
+    game = chess.pgn.Game()
+    for name, value in headers.items():
+        game.headers[name] = str(value)
+    game.headers["Result"] = result
+    node = game
+    for move in moves:
+        node = node.add_variation(move)
+    if comment:
+        node.comment = comment
+    return f"{game}\n\n"
+
+
+def write_file(path, text, sync=False):
+    """Ghi nội dung vào file thông qua file tạm để file đích luôn hoàn chỉnh.
+
+    Args:
+        path (str): Đường dẫn file đích.
+        text (str): Nội dung cần ghi.
+        sync (bool): True để gọi ``fsync`` trước khi thay file (dùng khi kết thúc ván).
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class GameRecorder:
+    """Ghi các ván cờ vào thư mục lịch sử dưới dạng PGN, không chặn luồng gọi.
+
+    Args:
+        folder (str): Thư mục lịch sử.
+        flush_every (int): Số nước đi giữa hai lần ghi tạm trong khi chơi
+            (0 để chỉ ghi khi tạo file và khi kết thúc ván).
+        site (str): Giá trị thẻ Site trong PGN.
+        on_saved (callable or None): Hàm nhận đường dẫn file, được gọi trên luồng
+            ghi nền sau khi một ván kết thúc đã được ghi xong (ví dụ để cập nhật chỉ mục).
+        metrics (metrics.Metrics or None): Nơi ghi nhận thời gian ghi mỗi file.
+
+    Attributes:
+        path (str or None): File PGN của ván hiện tại, None khi chưa có nước đi nào.
+    """
+
+    def __init__(self, folder, flush_every=10, site="ChessGame", on_saved=None, metrics=None):
+        self.folder = folder
+        self.flush_every = flush_every
+        self.site = site
+        self.on_saved = on_saved
+        self.metrics = metrics
+        self.path = None
+        self._headers = None
+        self._moves = []
+        self._started_at = None
+        self._claimed = set() # Cac file recorder nay da dung, tranh trung ten khi dong ho thieu do phan giai
+        self._jobs = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="game-recorder", daemon=True)
+        self._writer.start()
+
+    @property
+    def recording(self):
+        """bool: True nếu đang có một ván được ghi."""
+        return self._headers is not None
+
+    def start_game(self, white, black, **tags):
+        """Bắt đầu ghi một ván mới; ván đang ghi dở (nếu có) được kết thúc với kết quả "*".
+
+        Args:
+            white (str): Tên bên trắng (ví dụ "Player" hoặc "Stockfish").
+            black (str): Tên bên đen.
+            **tags: Các thẻ PGN bổ sung (ví dụ ``SkillLevel=10``).
+        """
+        self.finish()
+        self._started_at = datetime.now()
+        self._headers = {
+            "Event": "Casual game",
+            "Site": self.site,
+            "Date": self._started_at.strftime("%Y.%m.%d"),
+            "Round": "-",
+            "White": white,
+            "Black": black,
+        }
+        self._headers.update(tags)
+        self._headers["Time"] = self._started_at.strftime("%H:%M:%S")
+        self._moves = []
+        self.path = None
+
+    def record_move(self, move):
+        """Ghi nhận một nước đi của ván hiện tại.
+
+        File PGN được tạo ở nước đi đầu tiên và được ghi tạm sau mỗi ``flush_every`` nước.
+
+        Args:
+            move (chess.Move): Nước đi vừa thực hiện.
+        """
+        if not self.recording:
+            return
+        self._moves.append(move)
+        if self.path is None:
+            self.path = self._new_path()
+            self._submit()
+        elif self.flush_every and len(self._moves) % self.flush_every == 0:
+            self._submit()
+
+    def finish(self, result="*", comment=""):
+        """Kết thúc ván hiện tại và ghi lần cuối (có ``fsync``) trên luồng nền.
+
+        Ván chưa có nước đi nào bị bỏ qua, không tạo file.
+
+        Args:
+            result (str): Kết quả ván theo ký hiệu PGN.
+            comment (str): Thông báo kết thúc ván, ghi thành chú thích sau nước cuối.
+
+        Returns:
+            str or None: Đường dẫn file PGN, None nếu không có gì được ghi.
+        """
+        if not self.recording:
+            return None
+        path = self.path
+        if path is not None:
+            self._submit(result, comment, sync=True)
+        self._headers = None
+        self._moves = []
+        self.path = None
+        return path
+
+    def close(self):
+        """Kết thúc ván đang ghi (nếu có), chờ luồng nền ghi xong rồi dừng nó."""
+        self.finish()
+        self._jobs.put(None)
+        self._writer.join()
+
+    def _new_path(self):
+        # Khong kiem tra o dia: luong giao dien khong cho I/O; micro giay du de khac tien trinh khac
+        stamp = self._started_at.strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(self.folder, f"game_history_{stamp}.pgn")
+        number = 1
+        while path in self._claimed:
+            number += 1
+            path = os.path.join(self.folder, f"game_history_{stamp}_{number}.pgn")
+        self._claimed.add(path)
+        return path
+
+    def _submit(self, result="*", comment="", sync=False):
+        # Gui ban sao de luong nen khong doc danh sach dang bi thay doi
+        self._jobs.put((self.path, dict(self._headers), list(self._moves), result, comment, sync))
+
+    def _write_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            path, headers, moves, result, comment, sync = job
+            started = time.perf_counter()
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                write_file(path, build_pgn(headers, moves, result, comment), sync=sync)
+            except OSError as e:
+                print(f"Loi khi ghi lich su {path}: {e}")
+                continue
+            if self.metrics is not None:
+                self.metrics.observe("history_write_seconds", time.perf_counter() - started,
+                                     kind="final" if sync else "flush")
+            if sync and self.on_saved is not None:
+                self.on_saved(path)
@@ -0,0 +1,187 @@
+"""Client của GameServer cho giao diện Pygame: dùng Stockfish trên máy chủ thay vì chạy tại máy.
+
+Giao diện chỉ dùng máy chủ như một engine từ xa qua yêu cầu ``search``: luồng chơi,
+đồng hồ và việc phân xử kết thúc ván vẫn chạy tại máy trong game_core như khi dùng
+engine cục bộ. Các yêu cầu ``new_game``/``move``/``give_up`` của máy chủ dành cho
+client không có giao diện (xem ``server.py client``).
+
+Module này không phụ thuộc vào server.py để giao diện không phải tải mã của máy chủ.
+"""
+import asyncio
+import itertools
+import json
+import threading
+
+import chess
+import chess.engine
+
+from engine_worker import EngineResult, PonderStats
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_LINE_BYTES = 64 * 1024 # Do dai toi da mot dong JSON cua giao thuc
+
+
+async def read_message(reader):
+    """Đọc một dòng JSON của giao thức.
+
+    Args:
+        reader (asyncio.StreamReader): Kết nối cần đọc.
+
+    Returns:
+        dict: Đối tượng JSON đã giải mã.
+
+    Raises:
+        ConnectionError: Nếu bên kia đã đóng kết nối.
+        ValueError: Nếu dòng không phải JSON hợp lệ.
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("server closed the connection")
+    return json.loads(line)
+
+
+class RemoteEngineWorker:
+    """Thay thế EngineWorker, gửi yêu cầu tìm nước đi tới GameServer (giao diện Pygame làm client).
+
+    Có cùng giao diện với engine_worker.EngineWorker (``start``, ``configure``,
+    ``submit``, ``cancel``, ``new_game``, ``close``); mỗi ``submit`` trở thành một yêu
+    cầu ``search`` kèm tuỳ chọn và giới hạn tìm kiếm của mức độ khó. Không hỗ trợ ponder.
+
+    Args:
+        address (str): Địa chỉ máy chủ dạng ``host:port``.
+        on_result (callable): Hàm nhận một EngineResult, được gọi từ luồng nền.
+    """
+
+    def __init__(self, address, on_result):
+        host, _, port = address.rpartition(":")
+        self.host = host or DEFAULT_HOST
+        self.port = int(port)
+        self.on_result = on_result
+        self.ponder_stats = PonderStats()
+        self._options = {}
+        self._loop = None
+        self._thread = None
+        self._reader = None
+        self._writer = None
+        self._replies = {}
+        self._reader_task = None
+        self._job_ids = itertools.count(1)
+        self._current = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Kết nối tới máy chủ trên một luồng nền.
+
+        Raises:
+            OSError: Nếu không kết nối được tới máy chủ.
+        """
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="remote-engine", daemon=True)
+        self._thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self._connect(), self._loop).result()
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    def configure(self, options):
+        """Lưu tuỳ chọn UCI, gửi kèm mỗi yêu cầu tìm kiếm."""
+        self.cancel()
+        # Tao dict moi thay vi sua tai cho: luong nen co the dang ghi dict cu vao yeu cau
+        self._options = {**self._options, **options}
+
+    def submit(self, board, limit, min_delay=0.0):
+        """Gửi yêu cầu tìm nước đi tới máy chủ (xem EngineWorker.submit).
+
+        Returns:
+            int: Mã của yêu cầu.
+        """
+        job_id = next(self._job_ids)
+        # Tuy chon duoc chup lai o day: configure co the thay dict trong luc yeu cau dang gui
+        coro = self._search(job_id, board.root().fen(), [move.uci() for move in board.move_stack], limit,
+                            self._options, min_delay)
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+            self._current = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return job_id
+
+    def cancel(self):
+        """Huỷ yêu cầu đang chờ; câu trả lời của máy chủ sẽ bị bỏ qua."""
+        with self._lock:
+            if self._current is not None:
+                self._current.cancel()
+                self._current = None
+
+    def new_game(self):
+        """Kết thúc ván hiện tại.
+
+        Returns:
+            PonderStats: Luôn rỗng (không hỗ trợ ponder qua máy chủ).
+        """
+        self.cancel()
+        stats, self.ponder_stats = self.ponder_stats, PonderStats()
+        return stats
+
+    def close(self):
+        """Đóng kết nối và dừng luồng nền."""
+        self.cancel()
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result()
+            self._stop_loop()
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE_BYTES)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_replies())
+
+    async def _disconnect(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def _read_replies(self):
+        try:
+            while True:
+                message = await read_message(self._reader)
+                future = self._replies.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError) as e:
+            for future in self._replies.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"server connection lost: {e}"))
+            self._replies.clear()
+
+    async def _search(self, job_id, fen, moves, limit, options, min_delay):
+        started = self._loop.time()
+        request = {"op": "search", "id": job_id, "fen": fen, "moves": moves, "options": options,
+                   "limit": {"time": limit.time, "nodes": limit.nodes, "depth": limit.depth}}
+        future = self._loop.create_future()
+        self._replies[job_id] = future
+        try:
+            self._writer.write((json.dumps(request) + "\n").encode())
+            await self._writer.drain()
+            reply = await future
+        except asyncio.CancelledError:
+            self._replies.pop(job_id, None)
+            raise
+        except ConnectionError as e:
+            self.on_result(EngineResult(job_id, error=chess.engine.EngineTerminatedError(str(e))))
+            return
+        if reply["type"] != "bestmove":
+            self.on_result(EngineResult(job_id, error=chess.engine.EngineError(reply.get("message"))))
+            return
+        elapsed = self._loop.time() - started
+        if min_delay > elapsed:
+            await asyncio.sleep(min_delay - elapsed)
+        move = chess.Move.from_uci(reply["move"])
+        pv = [chess.Move.from_uci(uci) for uci in reply.get("pv", [])] or [move]
+        self.on_result(EngineResult(job_id, move=move, info={"pv": pv, "depth": reply.get("depth")}, elapsed=elapsed))
@@ -0,0 +1,136 @@
+"""Xem lại ván cờ đã lưu: chuyển nhanh tới bất kỳ nửa nước nào của ván.
+
+File lịch sử chỉ chứa danh sách nước đi, nên để có thế cờ sau nửa nước N phải đi lại
+mọi nước từ đầu. Replay dựng ván một lần khi mở và giữ ảnh chụp bàn cờ (keyframe)
+sau mỗi ``keyframe_interval`` nửa nước; thế cờ ở nửa nước bất kỳ được tạo từ
+keyframe gần nhất phía trước cộng tối đa ``keyframe_interval - 1`` nước, nên thời
+gian chuyển tới một nửa nước không phụ thuộc độ dài ván. Ký hiệu SAN của các nước
+cũng được tính sẵn khi dựng ván.
+
+Lớp này không phụ thuộc Pygame; giao diện (ChessGame.py) vẽ và lưu các khung hình.
+"""
+import chess
+
+from history_index import read_games
+
+KEYFRAME_INTERVAL = 16 # So nua nuoc giua hai anh chup ban co
+
+
+class Replay:
+    """Một ván cờ đã lưu để xem lại, với con trỏ ở một nửa nước của ván.
+
+    Args:
+        moves (list): Các nước đi hợp lệ từ thế cờ ban đầu.
+        headers (dict or None): Các thẻ PGN của ván (White, Black, Difficulty...).
+        result (str): Kết quả theo ký hiệu PGN.
+        keyframe_interval (int): Số nửa nước giữa hai ảnh chụp bàn cờ.
+
+    Attributes:
+        ply (int): Vị trí con trỏ (0 là thế cờ ban đầu, ``length`` là sau nước cuối).
+        san (list): Ký hiệu SAN của từng nước đi.
+        keyframes (list): Bàn cờ sau các nửa nước 0, ``keyframe_interval``, 2 * ``keyframe_interval``...
+
+    Raises:
+        ValueError: Nếu có nước đi không hợp lệ.
+    """
+
+    def __init__(self, moves, headers=None, result="*", keyframe_interval=KEYFRAME_INTERVAL):
+        self.moves = list(moves)
+        self.headers = dict(headers or {})
+        self.result = result
+        self.keyframe_interval = keyframe_interval
+        self.ply = 0
+        self.san = []
+        self.keyframes = []
+        board = chess.Board()
+        for ply, move in enumerate(self.moves):
+            if ply % keyframe_interval == 0:
+                self.keyframes.append(board.copy(stack=False))
+            if not board.is_legal(move):
+                raise ValueError(f"Nuoc di khong hop le o nua nuoc {ply + 1}: {move.uci()}")
+            self.san.append(board.san(move))
+            board.push(move)
+        if len(self.moves) % keyframe_interval == 0:
+            self.keyframes.append(board.copy(stack=False))
+
+    @classmethod
+    def from_file(cls, path, number=0, **kwargs):
+        """Mở một ván trong file lịch sử (``.pgn`` hoặc định dạng ``.txt`` cũ).
+
+        Args:
+            path (str): Đường dẫn file lịch sử.
+            number (int): Số thứ tự của ván trong file (bắt đầu từ 0).
+            **kwargs: Tham số khác của Replay (ví dụ ``keyframe_interval``).
+
+        Returns:
+            Replay: Ván cờ để xem lại.
+
+        Raises:
+            OSError: Nếu không đọc được file.
+            ValueError: Nếu file không có ván thứ ``number``.
+        """
+        records = read_games(path)
+        if not 0 <= number < len(records):
+            raise ValueError(f"{path} khong co van so {number}")
+        record = records[number]
+        return cls(record.moves, record.headers, record.result, **kwargs)
+
+    @property
+    def length(self):
+        """int: Số nửa nước của ván."""
+        return len(self.moves)
+
+    @property
+    def user_color(self):
+        """chess.Color or None: Màu của người chơi, None nếu cả hai bên đều là engine."""
+        if self.headers.get("White") == "Player":
+            return chess.WHITE
+        if self.headers.get("Black") == "Player":
+            return chess.BLACK
+        return None
+
+    def board_at(self, ply):
+        """Tạo thế cờ sau ``ply`` nửa nước từ keyframe gần nhất.
+
+        Args:
+            ply (int): Nửa nước (được giới hạn trong khoảng 0..length).
+
+        Returns:
+            chess.Board: Bàn cờ mới; ``move_stack`` chỉ chứa các nước sau keyframe.
+        """
+        ply = max(0, min(ply, self.length))
+        base = ply - ply % self.keyframe_interval
+        board = self.keyframes[base // self.keyframe_interval].copy(stack=False)
+        for move in self.moves[base:ply]:
+            board.push(move)
+        return board
+
+    def last_move(self, ply=None):
+        """Nước đi dẫn tới nửa nước ``ply`` (mặc định vị trí con trỏ), None ở thế cờ ban đầu."""
+        ply = self.ply if ply is None else ply
+        return self.moves[ply - 1] if ply > 0 else None
+
+    def move_text(self, ply=None):
+        """Nước đi dẫn tới nửa nước ``ply`` theo ký hiệu quen thuộc, ví dụ ``12... Nf6``."""
+        ply = self.ply if ply is None else ply
+        if ply <= 0:
+            return "Start"
+        number = (ply + 1) // 2
+        return f"{number}. {self.san[ply - 1]}" if ply % 2 else f"{number}... {self.san[ply - 1]}"
+
+    def seek(self, ply):
+        """Đặt con trỏ tới nửa nước ``ply`` (được giới hạn trong khoảng 0..length).
+
+        Returns:
+            int: Vị trí mới của con trỏ.
+        """
+        self.ply = max(0, min(ply, self.length))
+        return self.ply
+
+    def step(self, delta):
+        """Dịch con trỏ ``delta`` nửa nước (âm để lùi lại).
+
+        Returns:
+            int: Vị trí mới của con trỏ.
+        """
+        return self.seek(self.ply + delta)
@@ -0,0 +1,223 @@
+"""Chạy nhiều ván Stockfish tự đấu song song, không cần mở cửa sổ.
+
+Mỗi tiến trình con trong pool mở một engine Stockfish riêng và chơi lần lượt các
+ván được giao; mỗi bên có Skill Level riêng. Kết quả được ghi vào thư mục lịch sử
+theo cùng định dạng với trò chơi (mỗi ván một file PGN ``game_history_*.pgn``) và
+tốc độ (số ván mỗi giây) được in ra khi chạy xong.
+
+Mỗi bên có thể dùng một mức độ khó đầy đủ trong difficulty.PROFILES (Elo, giới hạn
+node/độ sâu và ngân sách thời gian) thay cho Skill Level; khi đó công cụ báo cáo
+chênh lệch Elo đo được giữa hai bên và thời gian trung bình mỗi nước của từng bên.
+
+Với ``--archive``, các ván được ghi nối thêm vào một kho lưu trữ nhị phân
+(game_archive.py) thay vì mỗi ván một file, phù hợp khi chạy rất nhiều ván.
+
+Ví dụ::
+
+    python selfplay.py --games 100000 --workers 8 --archive history/selfplay.cga
+    python selfplay.py --games 200 --white-skill Hard --black-skill 2 --workers 4 --time 0.05
+    python selfplay.py --games 100 --white-profile Easy --black-profile Medium
+"""
+import argparse
+import math
+import multiprocessing.util
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import chess
+import chess.engine
+
+from difficulty import PROFILES
+from game_archive import ArchiveWriter
+from game_core import DIFFICULTY_LEVELS, STOCKFISH_PATH, game_over_text
+from recorder import build_pgn, write_file
+
+# Engine rieng cua moi tien trinh con (khoi tao trong _init_worker)
+_engine = None
+
+
+def parse_skill(value):
+    """Đọc Skill Level từ tên độ khó ("Easy", "Medium", "Hard") hoặc một số 0-20.
+
+    Args:
+        value (str): Giá trị người dùng nhập.
+
+    Returns:
+        int: Skill Level của Stockfish.
+    """
+    if value in DIFFICULTY_LEVELS:
+        return DIFFICULTY_LEVELS[value]
+    level = int(value)
+    if not 0 <= level <= 20:
+        raise argparse.ArgumentTypeError(f"Skill Level phai trong khoang 0-20: {value}")
+    return level
+
+
+def _init_worker(engine_path):
+    global _engine
+    _engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    # Tat engine khi tien trinh con ket thuc, neu khong luong nen cua engine giu tien trinh song
+    multiprocessing.util.Finalize(_engine, _engine.quit, exitpriority=10)
+
+
+def play_game(index, white, black):
+    """Chơi một ván engine tự đấu trong tiến trình con.
+
+    Args:
+        index (int): Số thứ tự của ván.
+        white (tuple): ``(name, options, limit)`` của bên trắng: tên hiển thị, các
+            tuỳ chọn UCI và giới hạn tìm kiếm mỗi nước.
+        black (tuple): ``(name, options, limit)`` của bên đen.
+
+    Returns:
+        dict: Số thứ tự ván, tên hai bên, các nước đi, thông báo kết thúc, kết quả
+        ("1-0", "0-1", "1/2-1/2") và tổng thời gian suy nghĩ của mỗi bên.
+    """
+    board = chess.Board()
+    sides = {chess.WHITE: white, chess.BLACK: black}
+    think_time = {chess.WHITE: 0.0, chess.BLACK: 0.0}
+    while not board.is_game_over():
+        _, options, limit = sides[board.turn]
+        started = time.perf_counter()
+        result = _engine.play(board, limit, game=index, options=options)
+        think_time[board.turn] += time.perf_counter() - started
+        board.push(result.move)
+    return {"index": index, "white": white[0], "black": black[0], "moves": board.move_stack,
+            "message": game_over_text(board), "result": board.result(),
+            "white_time": think_time[chess.WHITE], "black_time": think_time[chess.BLACK]}
+
+
+def side_spec(skill, profile_name, limit):
+    """Tạo cấu hình của một bên từ Skill Level hoặc tên mức độ khó.
+
+    Args:
+        skill (int): Skill Level, dùng khi không chọn mức độ khó.
+        profile_name (str or None): Tên mức độ khó trong difficulty.PROFILES.
+        limit (chess.engine.Limit): Giới hạn tìm kiếm khi không chọn mức độ khó.
+
+    Returns:
+        tuple: ``(name, options, limit)`` dùng cho play_game.
+    """
+    if profile_name is None:
+        return f"skill {skill}", {"Skill Level": skill}, limit
+    profile = PROFILES[profile_name]
+    return profile_name, profile.options(), profile.limit()
+
+
+def elo_difference(score):
+    """Ước lượng chênh lệch Elo từ tỉ lệ điểm.
+
+    Args:
+        score (float): Điểm trung bình mỗi ván của một bên (0.0 - 1.0).
+
+    Returns:
+        float: Chênh lệch Elo của bên đó so với đối thủ (vô cực nếu thắng hoặc thua tất cả).
+    """
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def write_history(out_dir, stamp, game):
+    """Ghi một ván tự đấu vào thư mục lịch sử.
+
+    Args:
+        out_dir (str): Thư mục đích.
+        stamp (str): Dấu thời gian của lần chạy, dùng trong tên file.
+        game (dict): Kết quả trả về từ play_game.
+
+    Returns:
+        str: Đường dẫn file đã ghi.
+    """
+    path = os.path.join(out_dir, f"game_history_{stamp}_{game['index']:05d}.pgn")
+    headers = {
+        "Event": "Self-play",
+        "Site": "ChessGame",
+        "Date": datetime.strptime(stamp, "%Y%m%d_%H%M%S").strftime("%Y.%m.%d"),
+        "Round": game["index"] + 1,
+        "White": f"Stockfish ({game['white']})",
+        "Black": f"Stockfish ({game['black']})",
+    }
+    write_file(path, build_pgn(headers, game["moves"], game["result"], game["message"]))
+    return path
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của công cụ tự đấu.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Stockfish self-play runner")
+    parser.add_argument("--games", type=int, default=10, help="so van can choi")
+    parser.add_argument("--white-skill", type=parse_skill, default=20, help="Skill Level cua ben trang (0-20 hoac Easy/Medium/Hard)")
+    parser.add_argument("--black-skill", type=parse_skill, default=20, help="Skill Level cua ben den (0-20 hoac Easy/Medium/Hard)")
+    parser.add_argument("--white-profile", choices=list(PROFILES), default=None,
+                        help="muc do kho day du cua ben trang (thay cho --white-skill va gioi han tim kiem)")
+    parser.add_argument("--black-profile", choices=list(PROFILES), default=None,
+                        help="muc do kho day du cua ben den (thay cho --black-skill va gioi han tim kiem)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="so tien trinh choi song song")
+    parser.add_argument("--time", type=float, default=0.1, help="thoi gian tim kiem moi nuoc (giay)")
+    parser.add_argument("--nodes", type=int, default=None, help="gioi han so node moi nuoc")
+    parser.add_argument("--depth", type=int, default=None, help="gioi han do sau moi nuoc")
+    parser.add_argument("--engine", default=STOCKFISH_PATH, help="duong dan toi Stockfish")
+    parser.add_argument("--out", default=os.path.join("history", "selfplay"), help="thu muc ghi lich su")
+    parser.add_argument("--archive", default=None, help="ghi cac van vao kho luu tru .cga thay vi moi van mot file PGN")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy các ván tự đấu và in thống kê kết quả."""
+    args = parse_args(argv)
+    limit = chess.engine.Limit(time=args.time, nodes=args.nodes, depth=args.depth)
+    archive = ArchiveWriter(args.archive) if args.archive else None
+    if archive is None:
+        os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    scores = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+
+    white = side_spec(args.white_skill, args.white_profile, limit)
+    black = side_spec(args.black_skill, args.black_profile, limit)
+    think_time = {"white": 0.0, "black": 0.0}
+    plies = 0
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.engine,)) as pool:
+        futures = [pool.submit(play_game, i, white, black) for i in range(args.games)]
+        for done, future in enumerate(as_completed(futures), 1):
+            game = future.result()
+            if archive is not None:
+                archive.append(game["moves"], f"Stockfish ({game['white']})", f"Stockfish ({game['black']})",
+                               game["result"], timestamp=time.time())
+            else:
+                write_history(args.out, stamp, game)
+            scores[game["result"]] += 1
+            think_time["white"] += game["white_time"]
+            think_time["black"] += game["black_time"]
+            plies += len(game["moves"])
+            print(f"[{done}/{args.games}] game {game['index']}: {game['message']} ({len(game['moves'])} plies)")
+    elapsed = time.perf_counter() - started
+    if archive is not None:
+        archive.close()
+
+    rate = args.games / elapsed if elapsed > 0 else 0.0
+    print(f"White ({white[0]}) vs Black ({black[0]}): "
+          f"+{scores['1-0']} ={scores['1/2-1/2']} -{scores['0-1']}")
+    score = (scores["1-0"] + 0.5 * scores["1/2-1/2"]) / args.games if args.games else 0.5
+    print(f"Elo difference (White - Black): {elo_difference(score):+.0f}")
+    # Moi ben di khoang mot nua so nua nuoc
+    moves_per_side = plies / 2 or 1
+    for side, spec in (("White", white), ("Black", black)):
+        print(f"{side} ({spec[0]}): {think_time[side.lower()] / moves_per_side * 1000:.1f} ms/move")
+    print(f"{args.games} games in {elapsed:.1f}s: {rate:.2f} games/s ({rate * 3600:.0f} games/hour)")
+
+
+if __name__ == "__main__":
+    main()
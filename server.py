@@ -0,0 +1,788 @@
+"""Máy chủ nhiều ván cờ chạy trên asyncio, không cần cửa sổ.
+
+Máy chủ dùng lại luồng chơi của game_core (chọn màu, chọn độ khó, bỏ cuộc, phát
+hiện kết thúc ván) cho mỗi ván và ghi lịch sử PGN như trò chơi. Hàng trăm ván dùng
+chung một số ít engine Stockfish trong một EnginePool (mở bằng
+``chess.engine.popen_uci``):
+
+- FairScheduler chia engine cho các yêu cầu tìm nước đi, xoay vòng giữa các kết
+  nối, nên một kết nối mở nhiều ván không chiếm hết engine của người khác;
+- số ván đang chơi (tổng và mỗi kết nối) có giới hạn, ván mới vượt giới hạn bị từ
+  chối với lỗi ``busy``; yêu cầu ``search`` bị từ chối khi hàng đợi đầy, và mỗi kết
+  nối chỉ có một số yêu cầu ``search`` đang chạy, vượt quá thì máy chủ ngừng đọc
+  kết nối đó (TCP tự chặn phía gửi);
+- số nhân CPU được chia đều giữa các engine (EngineResources) để các ván chạy cùng
+  lúc không dùng quá số nhân của máy; bảng băm mặc định được giữ giữa các lần tìm;
+- máy chủ chờ kết nối nhận hết dữ liệu đã gửi (``drain``); kết nối không nhận dữ
+  liệu trong SEND_TIMEOUT giây bị đóng.
+
+Giao thức: mỗi dòng là một đối tượng JSON qua TCP. Client gửi ``{"op": ...}``, có
+thể kèm ``"id"`` để đối chiếu câu trả lời trực tiếp (được gửi lại nguyên vẹn):
+
+- ``{"op": "new_game", "color": "white", "difficulty": "Easy"}`` -> ``started``;
+- ``{"op": "move", "game": 1, "move": "e2e4"}`` -> ``state``, sau đó ``bot_move``
+  hoặc ``game_over``; nếu engine lỗi, máy chủ báo ``engine_error`` và thử lại, sau
+  BOT_MAX_FAILURES lần lỗi liên tiếp ván bị huỷ với ``game_over`` có ``"reason": "engine_error"``;
+- ``{"op": "give_up", "game": 1}`` -> ``game_over``;
+- ``{"op": "state", "game": 1}`` -> ``state``;
+- ``{"op": "search", "fen": ..., "moves": [...], "options": {...}, "limit": {...}}``
+  -> ``bestmove`` (tìm nước đi cho một thế cờ bất kỳ, dùng bởi giao diện Pygame khi
+  chạy với ``--server``, xem remote_engine.RemoteEngineWorker);
+- ``{"op": "stats"}`` -> ``stats``.
+
+Lỗi được trả về dưới dạng ``{"type": "error", "code": ..., "message": ...}``.
+
+Ví dụ::
+
+    python server.py serve --engines 2 --port 8765
+    python server.py client --games 200 --difficulty Beginner
+    python ChessGame.py --server 127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import chess
+import chess.engine
+
+from difficulty import PROFILES, TimeControl
+from engine_pool import EnginePool
+from engine_resources import HASH_POLICIES, EngineResources
+from game_core import STOCKFISH_PATH, Phase, Session, color_name
+from recorder import build_pgn, write_file
+from remote_engine import DEFAULT_HOST, DEFAULT_PORT, MAX_LINE_BYTES, read_message
+
+SEND_TIMEOUT = 10.0 # Thoi gian toi da (giay) cho client nhan du lieu truoc khi dong ket noi
+MAX_INFLIGHT_SEARCHES = 4 # So yeu cau "search" dang chay toi da cua moi ket noi
+CLOCK_CHECK_INTERVAL = 0.5 # Chu ky (giay) kiem tra het gio cua cac van tinh gio
+BOT_MAX_FAILURES = 3 # So lan engine loi lien tiep khi tim nuoc cho bot truoc khi huy van
+# Tuy chon UCI va gioi han tim kiem client duoc phep dat qua yeu cau "search"
+SEARCH_OPTIONS = {"Skill Level": int, "UCI_LimitStrength": bool, "UCI_Elo": int} # Ten tuy chon -> kieu gia tri
+MAX_SEARCH_TIME = 5.0
+MAX_SEARCH_NODES = 10_000_000
+MAX_SEARCH_DEPTH = 30
+
+
+class ProtocolError(Exception):
+    """Yêu cầu không hợp lệ từ client.
+
+    Args:
+        code (str): Mã lỗi gửi về client (ví dụ ``"bad_request"``, ``"busy"``).
+        message (str): Mô tả lỗi.
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FairScheduler:
+    """Chia các engine của pool cho các yêu cầu tìm nước đi, xoay vòng giữa các kết nối.
+
+    Mỗi kết nối có một hàng đợi riêng; mỗi khi có engine rảnh, yêu cầu tiếp theo
+    được lấy từ kết nối kế tiếp trong vòng xoay, nên một kết nối có nhiều yêu cầu
+    không làm các kết nối khác phải chờ lâu hơn.
+
+    Args:
+        pool (EnginePool): Pool engine (đã khởi động).
+
+    Attributes:
+        searches (int): Số yêu cầu đã xử lý xong.
+        wait_time (float): Tổng thời gian (giây) các yêu cầu chờ engine.
+        search_time (float): Tổng thời gian (giây) engine tìm kiếm.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.searches = 0
+        self.wait_time = 0.0
+        self.search_time = 0.0
+        self._queues = collections.OrderedDict()
+        self._available = asyncio.Semaphore(0)
+        self._dispatchers = []
+
+    @property
+    def pending(self):
+        """int: Số yêu cầu đang chờ engine."""
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def start(self):
+        """Chạy một bộ điều phối cho mỗi engine của pool."""
+        loop = asyncio.get_running_loop()
+        self._dispatchers = [loop.create_task(self._dispatch()) for _ in range(self.pool.size)]
+
+    async def close(self):
+        """Dừng các bộ điều phối và huỷ các yêu cầu đang chờ."""
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        for jobs in self._queues.values():
+            for job in jobs:
+                job[-1].cancel()
+        self._queues.clear()
+
+    async def search(self, client_id, board, limit, options):
+        """Xếp một yêu cầu tìm nước đi vào hàng đợi của kết nối và chờ kết quả.
+
+        Args:
+            client_id (int): Kết nối gửi yêu cầu.
+            board (chess.Board): Thế cờ (không bị thay đổi).
+            limit (chess.engine.Limit): Giới hạn tìm kiếm.
+            options (dict): Tuỳ chọn UCI cho lần tìm kiếm này.
+
+        Returns:
+            tuple: ``(move, info)`` - nước đi và thông tin phân tích của engine.
+
+        Raises:
+            chess.engine.EngineError: Nếu engine lỗi (kể cả sau một lần thử lại).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client_id, collections.deque()).append(
+            (board, limit, options, time.perf_counter(), future))
+        self._available.release()
+        return await future
+
+    def _next_job(self):
+        # Lay yeu cau dau tien cua ket noi dau vong xoay roi dua ket noi do xuong cuoi
+        client_id, jobs = next(iter(self._queues.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._queues.move_to_end(client_id)
+        else:
+            del self._queues[client_id]
+        return job
+
+    async def _dispatch(self):
+        while True:
+            await self._available.acquire()
+            board, limit, options, queued_at, future = self._next_job()
+            if future.done():
+                continue # Yeu cau da bi huy (client ngat ket noi)
+            self.wait_time += time.perf_counter() - queued_at
+            started = time.perf_counter()
+            try:
+                result = await self._run(board, limit, options)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                # Loi cua mot yeu cau chi tra ve cho yeu cau do, khong dung bo dieu phoi;
+                # loi khac EngineError (vi du engine khong tra ve pv) van bao ve client nhu loi engine
+                if not isinstance(e, chess.engine.EngineError):
+                    e = chess.engine.EngineError(f"search failed: {e!r}")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.searches += 1
+            self.search_time += time.perf_counter() - started
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self, board, limit, options):
+        for attempt in range(2):
+            try:
+                async with self.pool.lease() as engine:
+                    async with engine.lock:
+                        with engine.busy():
+                            await engine.protocol.configure(options)
+                            info = await engine.protocol.analyse(board, limit)
+                return info["pv"][0], info
+            except chess.engine.EngineTerminatedError:
+                # Pool khoi dong lai engine khi duoc tra lai: thu lai mot lan
+                if attempt == 1:
+                    raise
+
+
+class _Connection:
+    """Một kết nối client: gửi tin nhắn theo thứ tự, có chờ ``drain``."""
+
+    def __init__(self, connection_id, reader, writer):
+        self.id = connection_id
+        self.reader = reader
+        self.writer = writer
+        self.games = {}
+        self.inflight = asyncio.Semaphore(MAX_INFLIGHT_SEARCHES)
+        self.tasks = set()
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self._send_lock:
+            if self.writer.is_closing():
+                return
+            self.writer.write((json.dumps(message) + "\n").encode())
+            try:
+                await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+            except (asyncio.TimeoutError, ConnectionError):
+                # Client khong nhan du lieu: dong ket noi thay vi de bo dem tang mai
+                self.writer.close()
+
+    def spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+class ServerGame:
+    """Một ván cờ trên máy chủ.
+
+    Attributes:
+        id (int): Mã ván, client dùng trong các yêu cầu.
+        session (game_core.Session): Phiên chơi của ván.
+        started_at (datetime): Thời điểm bắt đầu ván.
+        bot_task (asyncio.Task or None): Lượt tìm nước đi của bot đang chạy.
+        bot_failures (int): Số lần engine lỗi liên tiếp khi tìm nước cho bot.
+    """
+
+    def __init__(self, game_id, session):
+        self.id = game_id
+        self.session = session
+        self.started_at = datetime.now()
+        self.bot_task = None
+        self.bot_failures = 0
+
+    def state(self):
+        """dict: Trạng thái ván gửi cho client."""
+        game = self.session.game
+        state = {
+            "game": self.id,
+            "fen": game.board.fen(),
+            "phase": self.session.phase,
+            "turn": color_name(game.board.turn).lower(),
+            "color": color_name(game.user_color).lower(),
+            "difficulty": game.difficulty,
+            "moves": [move.uci() for move in game.board.move_stack],
+        }
+        if game.clock is not None:
+            state["clock"] = {color_name(color).lower(): round(game.clock.remaining(color), 2)
+                              for color in chess.COLORS}
+        return state
+
+
+class GameServer:
+    """Máy chủ JSON-lines phục vụ nhiều ván cờ đồng thời trên một số ít engine.
+
+    Args:
+        engine_path (str): Đường dẫn Stockfish.
+        engines (int): Số tiến trình engine dùng chung.
+        max_games (int): Số ván đang chơi tối đa trên máy chủ.
+        max_games_per_client (int): Số ván đang chơi tối đa của mỗi kết nối.
+        max_pending (int): Số yêu cầu ``search`` đang chờ tối đa trước khi từ chối.
+        history_folder (str or None): Thư mục ghi PGN các ván, None để không ghi.
+        time_control (difficulty.TimeControl or None): Thể thức thời gian mặc định.
+        resources (engine_resources.EngineResources or None): Threads/Hash/NUMA của các
+            engine (đặt một lần khi khởi động), None để chia đều số nhân giữa ``engines`` engine
+            và giữ bảng băm giữa các lần tìm.
+    """
+
+    def __init__(self, engine_path=STOCKFISH_PATH, engines=2, max_games=500, max_games_per_client=16,
+                 max_pending=256, history_folder=os.path.join("history", "server"), time_control=None, resources=None):
+        self.engine_path = engine_path
+        self.max_games = max_games
+        self.max_games_per_client = max_games_per_client
+        self.max_pending = max_pending
+        self.history_folder = history_folder
+        self.time_control = time_control
+        self.resources = resources or EngineResources(engines=engines, hash_policy="keep")
+        self.pool = EnginePool(engine_path, size=engines, options=self.resources.pool_options(shared=True),
+                               keep_hash=self.resources.keep_hash)
+        self.scheduler = None
+        self.games = {}
+        self.games_played = 0
+        self.games_abandoned = 0
+        self._connections = {}
+        self._server = None
+        self._clock_task = None
+        self._game_ids = itertools.count(1)
+        self._connection_ids = itertools.count(1)
+        self._stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._writes = set()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Khởi động pool engine và bắt đầu nhận kết nối.
+
+        Returns:
+            tuple: Địa chỉ ``(host, port)`` đang nghe (port 0 được thay bằng port thật).
+        """
+        await self.pool.start()
+        self.scheduler = FairScheduler(self.pool)
+        self.scheduler.start()
+        self._clock_task = asyncio.get_running_loop().create_task(self._watch_clocks())
+        self._server = await asyncio.start_server(self._handle_client, host, port, limit=MAX_LINE_BYTES)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """Phục vụ cho tới khi bị huỷ (Ctrl+C)."""
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Ngừng nhận kết nối, kết thúc các ván đang chơi và tắt engine."""
+        if self._server is not None:
+            self._server.close()
+        for connection in list(self._connections.values()):
+            connection.writer.close()
+            await self._disconnect(connection)
+        if self._clock_task is not None:
+            self._clock_task.cancel()
+        if self.scheduler is not None:
+            await self.scheduler.close()
+        if self._writes:
+            # Cho ghi xong PGN cua cac van vua ket thuc truoc khi thoat
+            await asyncio.gather(*self._writes)
+        await self.pool.close()
+
+    def stats(self):
+        """dict: Thống kê máy chủ (số ván, kết nối, hàng đợi, thời gian chờ engine)."""
+        scheduler = self.scheduler
+        searches = scheduler.searches if scheduler else 0
+        return {
+            "games": len(self.games),
+            "games_played": self.games_played,
+            "games_abandoned": self.games_abandoned,
+            "connections": len(self._connections),
+            "engines": self.pool.size,
+            "engine_restarts": self.pool.restarts,
+            "pending": scheduler.pending if scheduler else 0,
+            "searches": searches,
+            "avg_wait_ms": round(scheduler.wait_time / searches * 1000, 2) if searches else 0.0,
+            "avg_search_ms": round(scheduler.search_time / searches * 1000, 2) if searches else 0.0,
+        }
+
+    async def _handle_client(self, reader, writer):
+        connection = _Connection(next(self._connection_ids), reader, writer)
+        self._connections[connection.id] = connection
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break # Dong qua dai hoac ket noi bi dat
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("message must be an object")
+                except ValueError as e:
+                    await connection.send({"type": "error", "code": "bad_request", "message": str(e)})
+                    continue
+                await self._handle(connection, message)
+        finally:
+            await self._disconnect(connection)
+            writer.close()
+
+    async def _handle(self, connection, message):
+        op = message.get("op")
+        try:
+            if op == "search":
+                if self.scheduler.pending >= self.max_pending:
+                    raise ProtocolError("busy", "search queue is full, retry later")
+                # Dung doc ket noi khi da co qua nhieu yeu cau dang chay (backpressure)
+                await connection.inflight.acquire()
+                connection.spawn(self._search(connection, message))
+                return
+            handler = {
+                "new_game": self._new_game,
+                "move": self._move,
+                "give_up": self._give_up,
+                "state": self._state,
+                "stats": self._stats,
+            }.get(op)
+            if handler is None:
+                raise ProtocolError("bad_request", f"unknown op: {op!r}")
+            reply = handler(connection, message)
+        except ProtocolError as e:
+            reply = {"type": "error", "code": e.code, "message": str(e)}
+        if "id" in message:
+            reply["id"] = message["id"]
+        await connection.send(reply)
+
+    def _game(self, connection, message):
+        game = connection.games.get(message.get("game"))
+        if game is None:
+            raise ProtocolError("unknown_game", f"unknown game: {message.get('game')!r}")
+        return game
+
+    def _new_game(self, connection, message):
+        if len(self.games) >= self.max_games or len(connection.games) >= self.max_games_per_client:
+            raise ProtocolError("busy", "too many games, retry later")
+        color = message.get("color", "white")
+        if color not in ("white", "black"):
+            raise ProtocolError("bad_request", f"invalid color: {color!r}")
+        difficulty = message.get("difficulty", "Medium")
+        if difficulty not in PROFILES:
+            raise ProtocolError("bad_request", f"invalid difficulty: {difficulty!r}")
+        time_control = self.time_control
+        if message.get("time_control"):
+            try:
+                time_control = TimeControl.parse(str(message["time_control"]))
+            except ValueError:
+                raise ProtocolError("bad_request", f"invalid time control: {message['time_control']!r}")
+
+        # Cung luong choi voi giao dien: Start -> chon mau -> chon do kho
+        session = Session(time_control)
+        session.start()
+        session.choose_color(chess.WHITE if color == "white" else chess.BLACK)
+        session.choose_difficulty(difficulty)
+        game = ServerGame(next(self._game_ids), session)
+        connection.games[game.id] = game
+        self.games[game.id] = game
+        self._after_move(connection, game)
+        return {"type": "started", **game.state()}
+
+    def _move(self, connection, message):
+        game = self._game(connection, message)
+        board = game.session.game.board
+        if game.session.phase != Phase.PLAYING or not game.session.game.is_user_turn():
+            raise ProtocolError("not_your_turn", "it is not your turn")
+        try:
+            move = chess.Move.from_uci(str(message.get("move")))
+        except ValueError:
+            raise ProtocolError("illegal_move", f"invalid move: {message.get('move')!r}")
+        if not board.is_legal(move):
+            raise ProtocolError("illegal_move", f"illegal move: {move.uci()}")
+        game.session.game.push_move(move)
+        self._after_move(connection, game)
+        return {"type": "state", **game.state()}
+
+    def _give_up(self, connection, message):
+        game = self._game(connection, message)
+        if game.session.phase != Phase.PLAYING:
+            raise ProtocolError("bad_request", "game is not in progress")
+        game.session.ask_give_up()
+        game.session.give_up()
+        self._end_game(connection, game, notify=False)
+        return self._game_over_message(game)
+
+    def _state(self, connection, message):
+        return {"type": "state", **self._game(connection, message).state()}
+
+    def _stats(self, connection, message):
+        return {"type": "stats", **self.stats()}
+
+    def _after_move(self, connection, game):
+        """Sau mỗi nước đi: kết thúc ván nếu đã hết, hoặc giao lượt cho bot."""
+        session = game.session
+        if session.game.is_over():
+            session.finish()
+            self._end_game(connection, game)
+        elif session.bot_should_move() and game.bot_task is None:
+            game.bot_task = connection.spawn(self._bot_move(connection, game))
+
+    async def _bot_move(self, connection, game):
+        session = game.session
+        try:
+            move, info = await self.scheduler.search(connection.id, session.game.board.copy(),
+                                                     session.game.engine_limit(), session.game.profile.options())
+        except chess.engine.EngineError as e:
+            game.bot_task = None
+            if game.id not in self.games:
+                return
+            game.bot_failures += 1
+            if game.bot_failures >= BOT_MAX_FAILURES:
+                # Engine loi lien tiep: huy van thay vi de client cho mai luot cua bot
+                session.finish()
+                session.game_over_message = f"Engine error: {e}"
+                self._end_game(connection, game, reason="engine_error")
+                return
+            await connection.send({"type": "error", "code": "engine_error", "game": game.id, "message": str(e)})
+            self._after_move(connection, game) # Thu lai (pool da khoi dong lai engine loi)
+            return
+        game.bot_task = None
+        game.bot_failures = 0
+        if game.id not in self.games or not session.bot_should_move():
+            return # Van da ket thuc (bo cuoc, het gio, ngat ket noi) trong luc bot suy nghi
+        session.game.push_move(move, by_engine=True)
+        await connection.send({"type": "bot_move", "move": move.uci(), "depth": info.get("depth"), **game.state()})
+        self._after_move(connection, game)
+
+    async def _search(self, connection, message):
+        try:
+            reply = await self._run_search(connection, message)
+        except ProtocolError as e:
+            reply = {"type": "error", "code": e.code, "message": str(e)}
+        except chess.engine.EngineError as e:
+            reply = {"type": "error", "code": "engine_error", "message": str(e)}
+        finally:
+            connection.inflight.release()
+        if "id" in message:
+            reply["id"] = message["id"]
+        await connection.send(reply)
+
+    async def _run_search(self, connection, message):
+        try:
+            board = chess.Board(message.get("fen") or chess.STARTING_FEN)
+            for uci in message.get("moves", []):
+                board.push_uci(uci)
+            limit_spec = message.get("limit") or {}
+            limit = chess.engine.Limit(
+                time=min(float(limit_spec.get("time") or MAX_SEARCH_TIME), MAX_SEARCH_TIME),
+                nodes=min(int(limit_spec["nodes"]), MAX_SEARCH_NODES) if limit_spec.get("nodes") else None,
+                depth=min(int(limit_spec["depth"]), MAX_SEARCH_DEPTH) if limit_spec.get("depth") else None)
+            options = {name: value for name, value in (message.get("options") or {}).items() if name in SEARCH_OPTIONS}
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ProtocolError("bad_request", f"invalid search request: {e}")
+        for name, value in options.items():
+            # bool la lop con cua int nen so sanh dung kieu
+            if type(value) is not SEARCH_OPTIONS[name]:
+                raise ProtocolError("bad_request", f"invalid value for option {name}: {value!r}")
+        if board.is_game_over():
+            raise ProtocolError("bad_request", "position is already over")
+        move, info = await self.scheduler.search(connection.id, board, limit, options)
+        return {"type": "bestmove", "move": move.uci(), "depth": info.get("depth"),
+                "pv": [pv_move.uci() for pv_move in info.get("pv", [])]}
+
+    def _game_over_message(self, game, reason=None):
+        message = {"type": "game_over", "result": game.session.game.result(),
+                   "message": game.session.game_over_message, **game.state()}
+        if reason is not None:
+            message["reason"] = reason
+        return message
+
+    def _end_game(self, connection, game, notify=True, comment=None, reason=None, abandoned=False):
+        """Kết thúc một ván: dừng đồng hồ, huỷ lượt của bot, ghi PGN và báo cho client.
+
+        ``reason`` (ví dụ ``"engine_error"``) được gửi kèm ``game_over`` khi ván bị huỷ
+        mà chưa có kết quả; ván bị bỏ dở do client ngắt kết nối (``abandoned``) được đếm
+        riêng với các ván đã chơi xong.
+        """
+        self.games.pop(game.id, None)
+        connection.games.pop(game.id, None)
+        if abandoned:
+            self.games_abandoned += 1
+        else:
+            self.games_played += 1
+        session_game = game.session.game
+        if session_game.clock is not None:
+            session_game.clock.stop()
+        if game.bot_task is not None:
+            game.bot_task.cancel()
+            game.bot_task = None
+        self._record(game, comment if comment is not None else game.session.game_over_message)
+        if notify:
+            connection.spawn(connection.send(self._game_over_message(game, reason)))
+
+    def _record(self, game, comment):
+        session_game = game.session.game
+        if self.history_folder is None or not session_game.board.move_stack:
+            return
+        headers = {
+            "Event": "Server game",
+            "Site": "ChessGame server",
+            "Date": game.started_at.strftime("%Y.%m.%d"),
+            "Round": "-",
+            "White": session_game.player_name(chess.WHITE),
+            "Black": session_game.player_name(chess.BLACK),
+            "Difficulty": session_game.difficulty,
+            "SkillLevel": session_game.skill_level,
+            "Time": game.started_at.strftime("%H:%M:%S"),
+        }
+        if session_game.clock is not None:
+            time_control = session_game.clock.time_control
+            headers["TimeControl"] = f"{time_control.base:g}+{time_control.increment:g}"
+        path = os.path.join(self.history_folder, f"game_history_{self._stamp}_{game.id:05d}.pgn")
+        text = build_pgn(headers, session_game.board.move_stack, session_game.result(), comment)
+        # Ghi file tren luong khac de khong chan event loop; close() cho cac lan ghi con dang chay
+        write = asyncio.get_running_loop().run_in_executor(None, self._write_history, path, text)
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    def _write_history(self, path, text):
+        try:
+            os.makedirs(self.history_folder, exist_ok=True)
+            write_file(path, text, sync=True)
+        except OSError as e:
+            print(f"Loi khi ghi lich su {path}: {e}")
+
+    async def _disconnect(self, connection):
+        if self._connections.pop(connection.id, None) is None:
+            return
+        for game in list(connection.games.values()):
+            self._end_game(connection, game, notify=False, comment="Client disconnected", abandoned=True)
+        for task in list(connection.tasks):
+            task.cancel()
+
+    async def _watch_clocks(self):
+        while True:
+            await asyncio.sleep(CLOCK_CHECK_INTERVAL)
+            for connection in list(self._connections.values()):
+                for game in list(connection.games.values()):
+                    session = game.session
+                    if session.phase == Phase.PLAYING and session.game.flagged() is not None:
+                        session.finish()
+                        self._end_game(connection, game)
+
+
+async def play_scripted_game(host, port, difficulty, color, rng, max_plies=200):
+    """Chơi một ván qua máy chủ, bên người chơi đi các nước ngẫu nhiên.
+
+    Args:
+        host (str): Địa chỉ máy chủ.
+        port (int): Cổng máy chủ.
+        difficulty (str): Độ khó của bot.
+        color (str): Màu của client (``"white"`` hoặc ``"black"``).
+        rng (random.Random): Bộ sinh số ngẫu nhiên chọn nước đi.
+        max_plies (int): Số nửa nước tối đa; vượt quá thì client bỏ cuộc.
+
+    Returns:
+        dict: ``result``, ``message``, ``plies`` và ``latencies`` (thời gian chờ mỗi nước của bot, giây).
+    """
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+    latencies = []
+    try:
+        writer.write((json.dumps({"op": "new_game", "color": color, "difficulty": difficulty}) + "\n").encode())
+        sent_at = time.perf_counter()
+        while True:
+            message = await read_message(reader)
+            kind = message["type"]
+            if kind == "error" and message["code"] == "engine_error":
+                continue # May chu tu thu lai, hoac huy van bang game_over
+            if kind == "error":
+                raise RuntimeError(f"{message['code']}: {message['message']}")
+            if kind == "game_over":
+                return {"result": message["result"], "message": message["message"],
+                        "plies": len(message["moves"]), "latencies": latencies}
+            if kind == "bot_move":
+                latencies.append(time.perf_counter() - sent_at)
+            board = chess.Board(message["fen"])
+            if message["phase"] != Phase.PLAYING or message["turn"] != color or kind == "state":
+                continue
+            if len(message["moves"]) >= max_plies:
+                request = {"op": "give_up", "game": message["game"]}
+            else:
+                request = {"op": "move", "game": message["game"], "move": rng.choice(list(board.legal_moves)).uci()}
+            writer.write((json.dumps(request) + "\n").encode())
+            await writer.drain()
+            sent_at = time.perf_counter()
+    finally:
+        writer.close()
+
+
+async def run_client(host, port, games, difficulty, concurrency, seed=None):
+    """Chạy nhiều ván đồng thời qua máy chủ và in thống kê (dùng để thử máy chủ trên máy cục bộ).
+
+    Args:
+        host (str): Địa chỉ máy chủ.
+        port (int): Cổng máy chủ.
+        games (int): Tổng số ván.
+        difficulty (str): Độ khó của bot.
+        concurrency (int): Số ván chơi cùng lúc (mỗi ván một kết nối).
+        seed (int or None): Hạt giống ngẫu nhiên để tái lập các nước đi.
+
+    Returns:
+        list: Kết quả của từng ván (như play_scripted_game).
+    """
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(index):
+        async with semaphore:
+            color = "white" if index % 2 == 0 else "black"
+            while True:
+                try:
+                    result = await play_scripted_game(host, port, difficulty, color, random.Random(rng.random()))
+                except RuntimeError as e:
+                    if str(e).startswith("busy"):
+                        await asyncio.sleep(0.1) # May chu day: thu lai sau
+                        continue
+                    raise
+                results.append(result)
+                print(f"[{len(results)}/{games}] game {index} ({color}): {result['message'] or result['result']} "
+                      f"({result['plies']} plies)")
+                return
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(games)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"Bot moves: {len(latencies)}, latency p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms")
+    print(f"{games} games in {elapsed:.1f}s ({games / elapsed:.2f} games/s)")
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"op": "stats"}\n')
+    print(f"Server stats: {await read_message(reader)}")
+    writer.close()
+    return results
+
+
+async def _serve(args):
+    server = GameServer(args.engine, engines=args.engines, max_games=args.max_games,
+                        max_games_per_client=args.max_games_per_client, max_pending=args.max_pending,
+                        history_folder=None if args.no_history else args.history,
+                        time_control=args.time_control,
+                        resources=EngineResources(engines=args.engines, fair_share=not args.no_fair_share,
+                                                  threads=args.threads, hash_mb=args.hash, hash_policy=args.hash_policy,
+                                                  numa_policy=args.numa))
+    host, port = await server.start(args.host, args.port)
+    print(f"ChessGame server listening on {host}:{port} ({args.engines} engines: {server.resources.describe()})")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của máy chủ và client thử nghiệm.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="ChessGame multi-game server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="chay may chu")
+    serve.add_argument("--host", default=DEFAULT_HOST)
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--engine", default=STOCKFISH_PATH, help="duong dan toi Stockfish")
+    serve.add_argument("--engines", type=int, default=os.cpu_count() or 1, help="so tien trinh Stockfish dung chung")
+    serve.add_argument("--max-games", type=int, default=500, help="so van dang choi toi da")
+    serve.add_argument("--max-games-per-client", type=int, default=16, help="so van dang choi toi da moi ket noi")
+    serve.add_argument("--max-pending", type=int, default=256, help="so yeu cau search dang cho toi da")
+    serve.add_argument("--time-control", type=TimeControl.parse, default=None, help='the thuc thoi gian mac dinh, vi du "5+3"')
+    serve.add_argument("--history", default=os.path.join("history", "server"), help="thu muc ghi lich su")
+    serve.add_argument("--no-history", action="store_true", help="khong ghi lich su cac van")
+    serve.add_argument("--threads", type=int, default=None, help="so luong moi engine (mac dinh: chia deu so nhan CPU)")
+    serve.add_argument("--hash", type=int, default=None, metavar="MB", help="bang bam moi engine (mac dinh: theo RAM)")
+    serve.add_argument("--hash-policy", choices=HASH_POLICIES, default="keep",
+                       help="keep: giu bang bam giua cac lan tim; clear: gui ucinewgame sau moi lan tim")
+    serve.add_argument("--numa", default=None, metavar="POLICY", help='tuy chon NumaPolicy cua Stockfish, vi du "auto"')
+    serve.add_argument("--no-fair-share", action="store_true",
+                       help="moi engine dung toan bo so nhan CPU (co the dung qua so nhan khi nhieu van cung tim)")
+    client = commands.add_parser("client", help="choi nhieu van ngau nhien qua may chu (thu nghiem)")
+    client.add_argument("--host", default=DEFAULT_HOST)
+    client.add_argument("--port", type=int, default=DEFAULT_PORT)
+    client.add_argument("--games", type=int, default=10, help="tong so van")
+    client.add_argument("--concurrency", type=int, default=100, help="so van choi cung luc")
+    client.add_argument("--difficulty", choices=list(PROFILES), default="Beginner")
+    client.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy máy chủ hoặc client thử nghiệm từ dòng lệnh."""
+    args = parse_args(argv)
+    try:
+        if args.command == "serve":
+            asyncio.run(_serve(args))
+        else:
+            asyncio.run(run_client(args.host, args.port, args.games, args.difficulty, args.concurrency, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""Biên dịch Stockfish cho đúng kiến trúc CPU của máy và tìm engine khi chạy.
+
+Mã nguồn Stockfish đi kèm dự án (thư mục ``stockfish/src``). Module này:
+
+- phát hiện các tập lệnh CPU (avx2, bmi2, avx512, vnni...) và chọn ARCH tốt nhất,
+  theo cùng quy tắc với ``stockfish/scripts/get_native_properties.sh``;
+- biên dịch bằng ``make build`` (hoặc ``profile-build``) với ARCH đó, mạng NNUE
+  được tải bằng ``make net`` và nhúng vào file thực thi;
+- lưu file thực thi vào ``stockfish/bin/stockfish-<arch>`` để các lần sau dùng lại,
+  và nếu bản cho kiến trúc gốc không biên dịch được thì dùng bản phổ thông (lỗi được
+  ghi lại để các lần sau không biên dịch lại ARCH đó, trừ khi có ``--force``);
+- chạy ``stockfish bench`` để đo số node mỗi giây của bản vừa biên dịch.
+
+Khi chạy trò chơi, ``find_stockfish`` chọn engine theo thứ tự: biến môi trường
+``STOCKFISH_PATH``, file ``stockfish\\stockfish.exe`` có sẵn (Windows), bản đã biên dịch
+tốt nhất mà CPU hiện tại chạy được, rồi ``stockfish`` trong PATH.
+
+Ví dụ::
+
+    python stockfish_build.py detect
+    python stockfish_build.py build --jobs 8
+    python stockfish_build.py bench
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+STOCKFISH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stockfish")
+SOURCE_DIR = os.path.join(STOCKFISH_DIR, "src")
+BIN_DIR = os.path.join(STOCKFISH_DIR, "bin")
+WINDOWS_BINARY = os.path.join("stockfish", "stockfish.exe") # Ban Windows co san trong du an
+
+# Cac ARCH x86-64 theo thu tu tu nhanh den pho thong, kem cac tap lenh CPU can co
+X86_64_ARCHS = [
+    ("x86-64-vnni256", ("avx512vnni", "avx512dq", "avx512f", "avx512bw", "avx512vl")),
+    ("x86-64-avx512", ("avx512f", "avx512bw")),
+    ("x86-64-bmi2", ("bmi2",)),
+    ("x86-64-avx2", ("avx2",)),
+    ("x86-64-sse41-popcnt", ("sse41", "popcnt")),
+    ("x86-64", ()),
+]
+ARMV8_ARCHS = [("armv8-dotprod", ("asimddp",)), ("armv8", ())]
+
+
+def cpu_flags():
+    """Đọc danh sách tập lệnh CPU từ ``/proc/cpuinfo``.
+
+    Tên được chuẩn hoá như trong get_native_properties.sh (bỏ dấu ``_`` và ``.``,
+    ví dụ ``sse4_1`` -> ``sse41``).
+
+    Returns:
+        set: Các tập lệnh CPU, rỗng nếu không đọc được (ví dụ trên Windows).
+    """
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = line.partition(":")[2]
+    except OSError:
+        return set()
+    return {flag.replace("_", "").replace(".", "") for flag in flags.split()}
+
+
+def _is_zen_1_2():
+    # AMD Zen 1/2 co pext/pdep rat cham, khong nen dung ban bmi2
+    vendor = family = None
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("vendor_id"):
+                    vendor = line.partition(":")[2].strip()
+                elif line.startswith("cpu family"):
+                    family = line.partition(":")[2].strip()
+                if vendor and family:
+                    break
+    except OSError:
+        return False
+    return vendor == "AuthenticAMD" and family == "23"
+
+
+def candidate_archs(flags=None, machine=None):
+    """Liệt kê các ARCH mà CPU hiện tại chạy được, tốt nhất trước.
+
+    Args:
+        flags (set or None): Tập lệnh CPU, mặc định đọc bằng cpu_flags.
+        machine (str or None): Kiến trúc máy (``platform.machine()``).
+
+    Returns:
+        list: Tên các ARCH của Makefile Stockfish.
+    """
+    flags = cpu_flags() if flags is None else flags
+    machine = (machine or platform.machine()).lower()
+    if machine in ("x86_64", "amd64"):
+        zen_1_2 = _is_zen_1_2()
+        return [arch for arch, required in X86_64_ARCHS
+                if all(flag in flags for flag in required) and not (arch == "x86-64-bmi2" and zen_1_2)]
+    if machine in ("aarch64", "arm64"):
+        if sys.platform == "darwin":
+            return ["apple-silicon", "armv8"]
+        return [arch for arch, required in ARMV8_ARCHS if all(flag in flags for flag in required)]
+    if machine in ("i386", "i686", "x86"):
+        return ["x86-32"]
+    return ["general-64" if sys.maxsize > 2 ** 32 else "general-32"]
+
+
+def native_arch():
+    """str: ARCH tốt nhất cho CPU hiện tại."""
+    return candidate_archs()[0]
+
+
+def portable_arch():
+    """str: ARCH phổ thông nhất cùng họ với CPU hiện tại (dùng khi bản gốc không biên dịch được)."""
+    return candidate_archs()[-1]
+
+
+def binary_path(arch):
+    """Đường dẫn file thực thi đã biên dịch cho một ARCH.
+
+    Args:
+        arch (str): Tên ARCH.
+
+    Returns:
+        str: Đường dẫn trong ``stockfish/bin``.
+    """
+    suffix = ".exe" if sys.platform == "win32" else ""
+    return os.path.join(BIN_DIR, f"stockfish-{arch}{suffix}")
+
+
+def build(arch=None, jobs=None, profile=False, force=False, compiler=None):
+    """Biên dịch Stockfish từ mã nguồn đi kèm và lưu vào ``stockfish/bin``.
+
+    Nếu không biên dịch được cho ARCH đã chọn, thử lại với ARCH phổ thông. ARCH đã
+    biên dịch lỗi (với cùng trình biên dịch) được ghi vào file đánh dấu cạnh file thực
+    thi và bị bỏ qua ở các lần sau, trừ khi ``force`` là True.
+
+    Args:
+        arch (str or None): ARCH cần biên dịch, mặc định là native_arch().
+        jobs (int or None): Số tiến trình biên dịch song song, mặc định bằng số lõi CPU.
+        profile (bool): Dùng ``profile-build`` (chậm hơn khi biên dịch, engine nhanh hơn).
+        force (bool): Biên dịch lại kể cả khi đã có file trong ``stockfish/bin`` hoặc
+            ARCH đã từng biên dịch lỗi.
+        compiler (str or None): Giá trị COMP của Makefile (gcc, clang...).
+
+    Returns:
+        str: Đường dẫn file thực thi.
+
+    Raises:
+        RuntimeError: Nếu không tải được mạng NNUE hoặc không biên dịch được cả
+            bản gốc lẫn bản phổ thông.
+    """
+    archs = [arch or native_arch()]
+    if portable_arch() not in archs:
+        archs.append(portable_arch())
+    if not force:
+        # ARCH pho thong luon duoc thu lai, chi bo qua ARCH goc da loi
+        failed = [candidate for candidate in archs[:-1] if _build_failed(candidate, compiler)]
+        for candidate in failed:
+            print(f"Bo qua ARCH={candidate}: lan bien dich truoc bi loi (dung --force de thu lai)")
+        archs = [candidate for candidate in archs if candidate not in failed]
+    path = binary_path(archs[0])
+    if os.path.exists(path) and not force:
+        print(f"Da co ban bien dich {path}")
+        return path
+    download_networks()
+    for candidate in archs:
+        try:
+            return _build_arch(candidate, jobs or os.cpu_count() or 1, profile, compiler)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Loi khi bien dich ARCH={candidate}: {e}")
+            _write_failure(candidate, compiler, e)
+    raise RuntimeError(f"Khong bien dich duoc Stockfish (da thu: {', '.join(archs)})")
+
+
+def network_files():
+    """Tên các file mạng NNUE mà mã nguồn Stockfish đi kèm cần (đọc từ ``evaluate.h``).
+
+    Returns:
+        list: Tên file, ví dụ ``["nn-1c0000000000.nnue", ...]``.
+    """
+    with open(os.path.join(SOURCE_DIR, "evaluate.h"), encoding="utf-8") as f:
+        return re.findall(r'#define EvalFileDefaultName\w*\s+"([^"]+)"', f.read())
+
+
+def download_networks():
+    """Tải các mạng NNUE bằng ``make net`` và kiểm tra chúng không rỗng.
+
+    ``net.sh`` có thể để lại file rỗng khi tải thất bại mà ``make`` vẫn chạy tiếp,
+    khi đó file thực thi nhúng mạng rỗng và không chơi được, nên phải kiểm tra trước.
+
+    Raises:
+        RuntimeError: Nếu có mạng không tải được.
+    """
+    subprocess.run(["make", "net"], cwd=SOURCE_DIR, check=False)
+    missing = []
+    for name in network_files():
+        path = os.path.join(SOURCE_DIR, name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            missing.append(name)
+    if missing:
+        raise RuntimeError(f"Khong tai duoc mang NNUE: {', '.join(missing)} "
+                           f"(hay chep chung vao {SOURCE_DIR} roi chay lai)")
+
+
+def _build_arch(arch, jobs, profile, compiler):
+    command = ["make", f"-j{jobs}", "profile-build" if profile else "build", f"ARCH={arch}"]
+    if compiler:
+        command.append(f"COMP={compiler}")
+    print(f"Bien dich Stockfish: {' '.join(command)}")
+    started = time.perf_counter()
+    # Xoa file .o cua lan bien dich truoc (co the la ARCH khac)
+    subprocess.run(["make", "clean"], cwd=SOURCE_DIR, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(command, cwd=SOURCE_DIR, check=True)
+    built = os.path.join(SOURCE_DIR, "stockfish.exe" if sys.platform == "win32" else "stockfish")
+    os.makedirs(BIN_DIR, exist_ok=True)
+    path = binary_path(arch)
+    shutil.copy2(built, path)
+    print(f"Da bien dich {path} trong {time.perf_counter() - started:.0f}s")
+    _write_manifest(arch, {"arch": arch, "profile_build": profile, "built_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(_failure_path(arch))
+    return path
+
+
+def _failure_path(arch):
+    return binary_path(arch) + ".failed"
+
+
+def _write_failure(arch, compiler, error):
+    os.makedirs(BIN_DIR, exist_ok=True)
+    with open(_failure_path(arch), "w", encoding="utf-8") as f:
+        json.dump({"arch": arch, "compiler": compiler, "error": str(error),
+                   "failed_at": time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+
+
+def _build_failed(arch, compiler):
+    # Chi tinh loi cua cung trinh bien dich: doi COMP co the bien dich duoc
+    try:
+        with open(_failure_path(arch), encoding="utf-8") as f:
+            return json.load(f).get("compiler") == compiler
+    except (OSError, ValueError):
+        return False
+
+
+def _manifest_path(arch):
+    return binary_path(arch) + ".json"
+
+
+def _write_manifest(arch, data):
+    with open(_manifest_path(arch), "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def read_manifest(arch):
+    """Đọc thông tin của một bản biên dịch (ARCH, thời điểm biên dịch, kết quả bench).
+
+    Args:
+        arch (str): Tên ARCH.
+
+    Returns:
+        dict: Thông tin đã lưu, rỗng nếu chưa có.
+    """
+    try:
+        with open(_manifest_path(arch), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def find_stockfish():
+    """Tìm file thực thi Stockfish phù hợp nhất với máy hiện tại.
+
+    Returns:
+        str or None: Đường dẫn engine, None nếu không tìm thấy.
+    """
+    path = os.environ.get("STOCKFISH_PATH")
+    if path:
+        return path
+    if sys.platform == "win32" and os.path.exists(WINDOWS_BINARY):
+        return WINDOWS_BINARY
+    for arch in candidate_archs():
+        path = binary_path(arch)
+        if os.path.exists(path):
+            return path
+    return shutil.which("stockfish")
+
+
+def bench_nps(engine_path, timeout=300):
+    """Chạy ``stockfish bench`` và đọc số node mỗi giây.
+
+    Args:
+        engine_path (str): Đường dẫn engine.
+        timeout (float): Thời gian tối đa (giây) cho lệnh bench.
+
+    Returns:
+        int: Số node mỗi giây.
+
+    Raises:
+        RuntimeError: Nếu không đọc được kết quả bench.
+    """
+    completed = subprocess.run([engine_path, "bench"], stdin=subprocess.DEVNULL, capture_output=True,
+                               text=True, timeout=timeout)
+    # Stockfish in ket qua bench ra stderr
+    match = re.search(r"Nodes/second\s*:\s*(\d+)", completed.stderr + completed.stdout)
+    if match is None:
+        raise RuntimeError(f"Khong doc duoc ket qua bench cua {engine_path}")
+    return int(match.group(1))
+
+
+def parse_args(argv=None):
+    """Đọc các tham số dòng lệnh của công cụ biên dịch.
+
+    Args:
+        argv (list or None): Danh sách tham số, mặc định lấy từ sys.argv.
+
+    Returns:
+        argparse.Namespace: Các tham số đã được phân tích.
+    """
+    parser = argparse.ArgumentParser(description="Build and locate a native Stockfish")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("detect", help="in cac ARCH ma CPU nay chay duoc")
+    build_command = commands.add_parser("build", help="bien dich Stockfish cho CPU nay")
+    build_command.add_argument("--arch", default=None, help="ARCH can bien dich (mac dinh: tot nhat cho CPU nay)")
+    build_command.add_argument("--jobs", type=int, default=None, help="so tien trinh bien dich song song")
+    build_command.add_argument("--profile", action="store_true", help="dung profile-build (PGO)")
+    build_command.add_argument("--force", action="store_true", help="bien dich lai ke ca khi da co hoac da tung bien dich loi")
+    build_command.add_argument("--comp", default=None, help="trinh bien dich (gcc, clang...)")
+    build_command.add_argument("--no-bench", action="store_true", help="khong chay bench sau khi bien dich")
+    bench_command = commands.add_parser("bench", help="do so node moi giay cua engine")
+    bench_command.add_argument("--engine", default=None, help="duong dan engine (mac dinh: find_stockfish)")
+    commands.add_parser("locate", help="in duong dan engine se duoc dung")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy công cụ biên dịch từ dòng lệnh."""
+    args = parse_args(argv)
+    if args.command == "detect":
+        archs = candidate_archs()
+        print(f"Native ARCH: {archs[0]} (portable: {archs[-1]})")
+        print(f"Supported: {', '.join(archs)}")
+    elif args.command == "build":
+        path = build(args.arch, args.jobs, args.profile, args.force, args.comp)
+        if not args.no_bench:
+            nps = bench_nps(path)
+            arch = os.path.basename(path).removeprefix("stockfish-").removesuffix(".exe")
+            manifest = read_manifest(arch)
+            manifest["bench_nps"] = nps
+            _write_manifest(arch, manifest)
+            print(f"{path}: {nps} nodes/second")
+    elif args.command == "bench":
+        path = args.engine or find_stockfish()
+        if path is None:
+            sys.exit("Khong tim thay Stockfish, hay chay: python stockfish_build.py build")
+        print(f"{path}: {bench_nps(path)} nodes/second")
+    else:
+        print(find_stockfish() or "Khong tim thay Stockfish")
+
+
+if __name__ == "__main__":
+    main()
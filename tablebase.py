@@ -0,0 +1,220 @@
+"""Bảng tàn cuộc Syzygy cho bot.
+
+Khi trên bàn cờ còn ít quân (không quá số quân của các bảng đã tải), kết quả của
+thế cờ với nước đi hoàn hảo có sẵn trong bảng: thắng, hoà hay thua (WDL) và số
+nửa nước tới nước bắt quân hoặc đi tốt tiếp theo (DTZ). Bot chọn nước đi thẳng từ
+bảng thay vì hỏi engine, nên các nước tàn cuộc được trả lời ngay.
+
+Mỗi độ khó có một cấu hình riêng (TablebaseProfile). Độ khó cao chơi nước tối ưu
+theo DTZ; độ khó thấp chọn ngẫu nhiên một nước giữ nguyên kết quả của thế cờ (thắng
+vẫn thắng trong giới hạn luật 50 nước, nhưng chậm hơn). Bảng cũng dùng để kết
+thúc ván sớm khi kết quả đã được định đoạt (``result``).
+
+Các bảng tải từ một thư mục (hoặc nhiều thư mục ngăn cách bởi ``os.pathsep``, giống
+tuỳ chọn ``SyzygyPath`` của Stockfish) chứa các file ``.rtbw`` và ``.rtbz``.
+"""
+import argparse
+import os
+import random
+
+import chess
+import chess.syzygy
+
+FIFTY_MOVE_PLIES = 100 # So nua nuoc cua luat 50 nuoc
+
+
+class TablebaseProfile:
+    """Cấu hình dùng bảng tàn cuộc cho một độ khó.
+
+    Args:
+        optimal (bool): True để chơi nước tối ưu theo DTZ, False để chọn ngẫu nhiên
+            một nước giữ nguyên kết quả của thế cờ.
+    """
+
+    def __init__(self, optimal=True):
+        self.optimal = optimal
+
+
+# Cau hinh bang tan cuoc theo muc do kho (cung ten voi difficulty.PROFILES)
+TABLEBASE_PROFILES = {
+    "Beginner": TablebaseProfile(optimal=False),
+    "Easy": TablebaseProfile(optimal=False),
+    "Medium": TablebaseProfile(),
+    "Hard": TablebaseProfile(),
+    "Master": TablebaseProfile(),
+}
+
+
+def table_pieces(name):
+    """Số quân của một bảng theo tên, ví dụ ``KRPvKR`` là 5 quân."""
+    return len(name) - 1
+
+
+class Tablebase:
+    """Đọc các bảng tàn cuộc Syzygy và chọn nước đi theo cấu hình độ khó.
+
+    Args:
+        path (str): Thư mục chứa các bảng (nhiều thư mục ngăn cách bởi ``os.pathsep``).
+        profile (TablebaseProfile or None): Cấu hình đang dùng, None để bot không
+            chọn nước từ bảng (vẫn dùng được ``result``).
+        rng (random.Random or None): Bộ sinh số ngẫu nhiên (để tái lập kết quả khi thử nghiệm).
+
+    Attributes:
+        max_pieces (int): Số quân tối đa (tính cả hai vua) của các bảng đã tải, 0 nếu không có bảng nào.
+        moves_played (int): Số nước đi đã chọn từ bảng kể từ lần gọi ``reset_stats`` gần nhất.
+
+    Raises:
+        OSError: Nếu không đọc được thư mục.
+    """
+
+    def __init__(self, path, profile=None, rng=None):
+        self.path = path
+        self.profile = profile
+        self.moves_played = 0
+        self._rng = rng or random.Random()
+        self._tables = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            self._tables.add_directory(directory)
+        # Chi tinh cac bang co du WDL va DTZ
+        names = set(self._tables.wdl) & set(self._tables.dtz)
+        self.max_pieces = max((table_pieces(name) for name in names), default=0)
+
+    def covers(self, board):
+        """bool: True nếu thế cờ đủ ít quân để tra bảng (Syzygy không hỗ trợ quyền nhập thành)."""
+        return chess.popcount(board.occupied) <= self.max_pieces and not board.castling_rights
+
+    def probe(self, board):
+        """Tra kết quả của thế cờ với nước đi hoàn hảo, tính cả luật 50 nước.
+
+        Args:
+            board (chess.Board): Thế cờ cần tra.
+
+        Returns:
+            int or None: 1 nếu bên tới lượt thắng, 0 nếu hoà, -1 nếu thua; None nếu
+            thế cờ không có trong các bảng đã tải.
+        """
+        if not self.covers(board):
+            return None
+        try:
+            wdl = self._tables.probe_wdl(board)
+            if wdl in (-2, 2) and abs(self._tables.probe_dtz(board)) + board.halfmove_clock > FIFTY_MOVE_PLIES:
+                # Khong kip bat quan hoac di tot truoc khi het 50 nuoc: thuc chat la hoa
+                return 0
+        except KeyError:
+            return None
+        return 1 if wdl == 2 else -1 if wdl == -2 else 0
+
+    def result(self, board):
+        """Kết quả của ván theo ký hiệu PGN nếu hai bên chơi hoàn hảo từ thế cờ này.
+
+        Args:
+            board (chess.Board): Thế cờ cần tra.
+
+        Returns:
+            str or None: "1-0", "0-1", "1/2-1/2", None nếu thế cờ không có trong bảng.
+        """
+        score = self.probe(board)
+        if score is None:
+            return None
+        if score == 0:
+            return "1/2-1/2"
+        white_wins = (score > 0) == (board.turn == chess.WHITE)
+        return "1-0" if white_wins else "0-1"
+
+    def rank_moves(self, board):
+        """Xếp hạng các nước đi hợp lệ theo bảng, nước tốt nhất đứng đầu.
+
+        Nước thắng được ưu tiên theo: chiếu hết ngay, bắt quân hoặc đi tốt (đặt lại
+        đếm 50 nước), rồi DTZ nhỏ nhất; nước thua ưu tiên DTZ lớn nhất (kéo dài ván).
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm nước đi.
+
+        Returns:
+            list or None: Các cặp ``(nước đi, kết quả)`` với kết quả 1/0/-1 theo bên đi,
+            None nếu thế cờ không có trong các bảng đã tải.
+        """
+        if self.probe(board) is None:
+            return None
+        ranked = []
+        board = board.copy(stack=False)
+        try:
+            for move in board.legal_moves:
+                zeroing = board.is_zeroing(move)
+                board.push(move)
+                if board.is_checkmate():
+                    key, score = (2, 0, 0), 1
+                else:
+                    score = self.probe(board)
+                    if score is None:
+                        return None
+                    score = -score
+                    dtz = abs(self._tables.probe_dtz(board))
+                    key = (score, zeroing, -dtz) if score > 0 else (score, 0, dtz) if score < 0 else (0, 0, 0)
+                board.pop()
+                ranked.append((key, move, score))
+        except KeyError:
+            # Thieu bang DTZ cho the co sau nuoc di
+            return None
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        return [(move, score) for _, move, score in ranked]
+
+    def choose(self, board):
+        """Chọn nước đi từ bảng cho thế cờ hiện tại.
+
+        Args:
+            board (chess.Board): Thế cờ cần tìm nước đi.
+
+        Returns:
+            chess.Move or None: Nước đi từ bảng, None nếu bảng đang tắt hoặc thế cờ
+            không có trong các bảng đã tải.
+        """
+        profile = self.profile
+        if profile is None or not self.covers(board):
+            return None
+        ranked = self.rank_moves(board)
+        if not ranked:
+            return None
+        move, best = ranked[0]
+        if not profile.optimal:
+            # probe da tinh luat 50 nuoc nen moi nuoc cung ket qua van giu duoc ket qua do
+            move = self._rng.choice([candidate for candidate, score in ranked if score == best])
+        self.moves_played += 1
+        return move
+
+    def reset_stats(self):
+        """Bắt đầu đếm lại số nước đi từ bảng.
+
+        Returns:
+            int: Số nước đi từ bảng trước khi đặt lại.
+        """
+        played, self.moves_played = self.moves_played, 0
+        return played
+
+    def close(self):
+        """Đóng các file bảng đang mở."""
+        self._tables.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tra bang tan cuoc Syzygy")
+    parser.add_argument("fen", help="the co can tra (FEN)")
+    parser.add_argument("--syzygy", default="syzygy", help="thu muc chua cac bang (.rtbw/.rtbz)")
+    args = parser.parse_args()
+    tablebase = Tablebase(args.syzygy, TablebaseProfile())
+    try:
+        board = chess.Board(args.fen)
+        print(f"Tables: up to {tablebase.max_pieces} pieces")
+        ranked = tablebase.rank_moves(board)
+        if ranked is None:
+            print("Position not in tablebase")
+            return
+        print(f"Result: {tablebase.result(board)}")
+        for move, score in ranked:
+            print(f"{board.san(move):8} {('win', 'draw', 'loss')[1 - score]}")
+    finally:
+        tablebase.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import unittest
+
+import chess
+import chess.pgn
+
+from annotate import MATE_SCORE, judge, move_accuracy, terminal_evaluation, win_percent
+
+
+class WinPercentTest(unittest.TestCase):
+    def test_symmetry(self):
+        self.assertEqual(win_percent(0), 50)
+        for centipawns in (50, 300, 900):
+            self.assertAlmostEqual(win_percent(centipawns) + win_percent(-centipawns), 100)
+            self.assertGreater(win_percent(centipawns), win_percent(centipawns - 10))
+
+    def test_clamped(self):
+        self.assertEqual(win_percent(MATE_SCORE), win_percent(1000))
+        self.assertEqual(win_percent(-MATE_SCORE), win_percent(-1000))
+        self.assertLess(win_percent(1000), 100)
+
+    def test_accuracy(self):
+        self.assertAlmostEqual(move_accuracy(60, 60), 100, places=3)
+        self.assertAlmostEqual(move_accuracy(40, 70), 100, places=3) # Nuoc di lam tang kha nang thang
+        self.assertLess(move_accuracy(80, 20), move_accuracy(80, 70))
+
+
+class JudgeTest(unittest.TestCase):
+    def test_thresholds(self):
+        self.assertIsNone(judge(0))
+        self.assertIsNone(judge(4.9))
+        self.assertEqual(judge(5), ("Inaccuracy", chess.pgn.NAG_DUBIOUS_MOVE))
+        self.assertEqual(judge(12), ("Mistake", chess.pgn.NAG_MISTAKE))
+        self.assertEqual(judge(15), ("Blunder", chess.pgn.NAG_BLUNDER))
+        self.assertEqual(judge(100), ("Blunder", chess.pgn.NAG_BLUNDER))
+
+    def test_hanging_queen_is_a_blunder(self):
+        loss = win_percent(50) - win_percent(-850)
+        self.assertEqual(judge(loss)[0], "Blunder")
+
+
+class TerminalEvaluationTest(unittest.TestCase):
+    def test_checkmate(self):
+        board = chess.Board()
+        for uci in ("f2f3", "e7e5", "g2g4", "d8h4"):
+            board.push_uci(uci)
+        self.assertEqual(terminal_evaluation(board), (-MATE_SCORE, 0, None, 0))
+
+    def test_stalemate_and_ongoing(self):
+        self.assertEqual(terminal_evaluation(chess.Board("k7/2Q5/1K6/8/8/8/8/8 b - - 0 1")), (0, None, None, 0))
+        self.assertIsNone(terminal_evaluation(chess.Board()))
+
+
+if __name__ == "__main__":
+    unittest.main()
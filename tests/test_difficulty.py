@@ -0,0 +1,87 @@
+import unittest
+
+import chess
+
+from difficulty import MOVES_TO_GO, PROFILES, GameClock, TimeControl, format_clock
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TimeControlTest(unittest.TestCase):
+    def test_parse(self):
+        time_control = TimeControl.parse("5+3")
+        self.assertEqual((time_control.base, time_control.increment), (300.0, 3.0))
+        self.assertEqual(TimeControl.parse("10").increment, 0.0)
+        self.assertEqual(TimeControl.parse("0.5+1").base, 30.0)
+        self.assertEqual(str(time_control), "5+3")
+
+    def test_parse_invalid(self):
+        for text in ("", "abc", "5+x"):
+            with self.assertRaises(ValueError):
+                TimeControl.parse(text)
+
+
+class GameClockTest(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeTime()
+        self.clock = GameClock(TimeControl(60, 2), now=self.time)
+
+    def test_press_adds_increment_and_switches_sides(self):
+        self.clock.start(chess.WHITE)
+        self.time.now += 10
+        self.assertEqual(self.clock.remaining(chess.WHITE), 50)
+        self.clock.press()
+        self.assertEqual(self.clock.remaining(chess.WHITE), 52)
+        self.assertEqual(self.clock.turn, chess.BLACK)
+        self.time.now += 5
+        self.assertEqual(self.clock.remaining(chess.BLACK), 55)
+        self.assertEqual(self.clock.remaining(chess.WHITE), 52)
+
+    def test_stop(self):
+        self.clock.start(chess.WHITE)
+        self.time.now += 10
+        self.clock.stop()
+        self.time.now += 100
+        self.assertFalse(self.clock.running)
+        self.assertEqual(self.clock.remaining(chess.WHITE), 50)
+        self.assertIsNone(self.clock.flagged())
+
+    def test_flag(self):
+        self.clock.start(chess.BLACK)
+        self.time.now += 61
+        self.assertEqual(self.clock.remaining(chess.BLACK), 0.0)
+        self.assertEqual(self.clock.flagged(), chess.BLACK)
+
+    def test_format_clock(self):
+        self.assertEqual(format_clock(245), "4:05")
+        self.assertEqual(format_clock(9.34), "0:09.3")
+
+
+class DifficultyProfileTest(unittest.TestCase):
+    def test_time_budget_without_clock(self):
+        for profile in PROFILES.values():
+            self.assertEqual(profile.time_budget(), profile.move_time)
+
+    def test_time_budget_with_clock(self):
+        master = PROFILES["Master"]
+        self.assertAlmostEqual(master.time_budget(30, 0.4), 30 / MOVES_TO_GO + 0.3)
+        self.assertEqual(master.time_budget(600, 10), master.move_time) # Khong vuot ngan sach cua muc do kho
+        self.assertEqual(master.time_budget(1.0, 10), 0.5) # Khong dung qua mot nua thoi gian con lai
+        self.assertEqual(master.time_budget(0.0), 0.01)
+
+    def test_options_and_limit(self):
+        beginner = PROFILES["Beginner"]
+        self.assertEqual(beginner.options(), {"Skill Level": 0, "UCI_LimitStrength": True, "UCI_Elo": 1320})
+        self.assertEqual(PROFILES["Hard"].options(), {"Skill Level": 20, "UCI_LimitStrength": False})
+        limit = beginner.limit()
+        self.assertEqual((limit.time, limit.nodes, limit.depth), (beginner.move_time, 2000, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
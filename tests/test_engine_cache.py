@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+import chess
+import chess.engine
+
+from engine_cache import EngineCache, limit_key
+
+LIMIT = chess.engine.Limit(time=0.1, nodes=2000)
+OPTIONS = {"Skill Level": 2, "UCI_LimitStrength": True, "UCI_Elo": 1600}
+
+
+def result(uci):
+    move = chess.Move.from_uci(uci)
+    return move, {"pv": [move], "depth": 5}
+
+
+class EngineCacheTest(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = EngineCache()
+        board = chess.Board()
+        self.assertIsNone(cache.get(board, LIMIT, OPTIONS))
+        cache.put(board, LIMIT, OPTIONS, *result("e2e4"))
+        move, info = cache.get(board, LIMIT, OPTIONS)
+        self.assertEqual(move, chess.Move.from_uci("e2e4"))
+        self.assertEqual(info, {"pv": [move], "depth": 5})
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 1))
+
+    def test_key_separation(self):
+        cache = EngineCache()
+        board = chess.Board()
+        cache.put(board, LIMIT, OPTIONS, *result("e2e4"))
+        self.assertIsNone(cache.get(board, LIMIT, {**OPTIONS, "UCI_Elo": 2000}))
+        self.assertIsNone(cache.get(board, chess.engine.Limit(time=0.1, nodes=20000), OPTIONS))
+        board.push_uci("e2e4")
+        self.assertIsNone(cache.get(board, LIMIT, OPTIONS))
+        # Thu tu cua cac tuy chon khong anh huong khoa
+        self.assertIsNotNone(cache.get(chess.Board(), LIMIT, dict(reversed(list(OPTIONS.items())))))
+
+    def test_resource_options_are_not_in_key(self):
+        cache = EngineCache()
+        cache.put(chess.Board(), LIMIT, {**OPTIONS, "Threads": 1, "Hash": 16}, *result("e2e4"))
+        resources = {"Threads": 8, "Hash": 512, "SyzygyPath": "/opt/syzygy", "NumaPolicy": "auto"}
+        self.assertIsNotNone(cache.get(chess.Board(), LIMIT, {**OPTIONS, **resources}))
+
+    def test_clock_budgets_share_key(self):
+        cache = EngineCache()
+        options = {"Skill Level": 20, "UCI_LimitStrength": False}
+        # Ngan sach thoi gian cua van co dong ho doi sau moi nuoc
+        cache.put(chess.Board(), chess.engine.Limit(time=0.93), options, *result("e2e4"))
+        self.assertIsNotNone(cache.get(chess.Board(), chess.engine.Limit(time=1.17), options))
+        self.assertIsNone(cache.get(chess.Board(), chess.engine.Limit(time=3.0), options))
+
+    def test_limit_key_is_exact_by_default(self):
+        self.assertNotEqual(limit_key(chess.engine.Limit(time=0.93)), limit_key(chess.engine.Limit(time=1.17)))
+
+    def test_lru_eviction(self):
+        cache = EngineCache(max_entries=2)
+        boards = [chess.Board(), chess.Board(), chess.Board()]
+        boards[1].push_uci("e2e4")
+        boards[2].push_uci("d2d4")
+        cache.put(boards[0], LIMIT, OPTIONS, *result("g1f3"))
+        cache.put(boards[1], LIMIT, OPTIONS, *result("e7e5"))
+        cache.get(boards[0], LIMIT, OPTIONS) # boards[0] vua dung: boards[1] bi loai
+        cache.put(boards[2], LIMIT, OPTIONS, *result("d7d5"))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get(boards[0], LIMIT, OPTIONS))
+        self.assertIsNone(cache.get(boards[1], LIMIT, OPTIONS))
+
+    def test_illegal_cached_move_is_a_miss(self):
+        cache = EngineCache()
+        board = chess.Board()
+        cache.put(board, LIMIT, OPTIONS, *result("e7e5"))
+        self.assertIsNone(cache.get(board, LIMIT, OPTIONS))
+
+    def test_sqlite_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "cache", "engine.sqlite")
+            cache = EngineCache(path)
+            cache.put(chess.Board(), LIMIT, OPTIONS, *result("e2e4"))
+            cache.close()
+            cache = EngineCache(path)
+            try:
+                move, info = cache.get(chess.Board(), LIMIT, OPTIONS)
+                self.assertEqual(move, chess.Move.from_uci("e2e4"))
+                self.assertEqual(info["depth"], 5)
+                self.assertEqual(cache.stats.disk_hits, 1)
+                # Lan tra thu hai lay tu bo nho
+                cache.get(chess.Board(), LIMIT, OPTIONS)
+                self.assertEqual(cache.stats.hits, 1)
+            finally:
+                cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
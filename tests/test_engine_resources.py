@@ -0,0 +1,40 @@
+import unittest
+
+from engine_resources import RESOURCE_PROFILES, EngineResources, HostResources, round_hash
+
+HOST = HostResources(cpus=8, memory_mb=16384)
+
+
+class EngineResourcesTest(unittest.TestCase):
+    def test_clear_sizes_per_difficulty(self):
+        resources = EngineResources(HOST)
+        self.assertFalse(resources.keep_hash)
+        self.assertEqual(resources.options("Beginner"), {"Threads": 1, "Hash": 16})
+        self.assertEqual(resources.options("Master"), {"Threads": 8, "Hash": 512})
+
+    def test_keep_uses_one_size_for_every_difficulty(self):
+        # Doi Threads/Hash lam Stockfish xoa bang bam
+        resources = EngineResources(HOST, hash_policy="keep")
+        options = {resources.threads(name) for name in RESOURCE_PROFILES}
+        hashes = {resources.hash_mb(name) for name in RESOURCE_PROFILES}
+        self.assertEqual((len(options), len(hashes)), (1, 1))
+        self.assertEqual(resources.options("Beginner"), resources.options())
+
+    def test_fair_share(self):
+        resources = EngineResources(HOST, engines=3)
+        self.assertEqual(resources.threads("Master"), 2)
+        self.assertEqual(EngineResources(HOST, engines=3, fair_share=False).threads("Master"), 8)
+
+    def test_hash_limited_by_memory(self):
+        resources = EngineResources(HostResources(cpus=1, memory_mb=1024), engines=2)
+        self.assertEqual(resources.hash_mb("Master"), 128)
+        self.assertEqual(round_hash(100), 64)
+        self.assertEqual(round_hash(1), 16)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            EngineResources(HOST, hash_policy="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
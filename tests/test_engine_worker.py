@@ -0,0 +1,44 @@
+import queue
+import unittest
+
+import chess
+import chess.engine
+
+from engine_worker import EngineWorker
+from tests.test_server import STUB_ENGINE
+
+
+class ConfigureTest(unittest.TestCase):
+    def setUp(self):
+        self.results = queue.Queue()
+        self.worker = EngineWorker(STUB_ENGINE, self.results.put)
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.close()
+
+    def test_failed_configure_reported(self):
+        self.worker.configure({"Skill Level": 99}) # Ngoai khoang 0-20
+        result = self.results.get(timeout=10)
+        self.assertIsNone(result.job_id)
+        self.assertIsInstance(result.error, chess.engine.EngineError)
+        # Yeu cau sau do van co ket qua
+        self.worker.configure({"Skill Level": 5})
+        job_id = self.worker.submit(chess.Board(), chess.engine.Limit(nodes=1000))
+        result = self.results.get(timeout=10)
+        self.assertEqual(result.job_id, job_id)
+        self.assertIn(result.move, chess.Board().legal_moves)
+
+
+class MinDelayTest(unittest.TestCase):
+    def test_elapsed_excludes_min_delay(self):
+        results = queue.Queue()
+        worker = EngineWorker(STUB_ENGINE, results.put)
+        worker.start()
+        try:
+            worker.submit(chess.Board(), chess.engine.Limit(nodes=1000), min_delay=0.5)
+            result = results.get(timeout=10)
+        finally:
+            worker.close()
+        self.assertIsNone(result.error)
+        self.assertLess(result.elapsed, 0.5)
@@ -0,0 +1,90 @@
+import os
+import random
+import tempfile
+import unittest
+
+import chess
+
+from game_archive import ArchiveReader, ArchiveWriter, decode_move, encode_move
+
+
+def random_game(rng, plies):
+    board = chess.Board()
+    while len(board.move_stack) < plies and not board.is_game_over():
+        board.push(rng.choice(list(board.legal_moves)))
+    return board.move_stack
+
+
+class GameArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "games.cga")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_encode_move(self):
+        for move in (chess.Move.from_uci("e2e4"), chess.Move.from_uci("a7a8q"), chess.Move.from_uci("h2h1n")):
+            self.assertEqual(decode_move(encode_move(move)), move)
+
+    def test_round_trip(self):
+        rng = random.Random(1)
+        games = [random_game(rng, plies) for plies in (0, 1, 40, 120)]
+        with ArchiveWriter(self.path) as writer:
+            for game_id, moves in enumerate(games):
+                self.assertEqual(writer.append(moves, "Player", "Stockfish é", "1-0", 10, "Hard", 1700000000.0), game_id)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), len(games))
+            for archived, moves in zip(reader, games):
+                self.assertEqual(archived.moves, moves)
+                self.assertEqual((archived.white, archived.black, archived.result), ("Player", "Stockfish é", "1-0"))
+                self.assertEqual((archived.skill_level, archived.difficulty), (10, "Hard"))
+                self.assertEqual(archived.headers["SkillLevel"], "10")
+
+    def test_random_access(self):
+        rng = random.Random(2)
+        games = [random_game(rng, rng.randrange(1, 80)) for _ in range(50)]
+        with ArchiveWriter(self.path) as writer:
+            for moves in games:
+                writer.append(moves, "A", "B")
+        with ArchiveReader(self.path) as reader:
+            for game_id in (37, 0, 49, 12, -1):
+                game = reader[game_id]
+                self.assertEqual(game.moves, games[game_id])
+                self.assertEqual([decode_move(code) for code in game.move_codes], games[game_id])
+            with self.assertRaises(IndexError):
+                reader[50]
+
+    def test_append_to_existing_archive(self):
+        with ArchiveWriter(self.path) as writer:
+            writer.append([chess.Move.from_uci("e2e4")], "A", "B")
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(len(writer), 1)
+            self.assertEqual(writer.append([chess.Move.from_uci("d2d4")], "C", "D"), 1)
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual([game.white for game in reader], ["A", "C"])
+
+    def test_recover_partial_record(self):
+        with ArchiveWriter(self.path) as writer:
+            writer.append([chess.Move.from_uci("e2e4")], "A", "B")
+            writer.append(random_game(random.Random(3), 30), "C", "D")
+        complete = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(complete - 10) # Chuong trinh dung giua luc ghi ban ghi thu hai
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 1) # Chi muc khong khop: quet lai file du lieu
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(len(writer), 1)
+            writer.append([chess.Move.from_uci("d2d4")], "E", "F")
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual([game.white for game in reader], ["A", "E"])
+
+    def test_not_an_archive(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not an archive")
+        with self.assertRaises(ValueError):
+            ArchiveReader(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+
+import chess
+
+from game_core import Game, Phase, PositionState, Session, game_over_text
+
+
+class SessionTest(unittest.TestCase):
+    def start(self, color):
+        session = Session()
+        session.start()
+        self.assertEqual(session.phase, Phase.COLOR_CHOICE)
+        session.choose_color(color)
+        self.assertEqual(session.phase, Phase.DIFFICULTY_CHOICE)
+        session.choose_difficulty("Easy")
+        self.assertEqual(session.phase, Phase.PLAYING)
+        return session
+
+    def test_turns(self):
+        session = self.start(chess.WHITE)
+        self.assertTrue(session.game.is_user_turn())
+        self.assertFalse(session.bot_should_move())
+        session.game.push_move(chess.Move.from_uci("e2e4"))
+        self.assertTrue(session.bot_should_move())
+        self.assertEqual(session.game.history, ["White: e2e4"])
+
+    def test_black_waits_for_bot(self):
+        session = self.start(chess.BLACK)
+        self.assertTrue(session.bot_should_move())
+        self.assertIsNone(session.game.click_square(chess.E7))
+
+    def test_click_square(self):
+        game = self.start(chess.WHITE).game
+        self.assertIsNone(game.click_square(chess.E2))
+        self.assertEqual(game.selected_square, chess.E2)
+        self.assertEqual({move.to_square for move in game.possible_moves}, {chess.E3, chess.E4})
+        self.assertEqual(game.click_square(chess.E4), chess.Move.from_uci("e2e4"))
+        self.assertIsNone(game.selected_square)
+
+    def test_give_up(self):
+        session = self.start(chess.BLACK)
+        session.ask_give_up()
+        self.assertEqual(session.phase, Phase.GIVE_UP_CONFIRM)
+        session.give_up()
+        self.assertEqual(session.phase, Phase.GAME_OVER)
+        self.assertEqual(session.game.result(), "1-0")
+        self.assertEqual(session.game_over_message, "You gave up!")
+
+    def test_checkmate(self):
+        session = self.start(chess.WHITE)
+        for uci in ("f2f3", "e7e5", "g2g4", "d8h4"):
+            session.game.push_move(chess.Move.from_uci(uci))
+        self.assertTrue(session.game.is_over())
+        session.finish()
+        self.assertEqual(session.game.result(), "0-1")
+        self.assertEqual(session.game_over_message, game_over_text(session.game.board))
+
+    def test_reset(self):
+        session = self.start(chess.WHITE)
+        session.reset()
+        self.assertEqual(session.phase, Phase.START)
+        self.assertFalse(session.game_started)
+        self.assertIsInstance(session.game, Game)
+
+
+
+class PositionStateTest(unittest.TestCase):
+    def test_moves_and_check(self):
+        board = chess.Board("rnbqkbnr/ppp2ppp/8/1B1pp3/4P3/8/PPPP1PPP/RNBQK1NR b KQkq - 1 3")
+        state = PositionState(board)
+        self.assertEqual(state.check_square, chess.E8)
+        self.assertEqual(sum(len(moves) for moves in state.moves_from.values()), board.legal_moves.count())
+        self.assertEqual(state.targets[chess.C7], chess.BB_C6)
+        self.assertIsNone(state.outcome)
+        self.assertFalse(state.is_game_over)
+
+    def assert_fresh(self, game):
+        self.assertEqual(game.state.moves_from, PositionState(game.board).moves_from)
+        self.assertEqual(game.state.check_square, PositionState(game.board).check_square)
+
+    def test_cache_follows_push_and_pop(self):
+        game = Game(chess.WHITE)
+        start = game.state
+        self.assertIs(game.state, start) # Khong tinh lai khi ban co khong doi
+        game.board.push_uci("e2e4")
+        self.assertIsNot(game.state, start)
+        self.assert_fresh(game)
+        game.board.pop()
+        self.assert_fresh(game)
+        # Cung so nua nuoc nhung khac nuoc cuoi
+        game.board.push_uci("d2d4")
+        game.state
+        game.board.pop()
+        game.board.push_uci("f2f3")
+        self.assert_fresh(game)
+        for uci in ("e7e5", "g2g4", "d8h4"):
+            game.board.push_uci(uci)
+        self.assertTrue(game.state.is_game_over)
+        self.assertEqual(game.state.check_square, chess.E1)
+        game.board.pop()
+        self.assertFalse(game.state.is_game_over)
+
+    def test_cache_follows_new_board(self):
+        game = Game(chess.WHITE)
+        game.state
+        game.board = chess.Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertIsNotNone(game.state.outcome)
+        self.assertTrue(game.is_over())
+
+
+if __name__ == "__main__":
+    unittest.main()
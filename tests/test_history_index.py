@@ -0,0 +1,34 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from history_index import main
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.index = os.path.join(self.folder.name, "index.db")
+
+    def run_main(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = main(["--index", self.index, *argv])
+        return code, out.getvalue()
+
+    def test_illegal_moves(self):
+        code, out = self.run_main("find", "--moves", "e2e5")
+        self.assertEqual(code, 1)
+        self.assertEqual(len(out.splitlines()), 1)
+        self.assertFalse(os.path.exists(self.index))
+
+    def test_bad_fen(self):
+        code, _ = self.run_main("stats", "--fen", "not a fen")
+        self.assertEqual(code, 1)
+
+    def test_legal_moves(self):
+        code, _ = self.run_main("find", "--moves", "e2e4 c7c5")
+        self.assertEqual(code, 0)
@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import chess
+import chess.pgn
+
+from recorder import GameRecorder, build_pgn
+
+MOVES = [chess.Move.from_uci(uci) for uci in ("f2f3", "e7e5", "g2g4", "d8h4")]
+
+
+class WriteLog:
+    """Thay cho metrics.Metrics: ghi lai loai cua moi lan ghi file."""
+
+    def __init__(self):
+        self.kinds = []
+        self.written = threading.Semaphore(0)
+
+    def observe(self, name, value, kind):
+        self.kinds.append(kind)
+        self.written.release()
+
+
+def read_pgn(path):
+    with open(path, encoding="utf-8") as f:
+        return chess.pgn.read_game(f)
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.saved = []
+        self.writes = WriteLog()
+        self.recorder = GameRecorder(self.folder.name, flush_every=2, on_saved=self.saved.append, metrics=self.writes)
+
+    def wait_writes(self, count):
+        for _ in range(count):
+            self.assertTrue(self.writes.written.acquire(timeout=5))
+
+    def tearDown(self):
+        self.recorder.close()
+        self.folder.cleanup()
+
+    def test_final_pgn(self):
+        self.recorder.start_game("Player", "Stockfish", SkillLevel=2)
+        for move in MOVES:
+            self.recorder.record_move(move)
+        path = self.recorder.finish("0-1", "Checkmate! Winner: Black")
+        self.recorder.close()
+        self.assertEqual(self.saved, [path])
+        self.assertFalse(os.path.exists(f"{path}.tmp"))
+        game = read_pgn(path)
+        self.assertEqual(game.headers["Result"], "0-1")
+        self.assertEqual(game.headers["White"], "Player")
+        self.assertEqual(game.headers["SkillLevel"], "2")
+        self.assertEqual(list(game.mainline_moves()), MOVES)
+        self.assertEqual(game.end().comment, "Checkmate! Winner: Black")
+
+    def test_flush_during_game(self):
+        self.recorder.start_game("Player", "Stockfish")
+        self.recorder.record_move(MOVES[0])
+        path = self.recorder.path
+        self.wait_writes(1) # File duoc tao o nuoc dau tien
+        self.assertEqual(list(read_pgn(path).mainline_moves()), MOVES[:1])
+        self.recorder.record_move(MOVES[1])
+        self.wait_writes(1) # Du flush_every nuoc
+        self.recorder.record_move(MOVES[2])
+        self.assertEqual(list(read_pgn(path).mainline_moves()), MOVES[:2])
+        self.recorder.record_move(MOVES[3])
+        self.wait_writes(1)
+        game = read_pgn(path)
+        self.assertEqual(list(game.mainline_moves()), MOVES)
+        self.assertEqual(game.headers["Result"], "*")
+        self.assertEqual(self.writes.kinds, ["flush"] * 3)
+
+    def test_game_without_moves_leaves_no_file(self):
+        self.recorder.start_game("Player", "Stockfish")
+        self.assertIsNone(self.recorder.finish("1-0"))
+        self.recorder.close()
+        self.assertEqual(os.listdir(self.folder.name), [])
+        self.assertEqual(self.saved, [])
+
+    def test_new_game_finishes_previous(self):
+        self.recorder.start_game("Player", "Stockfish")
+        self.recorder.record_move(MOVES[0])
+        first = self.recorder.path
+        self.recorder.start_game("Stockfish", "Player")
+        self.assertIsNone(self.recorder.path)
+        self.recorder.close()
+        self.assertEqual(self.saved, [first])
+        game = read_pgn(first)
+        self.assertEqual(game.headers["Result"], "*")
+        self.assertEqual(list(game.mainline_moves()), MOVES[:1])
+
+    def test_games_started_together_keep_separate_files(self):
+        with mock.patch("recorder.datetime") as clock:
+            clock.now.return_value = datetime(2024, 5, 1, 12, 0, 0)
+            paths = []
+            for _ in range(2):
+                self.recorder.start_game("Player", "Stockfish")
+                self.recorder.record_move(MOVES[0])
+                paths.append(self.recorder.finish("1-0"))
+        self.recorder.close()
+        self.assertEqual(len(set(paths)), 2)
+        self.assertEqual(self.saved, paths)
+        self.assertEqual(sorted(os.listdir(self.folder.name)), sorted(os.path.basename(path) for path in paths))
+
+    def test_moves_outside_a_game_are_ignored(self):
+        self.recorder.record_move(MOVES[0])
+        self.assertFalse(self.recorder.recording)
+        self.assertIsNone(self.recorder.path)
+
+
+class BuildPgnTest(unittest.TestCase):
+    def test_round_trip(self):
+        text = build_pgn({"White": "A", "Black": "B"}, MOVES, "0-1", "mate")
+        game = chess.pgn.read_game(io.StringIO(text))
+        self.assertEqual(game.headers["Result"], "0-1")
+        self.assertEqual(list(game.mainline_moves()), MOVES)
+        self.assertTrue(text.endswith("\n\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import chess
+import chess.engine
+
+from server import BOT_MAX_FAILURES, GameServer
+
+STUB_ENGINE = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci_stub.py")]
+
+
+class ServerTestCase(unittest.IsolatedAsyncioTestCase):
+    engine = STUB_ENGINE
+
+    async def asyncSetUp(self):
+        self.server = GameServer(self.engine, engines=1, history_folder=None)
+        host, port = await self.server.start(port=0)
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.server.close()
+
+    async def request(self, message):
+        self.writer.write((json.dumps(message) + "\n").encode())
+        await self.writer.drain()
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 10))
+
+
+class SearchTest(ServerTestCase):
+    async def test_malformed_search_then_valid(self):
+        reply = await self.request({"op": "search", "id": 1, "options": {"UCI_Elo": None}})
+        self.assertEqual(reply["type"], "error")
+        self.assertEqual(reply["code"], "bad_request")
+        self.assertEqual(reply["id"], 1)
+        reply = await self.request({"op": "search", "id": 2, "options": {"UCI_Elo": 1500, "UCI_LimitStrength": True},
+                                    "limit": {"nodes": 1000}})
+        self.assertEqual(reply["type"], "bestmove")
+        self.assertEqual(reply["id"], 2)
+        self.assertEqual(self.server.stats()["pending"], 0)
+
+    async def test_failed_job_keeps_dispatcher(self):
+        # Tuy chon sai di thang vao bo dieu phoi: chi yeu cau do bi loi
+        with self.assertRaises(chess.engine.EngineError):
+            await asyncio.wait_for(
+                self.server.scheduler.search(1, chess.Board(), chess.engine.Limit(nodes=1000), {"UCI_Elo": None}), 10)
+        move, info = await asyncio.wait_for(
+            self.server.scheduler.search(1, chess.Board(), chess.engine.Limit(nodes=1000), {}), 10)
+        self.assertIn(move, chess.Board().legal_moves)
+
+
+
+class EngineFailureTest(ServerTestCase):
+    engine = STUB_ENGINE + ["--crash"]
+
+    async def test_bot_failures_end_game(self):
+        reply = await self.request({"op": "new_game", "color": "black", "difficulty": "Beginner"})
+        self.assertEqual(reply["type"], "started")
+        errors = 0
+        while True:
+            message = json.loads(await asyncio.wait_for(self.reader.readline(), 30))
+            if message["type"] == "game_over":
+                break
+            self.assertEqual(message["code"], "engine_error")
+            errors += 1
+        self.assertEqual(errors, BOT_MAX_FAILURES - 1)
+        self.assertEqual(message["reason"], "engine_error")
+        self.assertEqual(message["result"], "*")
+        self.assertEqual(self.server.stats()["games"], 0)
+
+
+
+class HistoryTest(unittest.IsolatedAsyncioTestCase):
+    async def test_abandoned_game_is_written_on_close(self):
+        with tempfile.TemporaryDirectory() as folder:
+            server = GameServer(STUB_ENGINE, engines=1, history_folder=folder)
+            host, port = await server.start(port=0)
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(b'{"op": "new_game", "color": "white", "difficulty": "Beginner"}\n')
+            writer.write(b'{"op": "move", "game": 1, "move": "e2e4"}\n')
+            await writer.drain()
+            while json.loads(await asyncio.wait_for(reader.readline(), 10))["type"] != "bot_move":
+                pass
+            await server.close()
+            writer.close()
+            self.assertEqual(server.stats()["games_abandoned"], 1)
+            self.assertEqual(server.stats()["games_played"], 0)
+            names = os.listdir(folder)
+            self.assertEqual(len(names), 1)
+            with open(os.path.join(folder, names[0]), encoding="utf-8") as f:
+                self.assertIn("Client disconnected", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
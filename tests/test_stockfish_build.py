@@ -0,0 +1,47 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import stockfish_build
+
+
+class BuildFallbackTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.built = []
+        patches = [
+            mock.patch.object(stockfish_build, "BIN_DIR", folder.name),
+            mock.patch.object(stockfish_build, "download_networks", lambda: None),
+            mock.patch.object(stockfish_build, "_build_arch", self.fake_build),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.native = "x86-64-avx2"
+        self.portable = stockfish_build.portable_arch()
+
+    def fake_build(self, arch, jobs, profile, compiler):
+        # Ban goc luon loi, ban pho thong bien dich duoc
+        self.built.append(arch)
+        if arch != self.portable:
+            raise subprocess.CalledProcessError(2, ["make"])
+        path = stockfish_build.binary_path(arch)
+        open(path, "w").close()
+        return path
+
+    def test_failed_native_not_retried(self):
+        path = stockfish_build.build(self.native)
+        self.assertEqual(self.built, [self.native, self.portable])
+        self.assertEqual(stockfish_build.build(self.native), path)
+        self.assertEqual(self.built, [self.native, self.portable])
+
+    def test_force_and_other_compiler_retry(self):
+        stockfish_build.build(self.native)
+        stockfish_build.build(self.native, compiler="clang")
+        self.assertEqual(self.built[2:], [self.native, self.portable])
+        stockfish_build.build(self.native, compiler="clang", force=True)
+        self.assertEqual(self.built[4:], [self.native, self.portable])
+        self.assertTrue(os.path.exists(stockfish_build.binary_path(self.portable)))
@@ -0,0 +1,99 @@
+import random
+import tempfile
+import unittest
+
+import chess
+
+from tablebase import Tablebase, TablebaseProfile
+
+# Trang: vua, hau, tot; den: vua. Trang co nuoc chieu het (Qc8#) va nuoc di tot
+FEN = "k7/8/1K6/8/8/8/7P/2Q5 w - - {clock} 80"
+MATE = chess.Move.from_uci("c1c8")
+
+
+class FakeTables:
+    """Thay cho chess.syzygy.Tablebase: ben con hau thang, DTZ bang khoang cach giua hai vua."""
+
+    wdl = {"KQPvK": None}
+    dtz = {"KQPvK": None}
+
+    def probe_wdl(self, board):
+        if not board.pieces(chess.QUEEN, chess.WHITE) or board.is_stalemate():
+            return 0
+        return 2 if board.turn == chess.WHITE else -2
+
+    def probe_dtz(self, board):
+        wdl = self.probe_wdl(board)
+        distance = chess.square_distance(board.king(chess.WHITE), board.king(chess.BLACK))
+        return 0 if wdl == 0 else (distance + 1) * (1 if wdl > 0 else -1)
+
+    def close(self):
+        pass
+
+
+class TablebaseTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.tablebase = Tablebase(self.folder.name, TablebaseProfile(), random.Random(1))
+        self.assertEqual(self.tablebase.max_pieces, 0) # Thu muc rong
+        self.tablebase._tables = FakeTables()
+        self.tablebase.max_pieces = 4
+
+    def tearDown(self):
+        self.tablebase.close()
+        self.folder.cleanup()
+
+    def test_covers(self):
+        self.assertTrue(self.tablebase.covers(chess.Board(FEN.format(clock=0))))
+        self.assertFalse(self.tablebase.covers(chess.Board()))
+        self.assertIsNone(self.tablebase.probe(chess.Board()))
+
+    def test_probe_with_fifty_move_rule(self):
+        board = chess.Board(FEN.format(clock=0))
+        self.assertEqual(self.tablebase.probe(board), 1)
+        self.assertEqual(self.tablebase.result(board), "1-0")
+        board.halfmove_clock = 99 # Khong kip chieu het truoc khi het 50 nuoc
+        self.assertEqual(self.tablebase.probe(board), 0)
+        self.assertEqual(self.tablebase.result(board), "1/2-1/2")
+        board = chess.Board(FEN.format(clock=0))
+        board.turn = chess.BLACK
+        self.assertEqual(self.tablebase.probe(board), -1)
+        self.assertEqual(self.tablebase.result(board), "1-0")
+
+    def test_rank_moves(self):
+        board = chess.Board(FEN.format(clock=0))
+        ranked = self.tablebase.rank_moves(board)
+        self.assertEqual(len(ranked), board.legal_moves.count())
+        self.assertEqual(ranked[0], (MATE, 1)) # Chieu het truoc
+        wins = [move for move, score in ranked[1:] if score == 1]
+        # Nuoc di tot (dat lai dem 50 nuoc) truoc, roi DTZ nho nhat
+        zeroing = [move for move in wins if board.is_zeroing(move)]
+        self.assertEqual(wins[:len(zeroing)], zeroing)
+        self.assertEqual({move.from_square for move in zeroing}, {chess.H2})
+
+    def test_rank_moves_near_fifty_moves(self):
+        board = chess.Board(FEN.format(clock=98))
+        ranked = self.tablebase.rank_moves(board)
+        self.assertEqual(ranked[0][0], MATE)
+        # Chi nuoc di tot con thang; cac nuoc khac de doi phuong keo dai toi het 50 nuoc
+        wins = {move for move, score in ranked[1:] if score == 1}
+        self.assertEqual(wins, {chess.Move.from_uci("h2h3"), chess.Move.from_uci("h2h4")})
+        self.assertTrue(all(score == 0 for move, score in ranked[3:]))
+        self.assertEqual(self.tablebase.probe(board), 0)
+
+    def test_choose(self):
+        board = chess.Board(FEN.format(clock=0))
+        self.assertEqual(self.tablebase.choose(board), MATE)
+        self.tablebase.profile = TablebaseProfile(optimal=False)
+        for _ in range(10):
+            move = self.tablebase.choose(board)
+            board.push(move)
+            self.assertEqual(self.tablebase.probe(board), -1) # Van giu duoc the thang
+            board.pop()
+        self.assertEqual(self.tablebase.reset_stats(), 11)
+        self.tablebase.profile = None
+        self.assertIsNone(self.tablebase.choose(board))
+
+
+if __name__ == "__main__":
+    unittest.main()
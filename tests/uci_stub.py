@@ -0,0 +1,48 @@
+"""Engine UCI tối giản cho các bài kiểm thử: luôn đi nước hợp lệ đầu tiên.
+
+Với tham số ``--crash`` engine thoát ngay khi nhận lệnh ``go`` (giả lập engine lỗi).
+"""
+import sys
+
+import chess
+
+OPTIONS = (
+    "option name Skill Level type spin default 20 min 0 max 20",
+    "option name UCI_LimitStrength type check default false",
+    "option name UCI_Elo type spin default 1320 min 1320 max 3190",
+    "option name Threads type spin default 1 min 1 max 1024",
+    "option name Hash type spin default 16 min 1 max 33554432",
+)
+
+
+def main():
+    board = chess.Board()
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == "uci":
+            print("id name UciStub")
+            for option in OPTIONS:
+                print(option)
+            print("uciok")
+        elif parts[0] == "isready":
+            print("readyok")
+        elif parts[0] == "position":
+            moves = parts.index("moves") if "moves" in parts else len(parts)
+            board = chess.Board() if parts[1] == "startpos" else chess.Board(" ".join(parts[2:moves]))
+            for uci in parts[moves + 1:]:
+                board.push_uci(uci)
+        elif parts[0] == "go":
+            if "--crash" in sys.argv:
+                sys.exit(1)
+            move = next(iter(board.legal_moves))
+            print(f"info depth 1 score cp 0 nodes 1 pv {move.uci()}")
+            print(f"bestmove {move.uci()}")
+        elif parts[0] == "quit":
+            break
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()